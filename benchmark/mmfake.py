@@ -0,0 +1,439 @@
+#!/usr/bin/env python3
+################################################################################
+# Name:    Synthetic IBM Spectrum Scale command output for benchmarks
+# Dependencies:
+#   - none
+################################################################################
+
+################################################################################
+# The generators write output in the format of the mm* commands at a
+# configurable scale. The stand-in executables in benchmark/bin call this
+# script with their own name, so that check_spectrum_scale.py can be pointed at
+# them with --mmfs-bin benchmark/bin --no-sudo.
+#
+# Scale (environment):
+#   MMFAKE_NODES        number of nodes for mmgetstate -a     (default 16)
+#   MMFAKE_FILESETS     number of filesets for mmlsfileset    (default 100)
+#   MMFAKE_POOLS        number of storage pools for mmlspool  (default 4)
+#   MMFAKE_QUOTA_ROWS   number of quota entries for mmrepquota (default 10000),
+#                       mmlsquota answers for userN/groupN like the entry N
+#   MMFAKE_DEVICES      number of file systems fs1..fsN for mmlsfs all and
+#                       mmlsmount all (default 2)
+#   MMFAKE_WAITERS      number of waiters for mmdiag --waiters (default 200)
+#   MMFAKE_IOHIST       number of I/Os for mmdiag --iohist    (default 512)
+#   MMFAKE_SEED         seed of the random values             (default 1)
+#   MMFAKE_DATA         directory with pre-generated output, which is served
+#                       instead of generating it (see outputName)
+#   MMFAKE_CALLBACKS    file to which mmaddcallback and mmdelcallback append
+#                       their arguments as a JSON line (for the tests)
+################################################################################
+import json
+import os
+import sys
+import random
+import shutil
+import time
+
+
+################################################################################
+# # Variable definition
+################################################################################
+DEFAULT_SCALE = {'nodes': 16, 'filesets': 100, 'pools': 4, 'quotaRows': 10000, 'devices': 2, 'waiters': 200, 'iohist': 512, 'seed': 1}
+SCALE_ENVIRONMENT = {'nodes': 'MMFAKE_NODES', 'filesets': 'MMFAKE_FILESETS', 'pools': 'MMFAKE_POOLS', 'quotaRows': 'MMFAKE_QUOTA_ROWS', 'devices': 'MMFAKE_DEVICES',
+                     'waiters': 'MMFAKE_WAITERS', 'iohist': 'MMFAKE_IOHIST', 'seed': 'MMFAKE_SEED'}
+
+MMLSFILESET_HEADER = ["filesystemName", "filesetName", "id", "rootInode", "status", "path", "parentId", "created", "inodes", "dataInKB", "comment",
+                      "filesetMode", "afmTarget", "afmState", "afmMode", "afmFileLookupRefreshInterval", "afmFileOpenRefreshInterval",
+                      "afmDirLookupRefreshInterval", "afmDirOpenRefreshInterval", "afmAsyncDelay", "afmNeedsRecovery", "afmExpirationTimeout",
+                      "afmRPO", "afmLastPSnapId", "inodeSpace", "isInodeSpaceOwner", "maxInodes", "allocInodes", "inodeSpaceMask",
+                      "afmShowHomeSnapshots", "afmNumReadThreads", "afmNumReadGWs", "afmReadBufferSize", "afmWriteBufferSize",
+                      "afmReadSparseThreshold", "afmParallelReadChunkSize", "afmParallelReadThreshold", "snapId", "afmNumFlushThreads",
+                      "afmPrefetchThreshold", "afmEnableAutoEviction", "permChangeFlag", "afmParallelWriteThreshold", "freeInodes",
+                      "afmNeedsResync", "afmParallelWriteChunkSize", "afmNumWriteThreads", "afmPrimID", "afmDRState", "afmAssociatedPrimaryId",
+                      "afmDIO", "afmGatewayNode", "afmIOFlags", "afmVerifyDmapi", "afmSkipHomeACL", "afmSkipHomeMtimeNsec", "afmForceCtimeChange",
+                      "afmSkipResyncRecovery", "afmSkipConflictQDrop", "afmRefreshAsync", "afmParallelMounts", "afmRefreshOnce",
+                      "afmSkipHomeCtimeNsec", "afmReaddirOnce", "afmResyncVer2", "afmSnapUncachedRead", "afmFastCreate", "afmObjectXattr",
+                      "afmObjectNoDirectory", "afmSkipHomeRefresh", "afmObjectGCS", "afmObjectFastReaddir", "afmWriteOnClose", "afmObjectSSL",
+                      "afmMUAutoRemove", "afmObjectBlkIO"]
+MMREPQUOTA_HEADER = ["filesystemName", "quotaType", "id", "name", "blockUsage", "blockQuota", "blockLimit", "blockInDoubt", "blockGrace",
+                     "filesUsage", "filesQuota", "filesLimit", "filesInDoubt", "filesGrace", "remarks", "quota", "defQuota", "fid", "filesetname"]
+
+
+################################################################################
+# # Function definition
+################################################################################
+def getScale():
+    """
+    Returns: dict of the scale parameters from the environment
+    """
+    scale = dict(DEFAULT_SCALE)
+    for name, variable in SCALE_ENVIRONMENT.items():
+        if variable in os.environ:
+            scale[name] = int(os.environ[variable])
+    return scale
+
+
+def getDevice(arguments):
+    """
+    Returns: the device (without :fileset) of the command arguments, fs1 if there is none
+    """
+    for argument in arguments:
+        if not argument.startswith("-"):
+            return argument.split(":")[0]
+    return "fs1"
+
+
+def machineReadableLine(command, values, recordType=""):
+    """
+    Returns: a -Y output line of command with the values
+    """
+    return command + ":" + recordType + ":" + ":".join(str(x) for x in values) + ":\n"
+
+
+def generateMmgetstate(out, scale, arguments):
+    """
+    Write the output of mmgetstate -LY (-a for all nodes), 1% of the nodes are down and a few arbitrating
+    """
+    rand = random.Random(scale['seed'])
+    allNodes = "-a" in arguments
+    nodes = scale['nodes'] if allNodes else 1
+    totalNodes = max(scale['nodes'], 1)
+    quorumNodes = min(totalNodes, 3) if totalNodes < 8 else 5
+    quorumNeeded = quorumNodes // 2 + 1
+    out.write(machineReadableLine("mmgetstate", ["HEADER", "version", "reserved", "reserved", "nodeName", "nodeNumber", "state", "quorum", "nodesUp", "totalNodes", "remarks", "cnfsState"]))
+    states = [("down" if rand.random() < 0.01 else "arbitrating" if rand.random() < 0.002 else "active") for _ in range(nodes)]
+    if allNodes:
+        # the quorum nodes of the local node are always active
+        states[0] = "active"
+    nodesUp = states.count("active") if allNodes else totalNodes
+    for number, state in enumerate(states, 1):
+        remarks = "quorum node" if number <= quorumNodes else ""
+        if state == "down":
+            out.write(machineReadableLine("mmgetstate", [0, 1, "", "", "node" + str(number) + ".example.com", number, state, 0, 0, 0, remarks, "(undefined)"]))
+        else:
+            out.write(machineReadableLine("mmgetstate", [0, 1, "", "", "node" + str(number) + ".example.com", number, state, quorumNeeded, nodesUp, totalNodes, remarks, "(undefined)"]))
+
+
+def generateMmlsfileset(out, scale, arguments):
+    """
+    Write the output of mmlsfileset Device -Y (-d with the data size), a few filesets are unlinked or nearly full
+    """
+    rand = random.Random(scale['seed'])
+    device = getDevice(arguments)
+    withSize = "-d" in arguments
+    out.write(machineReadableLine("mmlsfileset", ["HEADER", "version", "reserved", "reserved"] + MMLSFILESET_HEADER))
+    for number in range(scale['filesets']):
+        name = "root" if number == 0 else "fileset" + str(number)
+        status = "Unlinked" if rand.random() < 0.01 else "Linked"
+        path = "%2Fgpfs%2F" + device + ("" if number == 0 else "%2F" + name)
+        maxInodes = rand.choice([100000, 1000000, 10000000])
+        allocInodes = int(maxInodes * rand.choice([0.1, 0.5, 0.8, 0.93, 0.99]))
+        row = dict.fromkeys(MMLSFILESET_HEADER, "-")
+        row.update(filesystemName=device, filesetName=name, id=number, rootInode=number * 4096 + 3, status=status, path=path,
+                   parentId=0 if number else "--", created="Mon Jan  2 10%3A00%3A00 2017", inodes=allocInodes,
+                   dataInKB=rand.randint(0, 10 ** 10) if withSize else 0, comment="", filesetMode="off", inodeSpace=number,
+                   isInodeSpaceOwner=1, maxInodes=maxInodes, allocInodes=allocInodes, inodeSpaceMask=0, freeInodes=maxInodes - allocInodes)
+        out.write(machineReadableLine("mmlsfileset", [0, 1, "", ""] + [row[x] for x in MMLSFILESET_HEADER]))
+
+
+def generateMmlspool(out, scale, arguments):
+    """
+    Write the output of mmlspool Device, the system pool holds data and metadata
+    """
+    rand = random.Random(scale['seed'])
+    device = getDevice(arguments)
+    out.write("Storage pools in file system at '/gpfs/" + device + "':\n")
+    out.write("Name                    Id   BlkSize Data Meta Total Data in (KB)   Free Data in (KB)   Total Meta in (KB)    Free Meta in (KB)\n")
+    for number in range(scale['pools']):
+        name = "system" if number == 0 else "pool" + str(number)
+        dataTotal = rand.choice([10 ** 10, 10 ** 11, 10 ** 12])
+        dataFree = int(dataTotal * rand.choice([0.02, 0.2, 0.5]))
+        if number == 0:
+            metaTotal = dataTotal // 10
+            metaFree = int(metaTotal * rand.choice([0.03, 0.3, 0.6]))
+        else:
+            metaTotal = metaFree = 0
+        out.write("%-20s %8d %7s MB %4s %4s %16d %16d (%3d%%) %16d %16d (%3d%%)\n" % (name, 0 if number == 0 else 65536 + number, 4, "yes", "yes" if number == 0 else "no",
+                                                                             dataTotal, dataFree, 100 * dataFree // dataTotal, metaTotal, metaFree, 100 * metaFree // metaTotal if metaTotal else 0))
+
+
+def quotaRow(number, quotaType, device, scale):
+    """
+    Returns: the values of the mmrepquota/mmlsquota -Y row of quota entry number, which depend only on
+             the number and the seed, so that mmlsquota answers like the report of mmrepquota
+    """
+    # splitmix64 of the number instead of a sequential random generator
+    mix = (number * 0x9E3779B97F4A7C15 + scale['seed']) & 0xFFFFFFFFFFFFFFFF
+    mix = ((mix ^ (mix >> 30)) * 0xBF58476D1CE4E5B9) & 0xFFFFFFFFFFFFFFFF
+    mix = ((mix ^ (mix >> 27)) * 0x94D049BB133111EB) & 0xFFFFFFFFFFFFFFFF
+    mix ^= mix >> 31
+    blockQuota = (0, 10 ** 6, 10 ** 8, 10 ** 9)[mix & 3]
+    filesQuota = (0, 10 ** 5, 10 ** 6)[(mix >> 8) % 3]
+    blockUsage = int((blockQuota or 10 ** 7) * (0.0, 0.1, 0.5, 0.91, 0.97, 1.0)[(mix >> 16) % 6])
+    filesUsage = int((filesQuota or 10 ** 4) * (0.0, 0.1, 0.5, 0.91, 0.97)[(mix >> 24) % 5])
+    name = ("user" if quotaType == "USR" else "group" if quotaType == "GRP" else "fileset") + str(number)
+    fileset = number % max(1, scale['filesets'])
+    return [0, 1, "", "", device, quotaType, number, name, blockUsage, blockQuota, int(blockQuota * 1.1), 0, "none",
+            filesUsage, filesQuota, int(filesQuota * 1.1), 0, "none", "i", "on", "off", fileset, "root" if fileset == 0 else "fileset" + str(fileset)]
+
+
+def getQuotaType(number, scale):
+    """
+    Returns: the quota type of entry number in the report of all types (80% users, 20% groups)
+    """
+    return "GRP" if (number * 0x9E3779B1 + scale['seed']) % 10 >= 8 else "USR"
+
+
+def generateMmrepquota(out, scale, arguments):
+    """
+    Write the output of mmrepquota -Y (-u/-g/-j for a single type), users, groups and filesets with per-fileset quotas
+    """
+    device = getDevice(arguments)
+    quotaType = None
+    if "-u" in arguments:
+        quotaType = "USR"
+    elif "-g" in arguments:
+        quotaType = "GRP"
+    elif "-j" in arguments:
+        quotaType = "FILESET"
+    out.write(machineReadableLine("mmrepquota", ["HEADER", "version", "reserved", "reserved"] + MMREPQUOTA_HEADER))
+    write = out.write
+    for number in range(scale['quotaRows']):
+        write(machineReadableLine("mmrepquota", quotaRow(number, quotaType or getQuotaType(number, scale), device, scale)))
+
+
+def generateMmlsquota(out, scale, arguments):
+    """
+    Write the output of mmlsquota -u/-g/-j <name> -Y <device>[:<fileset>] for the quota entry of the name
+    (e.g. user42 is entry 42), exits with 1 for a name without number like mmlsquota for an unknown user
+    """
+    quotaType = "USR"
+    name = ""
+    for flag, flagType in (("-u", "USR"), ("-g", "GRP"), ("-j", "FILESET")):
+        if flag in arguments and arguments.index(flag) + 1 < len(arguments):
+            quotaType = flagType
+            name = arguments[arguments.index(flag) + 1]
+    target = [x for x in arguments if not x.startswith("-") and x != name]
+    number = name.lstrip("abcdefghijklmnopqrstuvwxyz")
+    if not number.isdigit():
+        sys.stderr.write("mmlsquota: Invalid name " + name + "\n")
+        sys.exit(1)
+    row = quotaRow(int(number), quotaType, getDevice(target), scale)
+    if target and ":" in target[0]:
+        row[-1] = target[0].split(":", 1)[1]
+    out.write(machineReadableLine("mmlsquota", ["HEADER", "version", "reserved", "reserved"] + MMREPQUOTA_HEADER))
+    out.write(machineReadableLine("mmlsquota", row))
+
+
+def generateMmlsfs(out, scale, arguments):
+    """
+    Write the output of mmlsfs all -T -Y (default mount point) for the file systems fs1..fsN, a single device for mmlsfs Device
+    """
+    devices = [getDevice(arguments)] if arguments and arguments[0] != "all" else ["fs" + str(x) for x in range(1, scale['devices'] + 1)]
+    out.write(machineReadableLine("mmlsfs", ["HEADER", "version", "reserved", "reserved", "deviceName", "fieldName", "data", "remarks"]))
+    for device in devices:
+        out.write(machineReadableLine("mmlsfs", [0, 1, "", "", device, "defaultMountPoint", "%2Fgpfs%2F" + device, ""]))
+
+
+def generateMmlsmount(out, scale, arguments):
+    """
+    Write the output of mmlsmount all -L -Y for the file systems fs1..fsN, a file system is mounted on the
+    nodes which are not down (see generateMmgetstate) and the last one of three or more is not mounted
+    """
+    rand = random.Random(scale['seed'])
+    nodes = ["node" + str(number) + ".example.com" for number in range(1, max(scale['nodes'], 1) + 1) if rand.random() >= 0.01 or number == 1]
+    out.write(machineReadableLine("mmlsmount", ["HEADER", "version", "reserved", "reserved", "localDevName", "realDevName", "owningCluster", "totalNodeCount",
+                                                "nodeIP", "nodeName", "clusterName", "type"]))
+    devices = scale['devices'] - 1 if scale['devices'] >= 3 else scale['devices']
+    for device in ["fs" + str(x) for x in range(1, devices + 1)]:
+        for number, node in enumerate(nodes, 1):
+            out.write(machineReadableLine("mmlsmount", [0, 1, "", "", device, device, "cluster.example.com", len(nodes), "10.0." + str(number // 256) + "." + str(number % 256),
+                                                        node, "cluster.example.com", "RW"]))
+
+
+def generateMmdf(out, scale, arguments):
+    """
+    Write the output of mmdf Device -Y with two disks per storage pool, the system pool holds data and metadata
+    """
+    device = getDevice(arguments)
+    rand = random.Random(str(scale['seed']) + device)
+    records = {'nsd': ["nsdName", "storagePool", "diskSize", "failureGroup", "metadata", "data", "freeBlocks", "freeBlocksPct", "freeFragments", "freeFragmentsPct", "diskAvailableForAlloc"],
+               'poolTotal': ["poolName", "poolSize", "freeBlocks", "freeBlocksPct", "freeFragments", "freeFragmentsPct", "maxDiskSize"],
+               'data': ["totalData", "freeBlocks", "freeBlocksPct", "freeFragments", "freeFragmentsPct"],
+               'metadata': ["totalMetadata", "freeBlocks", "freeBlocksPct", "freeFragments", "freeFragmentsPct"],
+               'fsTotal': ["fsSize", "freeBlocks", "freeBlocksPct", "freeFragments", "freeFragmentsPct"],
+               'inode': ["usedInodes", "freeInodes", "allocatedInodes", "maxInodes"]}
+    for recordType, header in records.items():
+        out.write(machineReadableLine("mmdf", ["HEADER", "version", "reserved", "reserved"] + header, recordType))
+    totals = {'data': [0, 0], 'metadata': [0, 0]}
+    for number in range(scale['pools']):
+        name = "system" if number == 0 else "pool" + str(number)
+        diskSize = rand.choice([10 ** 9, 10 ** 10, 10 ** 11])
+        poolFree = 0
+        for disk in range(2):
+            free = int(diskSize * rand.choice([0.02, 0.2, 0.5]))
+            poolFree += free
+            out.write(machineReadableLine("mmdf", [0, 1, "", "", device + "_" + name + "_nsd" + str(disk), name, diskSize, disk + 1, "yes" if number == 0 else "no", "yes",
+                                                   free, 100 * free // diskSize, free // 100, 0, "up"], "nsd"))
+            totals['data'][0] += diskSize
+            totals['data'][1] += free
+            if number == 0:
+                totals['metadata'][0] += diskSize
+                totals['metadata'][1] += free
+        out.write(machineReadableLine("mmdf", [0, 1, "", "", name, 2 * diskSize, poolFree, 100 * poolFree // (2 * diskSize), poolFree // 100, 0, diskSize], "poolTotal"))
+    for recordType in ('data', 'metadata'):
+        size, free = totals[recordType]
+        out.write(machineReadableLine("mmdf", [0, 1, "", "", size, free, 100 * free // size, free // 100, 0], recordType))
+    size, free = totals['data']
+    out.write(machineReadableLine("mmdf", [0, 1, "", "", size, free, 100 * free // size, free // 100, 0], "fsTotal"))
+    maxInodes = rand.choice([10 ** 6, 10 ** 7, 10 ** 8])
+    usedInodes = int(maxInodes * rand.choice([0.1, 0.5, 0.93, 0.99]))
+    allocatedInodes = min(maxInodes, usedInodes + maxInodes // 20)
+    out.write(machineReadableLine("mmdf", [0, 1, "", "", usedInodes, allocatedInodes - usedInodes, allocatedInodes, maxInodes], "inode"))
+
+
+def generateMmpmon(out, scale, arguments):
+    """
+    Write the fs_io_s responses of mmpmon -p for the mounted file systems (see generateMmlsmount) and the io_s
+    response of the node. The counters grow with the time at a fixed rate per file system, the operation
+    counters wrap at 32 bit like the ones of mmpmon.
+    """
+    now = time.time()
+    devices = scale['devices'] - 1 if scale['devices'] >= 3 else scale['devices']
+    prefix = ["_n_", "10.0.0.1", "_nn_", "node1.example.com", "_rc_", 0, "_t_", int(now), "_tu_", int(now % 1 * 1000000)]
+    totals = [0] * 8
+    for device in ["fs" + str(x) for x in range(1, devices + 1)]:
+        rand = random.Random(str(scale['seed']) + device)
+        # bytes read/written, opens, closes, reads, writes, readdir, inode updates per second
+        rates = [rand.choice([10 ** 6, 10 ** 7, 10 ** 8]), rand.choice([10 ** 6, 10 ** 7, 10 ** 8])] + [rand.choice([10, 100, 1000]) for _ in range(6)]
+        counters = [int(rate * now) for rate in rates[:2]] + [int(rate * now) % (1 << 32) for rate in rates[2:]]
+        totals = [x + y for x, y in zip(totals, counters)]
+        out.write(" ".join(str(x) for x in ["_fs_io_s_"] + prefix + ["_cl_", "cluster.example.com", "_fs_", device, "_d_", 2 * scale['pools'],
+                                                                      "_br_", counters[0], "_bw_", counters[1], "_oc_", counters[2], "_cc_", counters[3],
+                                                                      "_rdc_", counters[4], "_wc_", counters[5], "_dir_", counters[6], "_iu_", counters[7]]) + "\n")
+    totals = totals[:2] + [x % (1 << 32) for x in totals[2:]]
+    out.write(" ".join(str(x) for x in ["_io_s_"] + prefix + ["_br_", totals[0], "_bw_", totals[1], "_oc_", totals[2], "_cc_", totals[3],
+                                                              "_rdc_", totals[4], "_wc_", totals[5], "_dir_", totals[6], "_iu_", totals[7]]) + "\n")
+
+
+def generateWaiters(out, scale, arguments):
+    """
+    Write the output of mmdiag --waiters (-Y), most waiters are short, a few wait for disks or nodes for minutes
+    """
+    rand = random.Random(scale['seed'])
+    machineReadable = "-Y" in arguments
+    descriptions = [("Msg handler msgEPollSecureComm", "on ThCond 0x7F1C0C00B0D8 (RecvWorkerCondvar), reason 'waiting for message'", None, "RecvWorkerCondvar", "waiting for message"),
+                    ("WritebehindWorkerThread", "for I/O completion on disk dm-%d", "dm-%d", None, "for I/O completion"),
+                    ("PrefetchWorkerThread", "for NSD I/O completion on node 10.0.0.%d <c0n%d>", "10.0.0.%d", None, "for NSD I/O completion"),
+                    ("FileBlockRandomWriteFetchHandlerThread", "on ThCond 0x1800AC0E628 (0x1800AC0E628) (LkObjCondvar), reason 'change_lock_shark waiting to set acquirePending flag'", None, "LkObjCondvar",
+                     "change_lock_shark waiting to set acquirePending flag"),
+                    ("SyncHandlerThread", "for RPC response from node 10.0.0.%d <c0n%d>", "10.0.0.%d", None, "for RPC response")]
+    if machineReadable:
+        out.write(machineReadableLine("mmdiag", ["HEADER", "version", "reserved", "reserved", "threadId", "threadAddr", "threadName", "waitStartTime", "waitTime", "isMonitored",
+                                                 "condVar", "condVarAddr", "condVarReason", "nodeIP", "ioDeviceName"], "waiters"))
+    else:
+        out.write("\n=== mmdiag: waiters ===\nWaiting threads:\n")
+    for number in range(scale['waiters']):
+        threadName, description, target, condVar, reason = descriptions[rand.randrange(len(descriptions))]
+        waitTime = rand.choice([0.0005, 0.01, 0.2, 1.5, 12.0, 95.0]) if rand.random() < 0.99 else rand.choice([400.0, 1200.0])
+        value = rand.randint(1, 32)
+        monitored = "ignored" if threadName.startswith("Msg handler") else "monitored"
+        if machineReadable:
+            targetValue = target % value if target else ""
+            out.write(machineReadableLine("mmdiag", [0, 1, "", "", 10000 + number, "0x%X" % (0x7F0000000000 + number), threadName, "2026-10-18_10%3A00%3A00", waitTime,
+                                                     "no" if monitored == "ignored" else "yes", condVar or "", "", reason, targetValue if targetValue.startswith("10.") else "",
+                                                     targetValue if targetValue.startswith("dm") else ""], "waiters"))
+        else:
+            text = description % ((value, value) if description.count("%d") == 2 else (value,)) if "%d" in description else description
+            out.write("Waiting %.4f sec since 10:00:00, %s, thread %d %s: %s\n" % (waitTime, monitored, 10000 + number, threadName, text))
+
+
+def generateIoHistory(out, scale, arguments):
+    """
+    Write the output of mmdiag --iohist, the service times are log-normal with a slow disk (dm-3)
+    """
+    rand = random.Random(scale['seed'])
+    bufferTypes = ["data"] * 6 + ["inode", "indBlock", "LLIndBlock", "logData", "diskDesc"]
+    out.write("\n=== mmdiag: iohist ===\n\nI/O history:\n\n")
+    out.write(" I/O start time RW    Buf type disk:sectorNum     nSec  time ms      Type  Device/NSD ID         NSD node\n")
+    out.write("--------------- -- ----------- ----------------- -----  ------- --------- ------------------ ---------------\n")
+    for number in range(scale['iohist']):
+        disk = rand.randrange(8)
+        latency = rand.lognormvariate(1.5, 0.8) * (8 if disk == 3 else 1)
+        seconds = 36000 + number * 0.01
+        start = "%02d:%02d:%09.6f" % (seconds // 3600, seconds % 3600 // 60, seconds % 60)
+        if rand.random() < 0.2:
+            # I/O through a NSD server
+            device = "C0A82DD5:4E63BD4%d  192.168.45.21%d" % (disk, disk % 4)
+            ioType = "Cli"
+        else:
+            device = "dm-" + str(disk)
+            ioType = "Srv"
+        out.write("%s  %s %11s %7d:%-9d %6d %8.3f %9s  %s\n" % (start, rand.choice("RRRW"), rand.choice(bufferTypes), disk + 1, rand.randrange(10 ** 9), rand.choice([8, 64, 2048]),
+                                                                latency, ioType, device))
+
+
+def generateMmdiag(out, scale, arguments):
+    """
+    Write the output of mmdiag for --waiters and --iohist
+    """
+    if "--waiters" in arguments:
+        generateWaiters(out, scale, arguments)
+    elif "--iohist" in arguments:
+        generateIoHistory(out, scale, arguments)
+
+
+def generateEmpty(out, scale, arguments):
+    """
+    Write nothing (stand-in for commands which are only checked for existence)
+    """
+
+
+def generateCallback(command):
+    """
+    Returns: the generator of mmaddcallback or mmdelcallback, which writes nothing and appends the arguments to MMFAKE_CALLBACKS
+    """
+    def generate(out, scale, arguments):
+        if os.environ.get("MMFAKE_CALLBACKS"):
+            with open(os.environ["MMFAKE_CALLBACKS"], "a") as callbackFile:
+                callbackFile.write(json.dumps([command] + arguments) + "\n")
+    return generate
+
+
+GENERATORS = {'mmgetstate': generateMmgetstate, 'mmlsfileset': generateMmlsfileset, 'mmlspool': generateMmlspool, 'mmrepquota': generateMmrepquota,
+              'mmlsquota': generateMmlsquota, 'mmlsfs': generateMmlsfs, 'mmlsmount': generateMmlsmount, 'mmdf': generateMmdf, 'mmpmon': generateMmpmon, 'mmdiag': generateMmdiag, 'mmfs': generateEmpty,
+              'mmaddcallback': generateCallback('mmaddcallback'), 'mmdelcallback': generateCallback('mmdelcallback')}
+
+
+def outputName(command, arguments):
+    """
+    Returns: the file name of the pre-generated output for command with arguments in MMFAKE_DATA
+    """
+    flags = "".join(sorted(x.lstrip("-") for x in arguments if x in ("-a", "-d", "-u", "-g", "-j") or x.startswith("--")))
+    return command + ("-" + flags if flags else "") + ".out"
+
+
+def generate(command, arguments, out, scale=None):
+    """
+    Write the synthetic output of command with arguments to the file object out
+    """
+    if scale is None:
+        scale = getScale()
+    GENERATORS[command](out, scale, arguments)
+
+
+################################################################################
+# # Main
+################################################################################
+if __name__ == '__main__':
+    command = os.path.basename(sys.argv[1])
+    arguments = sys.argv[2:]
+    if command not in GENERATORS:
+        sys.stderr.write("mmfake: unknown command " + command + "\n")
+        sys.exit(1)
+    dataDirectory = os.environ.get("MMFAKE_DATA")
+    if dataDirectory and os.path.isfile(os.path.join(dataDirectory, outputName(command, arguments))):
+        with open(os.path.join(dataDirectory, outputName(command, arguments)), "rb") as dataFile:
+            shutil.copyfileobj(dataFile, sys.stdout.buffer, 1 << 20)
+    else:
+        generate(command, arguments, sys.stdout)
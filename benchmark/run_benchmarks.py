@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+################################################################################
+# Name:    Benchmarks for check_spectrum_scale.py
+# Dependencies:
+#   - benchmark/mmfake.py and the stand-ins in benchmark/bin
+################################################################################
+
+################################################################################
+# Generates the mm* output at the requested scale, runs the checks against the
+# stand-ins in benchmark/bin and reports per check:
+#   wall    -    wall time of the check process (incl. interpreter startup)
+#   parse   -    t_parse of the plugin from --timings (summed over the devices)
+#   rss     -    peak resident set size of the check process
+#
+# Example:
+#   ./benchmark/run_benchmarks.py --filesets 100000 --quota-rows 1000000
+################################################################################
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCHMARK_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIRECTORY))
+sys.path.insert(0, BENCHMARK_DIRECTORY)
+
+import mmfake
+
+
+################################################################################
+# # Variable definition
+################################################################################
+PLUGIN = os.path.join(os.path.dirname(BENCHMARK_DIRECTORY), "check_spectrum_scale.py")
+STAND_IN_DIRECTORY = os.path.join(BENCHMARK_DIRECTORY, "bin")
+SCALES = {
+    'small': {'nodes': 16, 'filesets': 100, 'pools': 4, 'quotaRows': 10000, 'devices': 2, 'waiters': 200, 'iohist': 512},
+    'medium': {'nodes': 800, 'filesets': 10000, 'pools': 8, 'quotaRows': 1000000, 'devices': 4, 'waiters': 5000, 'iohist': 10000},
+    'large': {'nodes': 5000, 'filesets': 100000, 'pools': 16, 'quotaRows': 10000000, 'devices': 12, 'waiters': 50000, 'iohist': 100000},
+}
+
+
+# the phase times and rows of the plugin from --timings, prefixed with the label of a device (fs1::t_parse=)
+TIMINGS_PATTERN = re.compile(r"(?:^|\s|::)(t_parse|rows)=([0-9.]+)")
+
+
+################################################################################
+# # Function definition
+################################################################################
+# name, check arguments, generated command output
+BENCHMARKS = [
+    ('status', ['status', '-n', '-w', '2', '-c', '1'], ('mmgetstate', ['-LY'])),
+    ('status-all', ['status', '-a', '-w', '2', '-c', '1'], ('mmgetstate', ['-a', '-LY'])),
+    ('filesets', ['filesets', '-d', 'fs1', '-i'], ('mmlsfileset', ['fs1', '-Y'])),
+    ('filesets-size', ['filesets', '-d', 'fs1', '-i', '-s'], ('mmlsfileset', ['fs1', '-d', '-Y'])),
+    ('pools', ['pools', '-d', 'fs1'], ('mmlspool', ['fs1'])),
+    # the devices of mmlsfs all are served the output of fs1, rows and parse are summed over the devices
+    ('pools-all', ['pools', '-d', 'all'], ('mmlspool', ['fs1'])),
+    # the devices of mmlsmount all are served the mmdf output of fs1
+    ('filesystems', ['filesystems'], ('mmdf', ['fs1', '-Y'])),
+    ('waiters', ['waiters'], ('mmdiag', ['--waiters'])),
+    ('iolatency', ['iolatency'], ('mmdiag', ['--iohist'])),
+    ('quota', ['quota', '-d', 'fs1'], ('mmrepquota', ['-Y', 'fs1'])),
+    ('quota-top', ['quota', '-d', 'fs1', '--top', '20'], ('mmrepquota', ['-Y', 'fs1'])),
+    ('quota-all', ['quota', '-d', 'all'], ('mmrepquota', ['-Y', 'fs1'])),
+    ('quota-name-scan', ['quota', '-d', 'fs1', '-t', 'u', '-n', 'user42', '--full-scan'], ('mmrepquota', ['-Y', '-u', 'fs1'])),
+    # mmlsquota is answered by the stand-in directly, there is nothing to generate
+    ('quota-name', ['quota', '-d', 'fs1', '-t', 'u', '-n', 'user42'], None),
+    # the metrics file is written to the state directory, it has no phase timings
+    ('metrics', ['metrics', '-d', 'all', '-o', '{stateDirectory}/gpfs.prom'], ('mmrepquota', ['-Y', 'fs1'])),
+    # mmpmon reports counters which grow with the time, the stand-in answers it directly
+    ('io', ['io'], None),
+]
+
+
+def generateData(dataDirectory, scale):
+    """
+    Write the output of all benchmarked commands to dataDirectory
+
+    Return:
+        dict of the benchmark name and the path of the generated output
+    """
+    paths = {}
+    for name, checkArguments, generated in BENCHMARKS:
+        if generated is None:
+            continue
+        command, arguments = generated
+        path = os.path.join(dataDirectory, mmfake.outputName(command, arguments))
+        if not os.path.exists(path):
+            with open(path, "w") as output:
+                mmfake.generate(command, arguments, output, scale)
+        paths[name] = path
+    return paths
+
+
+def runCheck(checkArguments, environment, stateDirectory):
+    """
+    Run the plugin with checkArguments against the stand-ins
+
+    Return:
+        Tuple of wall time in seconds, peak RSS in MB, exit code, first output line, t_parse in seconds and rows
+        (None if the check reports no timings)
+    """
+    command = [sys.executable, PLUGIN, "--mmfs-bin", STAND_IN_DIRECTORY, "--no-sudo", "--no-cache", "--max-concurrent", "0", "--state-dir", stateDirectory, "--timings"]
+    command += [x.format(stateDirectory=stateDirectory) for x in checkArguments] + ["-T", "0"]
+    started = time.monotonic()
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, env=environment)
+    output = process.stdout.read()
+    process.stdout.close()
+    status, rusage = os.wait4(process.pid, 0)[1:]
+    wall = time.monotonic() - started
+    firstLine = output.decode(errors="replace").split("\n")[0]
+    timings = {}
+    for name, value in TIMINGS_PATTERN.findall(firstLine.partition("|")[2]):
+        timings[name] = timings.get(name, 0.0) + float(value)
+    # ru_maxrss is reported in KB on Linux
+    return wall, rusage.ru_maxrss / 1024.0, os.waitstatus_to_exitcode(status), firstLine, timings.get('t_parse'), timings.get('rows')
+
+
+def runBenchmarks(scale, repeat, selected):
+    """
+    Returns: list of dicts with the measurements of each benchmark (best of repeat runs)
+    """
+    results = []
+    with tempfile.TemporaryDirectory(prefix="check_spectrum_scale_benchmark.") as dataDirectory:
+        started = time.monotonic()
+        paths = generateData(dataDirectory, scale)
+        sys.stderr.write("generated output in " + str(round(time.monotonic() - started, 2)) + "s\n")
+        # the output which is not generated here is generated by the stand-ins at the same scale
+        environment = dict(os.environ, MMFAKE_DATA=dataDirectory)
+        environment.update((variable, str(scale[name])) for name, variable in mmfake.SCALE_ENVIRONMENT.items())
+        for name, checkArguments, generated in BENCHMARKS:
+            if selected and name not in selected:
+                continue
+            walls, parses, rss = [], [], 0.0
+            for run in range(repeat):
+                wall, peak, exitCode, firstLine, parse, rows = runCheck(checkArguments, environment, dataDirectory)
+                walls.append(wall)
+                rss = max(rss, peak)
+                if parse is not None:
+                    parses.append(parse)
+            results.append({'check': name, 'rows': int(rows) if rows is not None else None, 'wall': min(walls), 'parse': min(parses) if parses else None,
+                            'rss': rss, 'exitCode': exitCode, 'output': firstLine.partition("|")[0]})
+    return results
+
+
+def argumentParser():
+    """
+    Parse the arguments from the command line
+    """
+    parser = argparse.ArgumentParser(description='Benchmark check_spectrum_scale.py with synthetic mm* output')
+    parser.add_argument('--scale', dest='scale', choices=sorted(SCALES), help='Predefined scale (default=small)', default='small')
+    parser.add_argument('--nodes', dest='nodes', type=int, help='Number of nodes')
+    parser.add_argument('--filesets', dest='filesets', type=int, help='Number of filesets')
+    parser.add_argument('--pools', dest='pools', type=int, help='Number of storage pools')
+    parser.add_argument('--quota-rows', dest='quotaRows', type=int, help='Number of quota entries')
+    parser.add_argument('--devices', dest='devices', type=int, help='Number of file systems for -d all')
+    parser.add_argument('--waiters', dest='waiters', type=int, help='Number of waiters of mmdiag --waiters')
+    parser.add_argument('--iohist', dest='iohist', type=int, help='Number of I/Os of mmdiag --iohist')
+    parser.add_argument('--seed', dest='seed', type=int, help='Seed of the generated values (default=1)', default=1)
+    parser.add_argument('--repeat', dest='repeat', type=int, help='Runs per check, the best run is reported (default=3)', default=3)
+    parser.add_argument('--check', dest='checks', action='append', choices=[x[0] for x in BENCHMARKS], help='Run only this benchmark (repeatable)')
+    parser.add_argument('--json', dest='json', action='store_true', help='Print the results as JSON')
+    return parser
+
+
+################################################################################
+# # Main
+################################################################################
+if __name__ == '__main__':
+    args = argumentParser().parse_args()
+    scale = dict(SCALES[args.scale], seed=args.seed)
+    for name in ('nodes', 'filesets', 'pools', 'quotaRows', 'devices', 'waiters', 'iohist'):
+        if getattr(args, name) is not None:
+            scale[name] = getattr(args, name)
+
+    results = runBenchmarks(scale, max(1, args.repeat), args.checks)
+    if args.json:
+        print(json.dumps({'scale': scale, 'results': results}, indent=2))
+    else:
+        print("scale: " + ", ".join(name + "=" + str(value) for name, value in sorted(scale.items())))
+        print("%-16s %10s %10s %10s %10s  %s" % ("check", "rows", "wall [s]", "parse [s]", "rss [MB]", "output"))
+        for result in results:
+            rows = str(result['rows']) if result['rows'] is not None else "-"
+            parse = "%.3f" % result['parse'] if result['parse'] is not None else "-"
+            print("%-16s %10s %10.3f %10s %10.1f  %s" % (result['check'], rows, result['wall'], parse, result['rss'], result['output'][:60]))
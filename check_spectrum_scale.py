@@ -40,6 +40,39 @@ import sys
 import os
 import subprocess
 import re
+import time
+import hashlib
+import fcntl
+import tempfile
+import json
+import shlex
+import socket
+import socketserver
+import threading
+import signal
+import select
+import codecs
+import random
+import contextlib
+import resource
+import cProfile
+import tracemalloc
+import concurrent.futures
+import zlib
+import fnmatch
+import mmap
+import struct
+import grp
+import math
+import shutil
+import heapq
+import itertools
+import operator
+from array import array
+from urllib.parse import unquote
+
+# numpy of the quota evaluation, imported on the first use (see importNumpy), so the clients of the agent do not load it
+numpy = None
 
 
 
@@ -51,6 +84,132 @@ STATE_WARNING = 1
 STATE_CRITICAL = 2
 STATE_UNKNOWN = 3
 
+# Default deadline in seconds per mm* command, the command is killed when it is exceeded
+COMMAND_TIMEOUT = {'mmgetstate': 30, 'mmlsfileset': 120, 'mmlspool': 60, 'mmrepquota': 300, 'mmlsquota': 30, 'mmlsfs': 60, 'mmlsmount': 60, 'mmdf': 300, 'mmpmon': 30, 'mmdiag': 30, 'mmaddcallback': 60, 'mmdelcallback': 60}
+# Host-wide maximum of concurrently running mm* commands (0 disables the limit), set from the arguments
+MAX_CONCURRENT_COMMANDS = 4
+# Maximum seconds a command waits for a free slot, set from the arguments
+MAX_COMMAND_WAIT = 60.0
+
+# Default directory for the persistent state (e.g. data collected in the background)
+DEFAULT_STATE_DIRECTORY = "/var/lib/check_spectrum_scale"
+# Directory of the persistent state in use, set from the arguments
+STATE_DIRECTORY = DEFAULT_STATE_DIRECTORY
+
+# Unix socket of the agent which serves the precomputed check results
+AGENT_SOCKET = "/run/check_spectrum_scale/agent.sock"
+# Arguments which do not change the result of a check and are ignored to identify it in the agent
+AGENT_KEY_IGNORE = ('func', 'agentSocket', 'agentTimeout', 'cacheDirectory', 'noCache', 'cacheTtl', 'stateDirectory', 'maxConcurrent', 'maxWait', 'mmfsBin', 'noSudo', 'profile', 'traceMemory', 'backend', 'recordDirectory', 'rulesFile', 'deviceWorkers', 'requiredCommands')
+# Options of the agent process which change the result of a check, a client may only pass the value of the agent
+AGENT_SETTINGS = {'--rules': 'rulesFile', '--state-dir': 'stateDirectory', '--mmfs-bin': 'mmfsBin'}
+# Maximum number of checks the clients may add to the agent (the checks of the spec file are not counted)
+AGENT_MAX_CHECKS = 256
+# Seconds after a check added by a client is stopped if it is not requested anymore
+AGENT_IDLE_EXPIRY = 3600
+# Default seconds a client waits for the answer of the agent
+AGENT_TIMEOUT = 10.0
+# Options before the subcommand which take a value, a client of the agent skips them without the argument parser
+GLOBAL_VALUE_OPTIONS = ('--mmfs-bin', '--cache-dir', '--state-dir', '--max-concurrent', '--max-wait', '--agent-socket', '--agent-timeout', '--backend',
+                        '--record-dir', '--device-workers', '--rules', '--profile', '--trace-memory')
+# Functions of the checks which only report the state of the cluster, the agent and the all subcommand run no other
+# subcommands (they write files, register callbacks or start jobs at paths and with values of the caller)
+READ_ONLY_CHECKS = ('checkStatus', 'checkFileSets', 'checkPools', 'checkQuota', 'checkFileSystems', 'checkIo', 'checkWaiters', 'checkIoLatency')
+
+# Number of allocation sites in the tracemalloc report
+TRACE_MEMORY_TOP = 25
+
+# CommandMemo of the batch (see runBatch) the current thread runs a check for
+MEMO_CONTEXT = threading.local()
+# Number of checks of a batch which run concurrently
+BATCH_WORKERS = 8
+
+# Default command file of Icinga/Nagios for the passive results
+PASSIVE_COMMAND_FILE = "/var/run/icinga2/cmd/icinga2.cmd"
+# Default prefix of the service names of the passive results
+PASSIVE_SERVICE_PREFIX = "GPFS"
+
+# Number of devices which are checked concurrently by a check of several devices, set from the arguments
+DEVICE_WORKERS = 4
+
+# Number of quota entries which are collected before they are evaluated in one batch
+QUOTA_CHUNK_SIZE = 65536
+# Number of mmlsquota queries of a quota check for several names which run concurrently
+QUOTA_QUERY_WORKERS = 8
+
+# Number of samples per metric in the history of the forecasts
+HISTORY_WINDOW = 48
+# Minimum number of samples of a metric before it is forecasted
+HISTORY_MIN_SAMPLES = 3
+# Number of metric slots the history file is created with, it doubles when it is full
+HISTORY_SLOTS = 1024
+# Seconds after the history of a metric without new samples (e.g. a deleted user or fileset) is removed
+HISTORY_EXPIRY = 7 * 86400
+# Percent of the quota from which the usage of a quota entry is kept in the history
+HISTORY_QUOTA_MIN_USAGE = 50
+
+# Rules file with thresholds and exclusions per node, fileset, pool and quota entry (None for no rules), set from the arguments
+RULES_FILE = None
+# RuleSet per rules file with the modification time and size it was read with, shared by the checks of a process
+RULE_SET_CACHE = {}
+RULE_SET_LOCK = threading.Lock()
+# Counters of the mmpmon fs_io_s and io_s responses: bytes read/written, opens, closes, reads, writes, readdir and inode updates
+IO_COUNTERS = ('br', 'bw', 'oc', 'cc', 'rdc', 'wc', 'dir', 'iu')
+# Width of the counters in bits, the byte counters are 64 bit and the operation counters 32 bit which wrap
+IO_COUNTER_BITS = (64, 64, 32, 32, 32, 32, 32, 32)
+# Names of the counters in the performance data
+IO_COUNTER_LABELS = ('read', 'write', 'opens', 'closes', 'reads', 'writes', 'readdir', 'inodeUpdates')
+
+# Waiter line of mmdiag --waiters, e.g. Waiting 6.8571 sec since 16:43:58, monitored, thread 27296 WritebehindWorkerThread: for I/O completion on disk dm-3
+WAITER_PATTERN = re.compile(r"(?:0x[0-9A-Fa-f]+ )?[Ww]aiting ([0-9.]+) sec(?:onds)?(?: since [^,]*)?,(?: (monitored|ignored),)? thread (\d+) ([^:]*): ?(.*)")
+# Explicit reason of a waiter, e.g. reason 'waiting for message'
+WAITER_REASON_PATTERN = re.compile(r"reason '([^']*)'")
+# Node or disk a waiter waits for, e.g. on disk dm-3, from node 10.0.0.5 <c0n3>
+WAITER_TARGET_PATTERN = re.compile(r" (?:on disk|from node|to node|on node) (\S+)")
+# Addresses and numbers which are removed from a waiter description to get its reason
+WAITER_NUMBER_PATTERN = re.compile(r"\(?0x[0-9A-Fa-f]+\)?|\b\d+\b")
+
+# Buckets per doubling of the latency histograms (relative error of a percentile about 9%) and the smallest latency in ms
+LATENCY_BUCKETS_PER_OCTAVE = 8
+LATENCY_MIN = 0.001
+# Number of latency buckets, the last one holds the latencies over about 134 seconds
+LATENCY_BUCKETS = 27 * LATENCY_BUCKETS_PER_OCTAVE
+# Percentiles of the latency histograms in the performance data
+LATENCY_PERCENTILES = (50, 95, 99)
+
+# Bytes of the metric samples of a family which are kept in memory before they are spooled to a temporary file
+METRICS_SPOOL_SIZE = 1 << 20
+# Number of metric samples of a family which are buffered before they are written to its spool
+METRICS_BUFFER_SAMPLES = 4096
+# Bytes per unit of the mm* commands
+UNIT_BYTES = {'KB': 1024, 'MB': 1024 ** 2, 'GB': 1024 ** 3, 'TB': 1024 ** 4}
+
+# Kind of the rules per quota type of mmrepquota/mmlsquota
+QUOTA_RULE_KINDS = {'USR': 'user', 'GRP': 'group', 'FILESET': 'filesetquota'}
+
+# Default directory of the IBM Spectrum Scale commands
+DEFAULT_MMFS_BIN_DIRECTORY = "/usr/lpp/mmfs/bin"
+# Directory of the mm* commands in use (e.g. stand-ins for benchmarks), set from the arguments
+MMFS_BIN_DIRECTORY = DEFAULT_MMFS_BIN_DIRECTORY
+# Root-owned configuration of the helper sessions (mmfs-bin=<directory>), which run as root and ignore --mmfs-bin
+HELPER_CONFIG = "/etc/check_spectrum_scale/helper.conf"
+# Execute the mm* commands with sudo, set from the arguments
+USE_SUDO = True
+# Backend which executes the commands (subprocess, helper, record or replay), set from the arguments
+COMMAND_BACKEND = None
+
+# Default directory for the shared result cache of the mm* commands
+DEFAULT_CACHE_DIRECTORY = "/var/cache/check_spectrum_scale"
+# Directory of the result cache in use (None disables the cache), set from the arguments
+CACHE_DIRECTORY = DEFAULT_CACHE_DIRECTORY
+# Default time to live in seconds of cached output per mm* command (0 disables the cache)
+CACHE_TTL = {'mmgetstate': 30, 'mmlsfileset': 120, 'mmlspool': 120, 'mmrepquota': 240, 'mmlsquota': 60, 'mmlsfs': 600, 'mmlsmount': 60, 'mmdf': 600, 'mmpmon': 0, 'mmdiag': 10}
+
+# Events of mmaddcallback which update the node state file of status -E
+NODE_STATE_EVENTS = ('nodeJoin', 'nodeLeave', 'quorumReached', 'quorumLoss', 'shutdown', 'startup')
+# Identifier of the callback registered with mmaddcallback
+NODE_STATE_CALLBACK = "check_spectrum_scale_nodestate"
+# Seconds after the node state file of status -E is reconciled with mmgetstate
+NODE_STATE_RECONCILE = 3600
 
 
 ################################################################################
@@ -84,22 +243,696 @@ class CheckResult:
         else:
             self.longOutput = longOutput    
 
-    def printMonitoringOutput(self):
+    def addPerformanceData(self, performanceData):
         """
-        Print the result message with the performanceData,longOutput for the monitoring tool Nagios/Icinga with the given returnCode state.
-    
-        Error:
-            Prints unknown state if the all variables in the instance are default.
+        Append additional performance data separated by a blank to the existing one
+        """
+        if self.performanceData:
+            self.performanceData = self.performanceData.rstrip() + " " + performanceData
+        else:
+            self.performanceData = performanceData
+
+    def getMonitoringOutput(self):
+        """
+        Returns: the result message with the performanceData,longOutput for the monitoring tool Nagios/Icinga
         """
         returnText = self.returnMessage
         if self.performanceData is not None:
             returnText = returnText + "|" + self.performanceData
         if self.longOutput is not None:
             returnText = returnText + "\n" + self.longOutput
-            
-        print(returnText)
+        return returnText
+
+    def printMonitoringOutput(self):
+        """
+        Print the result message with the performanceData,longOutput for the monitoring tool Nagios/Icinga with the given returnCode state.
+    
+        Error:
+            Prints unknown state if the all variables in the instance are default.
+        """
+        print(self.getMonitoringOutput())
         sys.exit(self.returnCode)
         
+class CommandOutput(str):
+    """
+    Output string of a command with the informations if it was read from the cache, how old it is
+    and how long the command waited for a slot
+    """
+    
+    def __new__(cls, text, cached=False, age=0.0, queueTime=0.0):
+        output = str.__new__(cls, text)
+        output.cached = cached
+        output.age = age
+        output.queueTime = queueTime
+        return output
+
+class CommandTimeoutError(Exception):
+    """
+    Raised when a command exceeds its deadline or does not get a slot to run in time
+    """
+    
+    def __init__(self, command, reason, queueTime, executionTime):
+        self.command = command
+        self.queueTime = queueTime
+        self.executionTime = executionTime
+        name = getCommandName(command) or formatCommand(command)
+        Exception.__init__(self, name + " " + reason + " (queued " + str(round(queueTime, 1)) + "s, running " + str(round(executionTime, 1)) + "s)")
+        
+    def getPerformanceData(self):
+        """
+        Returns: the timing breakdown as performance data
+        """
+        return "t_queue=" + str(round(self.queueTime, 3)) + "s t_exec=" + str(round(self.executionTime, 3)) + "s"
+
+
+class CheckTimer:
+    """
+    Monotonic timers of the phases of a check (exec, parse, eval, output) and the number of parsed rows.
+    The phases are exclusive, a nested phase stops the time of the outer phase until it is left.
+    """
+    
+    PHASES = ('queue', 'exec', 'parse', 'eval', 'output')
+    
+    def __init__(self):
+        self.phases = dict.fromkeys(self.PHASES, 0.0)
+        self.rows = 0
+        self._phase = None
+        self._since = time.monotonic()
+        
+    def switch(self, phase):
+        """
+        Account the time since the last switch to the current phase and continue with phase (None stops the timer)
+        """
+        now = time.monotonic()
+        if self._phase is not None:
+            self.phases[self._phase] += now - self._since
+        self._phase = phase
+        self._since = now
+        
+    @contextlib.contextmanager
+    def phase(self, name):
+        """
+        Context in which the time is accounted to the phase name
+        """
+        previous = self._phase
+        self.switch(name)
+        try:
+            yield self
+        finally:
+            self.switch(previous)
+            
+    def iterate(self, lines):
+        """
+        Yield the lines of a CommandStream and account the time waiting for them to the exec phase,
+        so that the exec and the parse time of a streamed command are separated
+        """
+        iterator = iter(lines)
+        while True:
+            previous = self._phase
+            self.switch('exec')
+            try:
+                line = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self.switch(previous)
+            yield line
+            
+    def addCommand(self, output):
+        """
+        Move the time output (CommandOutput or CommandStream) waited for a slot from the exec to the queue phase
+        """
+        self.phases['exec'] = max(0.0, self.phases['exec'] - output.queueTime)
+        self.phases['queue'] += output.queueTime
+        
+    def getPerformanceData(self):
+        """
+        Returns: the time of each phase, the number of rows and the peak memory of the process as performance data
+        """
+        performanceData = " ".join("t_" + x + "=" + str(round(self.phases[x], 4)) + "s" for x in self.PHASES)
+        # ru_maxrss is reported in KB on Linux
+        return performanceData + " rows=" + str(self.rows) + " maxrss=" + str(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss) + "KB"
+
+
+class CommandStream:
+    """
+    Output lines of a command which are read incrementally from the pipe (or the cache), so that
+    the output is never held completely in memory. Closing the stream early terminates the command.
+    The command is killed with its process group if it exceeds the timeout.
+    """
+    
+    def __init__(self, command, cacheTtl=None, timeout=None):
+        # the command line identifies the command in the cache and the memo, the backends execute the argument list
+        self.command = formatCommand(command)
+        self.argv = getCommandArgv(command)
+        if cacheTtl is None:
+            cacheTtl = getCacheTtl(command)
+        self.cacheTtl = float(cacheTtl)
+        if timeout is None:
+            timeout = COMMAND_TIMEOUT.get(getCommandName(command), 0)
+        self.timeout = float(timeout)
+        self.cached = False
+        self.age = 0.0
+        self.returnCode = None
+        self.queueTime = 0.0
+        self.executionTime = 0.0
+        self._lines = self._generateLines()
+        
+    def __iter__(self):
+        return self._lines
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exception):
+        self.close()
+        
+    def close(self):
+        """
+        Stop reading the output, a running command is terminated and its output is not cached
+        """
+        self._lines.close()
+        
+    def _generateLines(self):
+        """
+        Returns: generator of the output lines from the memo of the batch, the cache or the executed command
+        """
+        memo = getattr(MEMO_CONTEXT, 'memo', None)
+        if memo is not None:
+            yield from memo.getLines(self)
+        else:
+            yield from self._readOutput()
+            
+    def _readOutput(self):
+        """
+        Returns: generator of the output lines from the cache or the executed command
+        """
+        if CACHE_DIRECTORY is None or self.cacheTtl <= 0:
+            yield from self._readProcess(None)
+            return
+        try:
+            os.makedirs(CACHE_DIRECTORY, mode=0o700, exist_ok=True)
+        except OSError:
+            # cache directory is not usable, fall back to a direct execution
+            yield from self._readProcess(None)
+            return
+        
+        key = hashlib.sha1(self.command.encode()).hexdigest()
+        cachePath = os.path.join(CACHE_DIRECTORY, key + ".out")
+        cacheFile = self._openCacheEntry(cachePath)
+        if cacheFile is None:
+            with open(os.path.join(CACHE_DIRECTORY, key + ".lock"), "a") as lockFile:
+                # only one process executes the command, all others wait and read its result
+                started = time.monotonic()
+                maxWait = MAX_COMMAND_WAIT + self.timeout if self.timeout > 0 else None
+                if not waitForLock(lockFile, maxWait):
+                    raise CommandTimeoutError(self.command, "did not get the result of a concurrent execution in time", time.monotonic() - started, 0.0)
+                self.queueTime = time.monotonic() - started
+                try:
+                    cacheFile = self._openCacheEntry(cachePath)
+                    if cacheFile is None:
+                        yield from self._readProcess(cachePath)
+                        return
+                finally:
+                    fcntl.flock(lockFile, fcntl.LOCK_UN)
+        with cacheFile:
+            yield from cacheFile
+            
+    def _openCacheEntry(self, path):
+        """
+        Returns: the opened cache entry or None if it is missing or expired
+        """
+        try:
+            age = time.time() - os.stat(path).st_mtime
+            if age < 0 or age >= self.cacheTtl:
+                return None
+            cacheFile = open(path)
+        except OSError:
+            return None
+        self.cached = True
+        self.age = age
+        # only the output of successful commands is cached
+        self.returnCode = 0
+        return cacheFile
+        
+    def _readProcess(self, cachePath):
+        """
+        Execute the command in a free slot of the host-wide limit and yield its output lines,
+        which are written to the cache entry cachePath (if given) once the command finished successfully
+        """
+        queueStarted = time.monotonic()
+        slotFile = acquireCommandSlot()
+        if slotFile is False:
+            raise CommandTimeoutError(self.command, "did not get a free slot within " + str(MAX_COMMAND_WAIT) + "s", self.queueTime + time.monotonic() - queueStarted, 0.0)
+        self.queueTime += time.monotonic() - queueStarted
+        
+        cacheFile = None
+        temporaryPath = None
+        if cachePath is not None:
+            try:
+                fd, temporaryPath = tempfile.mkstemp(dir=os.path.dirname(cachePath), prefix=".tmp")
+                cacheFile = os.fdopen(fd, "w")
+            except OSError:
+                temporaryPath = None
+        
+        started = time.monotonic()
+        execution = None
+        try:
+            execution = getCommandBackend().execute(self.argv)
+            for line in self._readLines(execution, started + self.timeout if self.timeout > 0 else None):
+                if cacheFile is not None:
+                    try:
+                        cacheFile.write(line)
+                    except OSError:
+                        cacheFile.close()
+                        cacheFile = None
+                yield line
+            self.returnCode = execution.wait()
+            self.executionTime = time.monotonic() - started
+            if cacheFile is not None and self.returnCode == 0:
+                cacheFile.close()
+                os.replace(temporaryPath, cachePath)
+                temporaryPath = None
+        finally:
+            if execution is not None:
+                execution.close()
+            if slotFile is not None:
+                slotFile.close()
+            if cacheFile is not None:
+                cacheFile.close()
+            if temporaryPath is not None:
+                try:
+                    os.unlink(temporaryPath)
+                except OSError:
+                    pass
+                
+    def _readLines(self, execution, deadline):
+        """
+        Yield the output lines of the execution, it is terminated when the deadline (time.monotonic) is exceeded
+        """
+        decoder = codecs.getincrementaldecoder("utf-8")("replace")
+        rest = ""
+        while True:
+            remaining = None
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    execution.terminate()
+                    self.executionTime = self.timeout
+                    raise CommandTimeoutError(self.command, "timed out after " + str(self.timeout) + "s", self.queueTime, self.executionTime)
+            chunk = execution.read(remaining)
+            if chunk is None:
+                continue
+            if not chunk:
+                break
+            lines = (rest + decoder.decode(chunk)).split("\n")
+            rest = lines.pop()
+            for line in lines:
+                yield line + "\n"
+        rest += decoder.decode(b"", True)
+        if rest:
+            yield rest
+        
+class SubprocessExecution:
+    """
+    Command which runs as child process in its own session (the default backend), with sudo if USE_SUDO is set
+    """
+    
+    def __init__(self, argv):
+        argv = list(argv)
+        if USE_SUDO:
+            argv = ["sudo"] + argv
+        self.process = subprocess.Popen(argv, stdout=subprocess.PIPE, start_new_session=True)
+        
+    def read(self, timeout=None):
+        """
+        Returns: the next chunk of the output, b"" at the end of the output or None if there is none within timeout seconds
+        """
+        fd = self.process.stdout.fileno()
+        if timeout is not None and not select.select([fd], [], [], timeout)[0]:
+            return None
+        return os.read(fd, 65536)
+    
+    def wait(self):
+        """
+        Returns: the exit code of the command
+        """
+        return self.process.wait()
+    
+    def terminate(self):
+        """
+        Stop the command with its process group
+        """
+        terminateProcessGroup(self.process)
+        
+    def close(self):
+        """
+        Release the execution, a running command is terminated
+        """
+        if self.process.poll() is None:
+            self.terminate()
+        self.process.stdout.close()
+        
+        
+class SubprocessBackend:
+    """
+    Executes each command in a new child process (fork and sudo per command)
+    """
+    
+    name = "subprocess"
+    
+    def execute(self, argv):
+        """
+        Returns: the started execution of the argument list
+        """
+        return SubprocessExecution(argv)
+    
+    def close(self):
+        pass
+    
+    
+class HelperExecution:
+    """
+    Command which is executed by a session of the HelperBackend, reads the frames of its output
+    """
+    
+    def __init__(self, backend, session, argv):
+        self.backend = backend
+        self.session = session
+        self.returnCode = None
+        self._buffer = b""
+        request = json.dumps(list(argv)).encode()
+        session.stdin.write(str(len(request)).encode() + b"\n" + request)
+        session.stdin.flush()
+        
+    def _readFrame(self):
+        """
+        Returns: the data of the next complete frame in the buffer, b"" for the exit frame or None if it is incomplete
+        """
+        newline = self._buffer.find(b"\n")
+        if newline < 0:
+            return None
+        status, length = (int(x) for x in self._buffer[:newline].split())
+        if len(self._buffer) < newline + 1 + length:
+            return None
+        data = self._buffer[newline + 1:newline + 1 + length]
+        self._buffer = self._buffer[newline + 1 + length:]
+        if status >= 0:
+            self.returnCode = status
+            return b""
+        return data
+        
+    def read(self, timeout=None):
+        """
+        Returns: the next chunk of the output, b"" at the end of the output or None if there is none within timeout seconds
+        """
+        if self.returnCode is not None:
+            return b""
+        data = self._readFrame()
+        if data is not None:
+            return data
+        fd = self.session.stdout.fileno()
+        if timeout is not None and not select.select([fd], [], [], timeout)[0]:
+            return None
+        chunk = os.read(fd, 65536)
+        if not chunk:
+            raise OSError("helper session exited with " + str(self.session.wait()))
+        self._buffer += chunk
+        return self._readFrame()
+    
+    def wait(self):
+        """
+        Returns: the exit code of the command
+        """
+        while self.read() != b"":
+            pass
+        return self.returnCode
+    
+    def terminate(self):
+        """
+        Stop the command together with the helper session, which can not be reused
+        """
+        terminateProcessGroup(self.session)
+        
+    def close(self):
+        """
+        Return the session to the backend or terminate it, if the command did not finish
+        """
+        if self.returnCode is None:
+            if self.session.poll() is None:
+                self.terminate()
+            self.session.stdin.close()
+            self.session.stdout.close()
+        else:
+            self.backend.release(self.session)
+            
+            
+class HelperBackend:
+    """
+    Executes the commands in long-lived helper sessions of this script (subcommand helper), which are
+    started once with sudo and receive the commands over a pipe:
+        request    -    "<length>\\n<JSON list of the arguments>"
+        response   -    frames "<status> <length>\\n<data>", status -1 for the output and the exit code in the last frame
+    A session runs one command at a time, concurrent commands start further sessions and idle sessions are reused.
+    """
+    
+    name = "helper"
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.idle = []
+        
+    def execute(self, argv):
+        """
+        Returns: the started execution of the argument list in an idle or a new session
+        """
+        session = None
+        with self.lock:
+            while self.idle and session is None:
+                session = self.idle.pop()
+                if session.poll() is not None:
+                    session = None
+        if session is None:
+            # the helper takes the directory of the mm* commands only from HELPER_CONFIG
+            helperArgv = [sys.executable, os.path.abspath(__file__), "helper"]
+            if USE_SUDO:
+                helperArgv = ["sudo", "-n"] + helperArgv
+            session = subprocess.Popen(helperArgv, stdin=subprocess.PIPE, stdout=subprocess.PIPE, start_new_session=True)
+        return HelperExecution(self, session, argv)
+    
+    def release(self, session):
+        """
+        Keep the session of a finished command for the next command
+        """
+        with self.lock:
+            self.idle.append(session)
+            
+    def close(self):
+        """
+        Stop the idle sessions
+        """
+        with self.lock:
+            sessions, self.idle = self.idle, []
+        for session in sessions:
+            session.stdin.close()
+            try:
+                session.wait(2.0)
+            except subprocess.TimeoutExpired:
+                terminateProcessGroup(session)
+            session.stdout.close()
+            
+            
+class RecordExecution:
+    """
+    Execution of another backend whose output and exit code are recorded for the ReplayBackend
+    """
+    
+    def __init__(self, execution, path, key):
+        self.execution = execution
+        self.path = path
+        self.key = key
+        fd, self.temporaryPath = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp")
+        self.recordFile = os.fdopen(fd, "wb")
+        
+    def read(self, timeout=None):
+        chunk = self.execution.read(timeout)
+        if chunk:
+            self.recordFile.write(chunk)
+        return chunk
+    
+    def wait(self):
+        returnCode = self.execution.wait()
+        self.recordFile.close()
+        os.replace(self.temporaryPath, self.path + ".out")
+        self.temporaryPath = None
+        writeFileAtomic(self.path + ".json", json.dumps({"command": self.key, "returnCode": returnCode, "timestamp": time.time()}))
+        return returnCode
+    
+    def terminate(self):
+        self.execution.terminate()
+        
+    def close(self):
+        self.execution.close()
+        self.recordFile.close()
+        if self.temporaryPath is not None:
+            try:
+                os.unlink(self.temporaryPath)
+            except OSError:
+                pass
+            
+            
+class RecordBackend:
+    """
+    Executes the commands with another backend and records their output in a directory
+    """
+    
+    name = "record"
+    
+    def __init__(self, directory, backend):
+        self.directory = directory
+        self.backend = backend
+        os.makedirs(directory, exist_ok=True)
+        
+    def execute(self, argv):
+        path, key = getRecordPath(self.directory, argv)
+        return RecordExecution(self.backend.execute(argv), path, key)
+    
+    def close(self):
+        self.backend.close()
+        
+        
+class ReplayExecution:
+    """
+    Recorded output and exit code of a command
+    """
+    
+    def __init__(self, path):
+        with open(path + ".json") as metaFile:
+            self.returnCode = json.load(metaFile)["returnCode"]
+        self.outputFile = open(path + ".out", "rb")
+        
+    def read(self, timeout=None):
+        return self.outputFile.read(65536)
+    
+    def wait(self):
+        return self.returnCode
+    
+    def terminate(self):
+        self.outputFile.close()
+        
+    def close(self):
+        self.outputFile.close()
+        
+        
+class ReplayBackend:
+    """
+    Serves the commands from the recordings of the RecordBackend without executing anything (offline runs)
+    """
+    
+    name = "replay"
+    
+    def __init__(self, directory):
+        self.directory = directory
+        
+    def execute(self, argv):
+        path, key = getRecordPath(self.directory, argv)
+        if not os.path.exists(path + ".json"):
+            raise OSError("no recording of '" + key + "' in " + self.directory)
+        return ReplayExecution(path)
+    
+    def close(self):
+        pass
+    
+    
+class CommandMemo:
+    """
+    In-memory output of the commands of a batch, each distinct command line is executed once and the
+    checks which request it concurrently wait for its output
+    """
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = {}
+        
+    def getLines(self, stream):
+        """
+        Args:
+            stream    -    CommandStream which requests the output, gets the cache and timing informations of the execution
+            
+        Return:
+            List of the output lines of the command of the stream
+        """
+        with self.lock:
+            entry = self.entries.get(stream.command)
+            owner = entry is None
+            if owner:
+                entry = self.entries[stream.command] = {'done': threading.Event(), 'lines': None, 'error': None, 'stream': stream}
+        
+        if owner:
+            try:
+                entry['lines'] = list(stream._readOutput())
+            except Exception as error:
+                entry['error'] = error
+                raise
+            finally:
+                entry['done'].set()
+        else:
+            started = time.monotonic()
+            entry['done'].wait()
+            if entry['error'] is not None:
+                raise entry['error']
+            execution = entry['stream']
+            stream.cached = execution.cached
+            stream.age = execution.age
+            stream.returnCode = execution.returnCode
+            stream.executionTime = execution.executionTime
+            stream.queueTime = time.monotonic() - started
+        return entry['lines']
+    
+    
+class MachineReadableRecord:
+    """
+    Data row of the machine-readable (-Y) output of a mm* command, the values are accessed by the header name
+    """
+    __slots__ = ('command', 'recordType', 'columns', 'fields')
+    
+    def __init__(self, command, recordType, columns, fields):
+        self.command = command
+        self.recordType = recordType
+        self.columns = columns
+        self.fields = fields
+        
+    def __getitem__(self, header):
+        """
+        Returns: the decoded value of the column header
+        """
+        value = self.fields[self.columns[header]]
+        if "%" in value:
+            value = unquote(value)
+        return value
+    
+    def get(self, header, default=None):
+        """
+        Returns: the decoded value of the column header or default if the column is missing
+        """
+        if header not in self.columns or self.columns[header] >= len(self.fields):
+            return default
+        return self[header]
+    
+    def getInt(self, header, default=0):
+        """
+        Returns: the value of the column header as integer or default if it is missing or empty
+        """
+        value = self.get(header)
+        if not value:
+            return default
+        return int(value)
+    
+    def __str__(self):
+        """
+        Returns: the string of the class"""
+        return "[" + self.command + ":" + self.recordType + " " + ", ".join(name + ": " + self.get(name, "") for name in self.columns) + "]"
+
 class PoolObject:
     """
     Simple class whtich holds informations about pools 
@@ -120,6 +953,11 @@ class PoolObject:
         self.criticalData = False;
         self.warningMeta = False;
         self.warningData = False;
+        self.hoursLeftData = None
+        self.hoursLeftMeta = None
+        # thresholds in percent, set from the arguments and the rules by collectPools
+        self.warning = None
+        self.critical = None
         
     def __str__(self):
         """
@@ -132,213 +970,2723 @@ class PoolObject:
     def _getUnitFaktor(self,unit):
         unit_dict={'KB':1000,'MB':1000000,'GB':1000000000,'TB':1000000000000}
         return unit_dict[unit]
-	
-class FileSetObject:
+    
+    def getBytes(self, value):
+        """
+        Returns: the value of the pool (e.g. dataFree) in bytes
+        """
+        return round(value * self.unitFaktor) * UNIT_BYTES[self.unit]
+
+
+class FileSystemObject:
     """
-    Simple class whtich holds informations about filesets
+    Simple class which holds informations about a file system: the nodes it is mounted on (mmlsmount) and
+    its capacity and inodes (mmdf, sizes in KB)
     """
-    
-    def __init__(self, filesystemName, filesetName, id, status, maxInodes, allocInodes, dataSize=0):
-        self.filesystemName = filesystemName
-        self.filesetName = filesetName
-        self.id = id
-        self.status = status
-        self.maxInodes = int(maxInodes)
-        self.allocInodes = int(allocInodes)
-        self.freeInodes = self.maxInodes - self.allocInodes
-        self.dataSize = dataSize
+
+    def __init__(self, name):
+        self.name = name
+        self.nodes = []
+        # set when the mmdf output was read, error holds the reason if it failed
+        self.diskFree = False
+        self.error = None
+        self.totalSize = 0
+        self.freeSize = 0
+        self.dataTotal = 0
+        self.dataFree = 0
+        self.metaTotal = 0
+        self.metaFree = 0
+        self.usedInodes = 0
+        self.freeInodes = 0
+        self.allocInodes = 0
+        self.maxInodes = 0
+        self.disks = 0
+        self.pools = []
+        self.warningData = False
+        self.criticalData = False
         self.warningInodes = False
         self.criticalInodes = False
+        # thresholds in percent, set from the arguments and the rules by collectFileSystems
+        self.warning = None
+        self.critical = None
+
+    def addDiskFreeRecord(self, record):
+        """
+        Take the values of a mmdf -Y record (nsd, poolTotal, data, metadata, fsTotal or inode)
+        """
+        recordType = record.recordType
+        if recordType == "nsd":
+            self.disks += 1
+        elif recordType == "poolTotal":
+            self.pools.append(record["poolName"])
+        elif recordType == "data":
+            self.dataTotal = record.getInt("totalData")
+            self.dataFree = record.getInt("freeBlocks") + record.getInt("freeFragments")
+        elif recordType == "metadata":
+            self.metaTotal = record.getInt("totalMetadata")
+            self.metaFree = record.getInt("freeBlocks") + record.getInt("freeFragments")
+        elif recordType == "fsTotal":
+            self.totalSize = record.getInt("fsSize")
+            self.freeSize = record.getInt("freeBlocks") + record.getInt("freeFragments")
+        elif recordType == "inode":
+            self.usedInodes = record.getInt("usedInodes")
+            self.freeInodes = record.getInt("freeInodes")
+            self.allocInodes = record.getInt("allocatedInodes")
+            self.maxInodes = record.getInt("maxInodes")
 
     def __str__(self):
         """
-        Returns: the string of the class""" 
-        text = "[filesetName: " + self.filesetName + ", id: " + str(self.id) + ", filesystemName: " + self.filesystemName + ", status: " + self.status + ", maxInodes: " + str(self.maxInodes)
-        text += ", allocInodes: " + str(self.allocInodes) + ", freeInodes: " + str(self.freeInodes) + ", dataSize: " + str(self.dataSize) + ", warningInodes: " + str(self.warningInodes) + ", criticalInodes: " + str(self.criticalInodes) + "]"
+        Returns: the string of the class"""
+        text = "[name: " + self.name + ", nodes: " + str(len(self.nodes)) + ", totalSize: " + str(self.totalSize) + ", freeSize: " + str(self.freeSize)
+        text += ", usedInodes: " + str(self.usedInodes) + ", maxInodes: " + str(self.maxInodes) + ", warningData: " + str(self.warningData) + ", criticalData: " + str(self.criticalData)
+        text += ", warningInodes: " + str(self.warningInodes) + ", criticalInodes: " + str(self.criticalInodes) + ", error: " + str(self.error) + "]"
         return text
+
+
+class IoObject:
+    """
+    Simple class which holds the mmpmon I/O counters of a filesystem (fs_io_s) or of the node (io_s) and their rates
+    """
+    
+    def __init__(self, name, timestamp, counters):
+        self.name = name
+        self.timestamp = timestamp
+        # values in the order of IO_COUNTERS
+        self.counters = counters
+        # per second in the order of IO_COUNTERS, None until there is a previous sample
+        self.rates = None
+        self.reset = False
+        self.warning = False
+        self.critical = False
+        
+    def getThroughput(self):
+        """
+        Returns: bytes read and written per second
+        """
+        return self.rates[0] + self.rates[1]
+    
+    def getOperations(self):
+        """
+        Returns: opens, closes, reads, writes and readdir per second
+        """
+        return sum(self.rates[2:7])
+    
+    def __str__(self):
+        """
+        Returns: the string of the class"""
+        return "[name: " + self.name + ", timestamp: " + str(self.timestamp) + ", counters: " + str(self.counters) + ", rates: " + str(self.rates) + ", reset: " + str(self.reset) + "]"
+    
+    
+class WaiterObject:
+    """
+    Simple class which holds a waiter of mmdiag --waiters: the thread, the seconds it waits, the reason and the node
+    or disk it waits for
+    """
+    __slots__ = ('thread', 'threadName', 'waitTime', 'reason', 'target', 'monitored')
+    
+    def __init__(self, thread, threadName, waitTime, reason, target=None, monitored=True):
+        self.thread = thread
+        self.threadName = threadName
+        self.waitTime = waitTime
+        self.reason = reason
+        self.target = target
+        self.monitored = monitored
+        
+    def __str__(self):
+        """
+        Returns: the string of the class"""
+        return "[thread: " + str(self.thread) + ", threadName: " + self.threadName + ", waitTime: " + str(self.waitTime) + ", reason: " + self.reason + ", target: " + str(self.target) + "]"
+    
+    
+class MetricsWriter:
+    """
+    Streaming writer of metrics in the Prometheus/OpenMetrics text format. The samples of a metric family have to
+    be contiguous in the output, so they are buffered and spooled per family (in memory up to METRICS_SPOOL_SIZE,
+    then to a temporary file) and copied to the output family by family.
+    """
+    
+    def __init__(self):
+        # name -> [help, type, spool, buffered samples]
+        self.families = {}
+        
+    def declare(self, name, help, type="gauge"):
+        """
+        Add the metric family name, the families are written in the order they were declared
+        """
+        if name not in self.families:
+            self.families[name] = [help, type, tempfile.SpooledTemporaryFile(max_size=METRICS_SPOOL_SIZE, mode="w+"), []]
+            
+    def add(self, name, labels, value):
+        """
+        Add a sample to the declared metric family name
+        
+        Args:
+            name      -    name of the metric family
+            labels    -    labels of the sample from formatLabels
+            value     -    value of the sample
+        """
+        family = self.families[name]
+        samples = family[3]
+        samples.append(name + labels + " " + str(value) + "\n")
+        if len(samples) >= METRICS_BUFFER_SAMPLES:
+            family[2].write("".join(samples))
+            del samples[:]
+            
+    def addRow(self, names, labels, values):
+        """
+        Add a sample with the same labels to each declared metric family of names, e.g. the columns of a quota entry
+        
+        Args:
+            names     -    names of the metric families
+            labels    -    labels of the samples from formatLabels
+            values    -    values of the samples in the order of names
+        """
+        families = self.families
+        for name, value in zip(names, values):
+            samples = families[name][3]
+            samples.append(name + labels + " " + str(value) + "\n")
+            if len(samples) >= METRICS_BUFFER_SAMPLES:
+                families[name][2].write("".join(samples))
+                del samples[:]
+            
+    @staticmethod
+    def escapeLabel(value):
+        """
+        Returns: the label value with backslash, double quote and line feed escaped
+        """
+        value = str(value)
+        if "\\" in value or '"' in value or "\n" in value:
+            return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        return value
+    
+    @staticmethod
+    def formatLabels(*labels):
+        """
+        Args:
+            labels    -    tuples of the name and the value of the labels
+            
+        Return:
+            Labels of a sample, e.g. {device="fs1",fileset="home"}
+        """
+        return "{" + ",".join(name + '="' + MetricsWriter.escapeLabel(value) + '"' for name, value in labels) + "}"
+    
+    @staticmethod
+    def writeAll(output, writers):
+        """
+        Write the metric families of writers to the file output, the samples of a family from all writers
+        are written together, followed by # EOF
+        """
+        names = []
+        for writer in writers:
+            names.extend(x for x in writer.families if x not in names)
+        for name in names:
+            families = [x.families[name] for x in writers if name in x.families]
+            output.write("# HELP " + name + " " + families[0][0] + "\n# TYPE " + name + " " + families[0][1] + "\n")
+            for family in families:
+                family[2].write("".join(family[3]))
+                del family[3][:]
+                family[2].seek(0)
+                shutil.copyfileobj(family[2], output, METRICS_SPOOL_SIZE)
+        output.write("# EOF\n")
+        
+    def close(self):
+        """
+        Remove the spooled samples
+        """
+        for family in self.families.values():
+            family[2].close()
+        self.families = {}
+        
+        
+class LatencyHistogram:
+    """
+    Histogram of latencies in logarithmic buckets with a constant size, the percentiles are estimated from
+    the buckets without holding or sorting the latencies
+    """
+    __slots__ = ('counts', 'count', 'max')
+    
+    def __init__(self):
+        self.counts = array('L', bytes(LATENCY_BUCKETS * array('L').itemsize))
+        self.count = 0
+        self.max = 0.0
+        
+    def add(self, latency):
+        """
+        Add a latency in ms
+        """
+        if latency > LATENCY_MIN:
+            bucket = min(int(math.log2(latency / LATENCY_MIN) * LATENCY_BUCKETS_PER_OCTAVE), LATENCY_BUCKETS - 1)
+        else:
+            bucket = 0
+        self.counts[bucket] += 1
+        self.count += 1
+        if latency > self.max:
+            self.max = latency
+            
+    def getPercentile(self, percentile):
+        """
+        Returns: the upper bound of the bucket of the percentile (at most the maximum) in ms, 0 if the histogram is empty
+        """
+        rank = math.ceil(self.count * percentile / 100.0)
+        cumulative = 0
+        for bucket, count in enumerate(self.counts):
+            cumulative += count
+            if count and cumulative >= rank:
+                if bucket == LATENCY_BUCKETS - 1:
+                    # the last bucket has no upper bound
+                    return self.max
+                return min(LATENCY_MIN * 2 ** ((bucket + 1) / LATENCY_BUCKETS_PER_OCTAVE), self.max)
+        return self.max
+    
+    
+class FileSetObject:
+    """
+    Simple class whtich holds informations about filesets
+    """
+    
+    def __init__(self, filesystemName, filesetName, id, status, maxInodes, allocInodes, dataSize=0):
+        self.filesystemName = filesystemName
+        self.filesetName = filesetName
+        self.id = id
+        self.status = status
+        self.maxInodes = int(maxInodes)
+        self.allocInodes = int(allocInodes)
+        self.freeInodes = self.maxInodes - self.allocInodes
+        self.dataSize = dataSize
+        self.warningInodes = False
+        self.criticalInodes = False
+        self.hoursLeftInodes = None
+        # thresholds in percent, set from the arguments and the rules by collectFileSets
+        self.warning = None
+        self.critical = None
+
+    def __str__(self):
+        """
+        Returns: the string of the class""" 
+        text = "[filesetName: " + self.filesetName + ", id: " + str(self.id) + ", filesystemName: " + self.filesystemName + ", status: " + self.status + ", maxInodes: " + str(self.maxInodes)
+        text += ", allocInodes: " + str(self.allocInodes) + ", freeInodes: " + str(self.freeInodes) + ", dataSize: " + str(self.dataSize) + ", warningInodes: " + str(self.warningInodes) + ", criticalInodes: " + str(self.criticalInodes) + "]"
+        return text
+    
+
+class QuotaObject:
+    """
+    Simple class whitch holds the name,type of a Violation and the corrosponding boolean values for block/File violation
+    """
+    __slots__ = ('name', 'type', 'filesetName', 'blockViolation', 'fileViolation', 'fileCritical', 'blockCritical', 'hoursLeftBlock', 'hoursLeftFiles')
+    
+    def __init__(self, name, type, filesetName=None):
+        self.name = name
+        self.type = type
+        self.filesetName = filesetName
+        self.blockViolation = False
+        self.fileViolation = False
+        self.fileCritical = False
+        self.blockCritical = False
+        self.hoursLeftBlock = None
+        self.hoursLeftFiles = None
+        
+    def isVioliation(self):
+        """
+        Returns: true if block or file violation flag is set
+        """
+        return self.blockViolation or self.fileViolation
+    
+    def isCritical(self):
+        """
+        Returns: true if block or file critical flag is set
+        """
+        return self.blockCritical or self.fileCritical
+    
+    def __str__(self):
+        """
+        Returns: the string of the class"""
+        return "[name: " + self.name + ", type: " + self.type + ", blockViolation: " + str(self.blockViolation) + ", blockCritical: " + str(self.blockCritical) + ", fileViolation: " + str(self.fileViolation) + ", fileCritical: " + str(self.fileCritical) + "]"
+    
+
+class QuotaTable:
+    """
+    Column store for quota entries, the numeric values are held in contiguous typed arrays and
+    are evaluated against the thresholds in one batched operation (with NumPy if it is available)
+    """
+    __slots__ = ('names', 'types', 'filesetNames', 'blockUsage', 'blockQuota', 'filesUsage', 'filesQuota', 'thresholds')
+    
+    def __init__(self):
+        self.clear()
+        
+    def __len__(self):
+        return len(self.names)
+        
+    def clear(self):
+        """
+        Remove all entries from the table
+        """
+        self.names = []
+        self.types = []
+        self.filesetNames = []
+        self.blockUsage = array('q')
+        self.blockQuota = array('q')
+        self.filesUsage = array('q')
+        self.filesQuota = array('q')
+        # own warning and critical thresholds of single entries (from the rules) by index
+        self.thresholds = {}
+        
+    def appendRecord(self, record, thresholds=None):
+        """
+        Append the quota entry of a mmrepquota/mmlsquota -Y MachineReadableRecord
+        
+        Args:
+            record        -    MachineReadableRecord of the entry
+            thresholds    -    tuple of the warning and critical threshold of the entry, None for the ones of the evaluation
+        """
+        if thresholds is not None:
+            self.thresholds[len(self.names)] = thresholds
+        fields = record.fields
+        columns = record.columns
+        self.names.append(record["name"])
+        self.types.append(fields[columns["quotaType"]])
+        self.filesetNames.append(record.get("filesetname", ""))
+        self.blockUsage.append(int(fields[columns["blockUsage"]]))
+        self.blockQuota.append(int(fields[columns["blockQuota"]]))
+        self.filesUsage.append(int(fields[columns["filesUsage"]]))
+        self.filesQuota.append(int(fields[columns["filesQuota"]]))
+        
+    def evaluate(self, warning, critical):
+        """
+        Args:
+            warning    -    warning threshold in percent of the quota
+            critical   -    critical threshold in percent of the quota
+            
+        Return:
+            List of QuotaObject for the entries which violate a threshold
+        """
+        return self.getQuotaObjects(self.getViolations(warning, critical))
+    
+    def getViolations(self, warning, critical):
+        """
+        Args:
+            warning    -    warning threshold in percent of the quota
+            critical   -    critical threshold in percent of the quota
+            
+        Return:
+            List of tuples (index, blockViolation, blockCritical, fileViolation, fileCritical) of the violating entries
+        """
+        if len(self) == 0:
+            return []
+        warningFactor = float(warning) / 100.0
+        criticalFactor = float(critical) / 100.0
+        if importNumpy() is not None:
+            violations = list(self._evaluateNumpy(warningFactor, criticalFactor))
+        else:
+            violations = self._evaluateArray(warningFactor, criticalFactor)
+        if self.thresholds:
+            # the few entries with own thresholds are evaluated again with them
+            violations = [x for x in violations if x[0] not in self.thresholds]
+            for idx, (rowWarning, rowCritical) in self.thresholds.items():
+                violation = self._evaluateRow(idx, float(rowWarning) / 100.0, float(rowCritical) / 100.0)
+                if violation is not None:
+                    violations.append(violation)
+            violations.sort()
+        return violations
+    
+    def getQuotaObjects(self, violations):
+        """
+        Returns: list of QuotaObject for the violations of getViolations
+        """
+        resultList = []
+        for idx, blockViolation, blockCritical, fileViolation, fileCritical in violations:
+            quotaObject = QuotaObject(self.names[idx], self.types[idx], self.filesetNames[idx])
+            quotaObject.blockViolation = blockViolation
+            quotaObject.blockCritical = blockCritical
+            quotaObject.fileViolation = fileViolation
+            quotaObject.fileCritical = fileCritical
+            resultList.append(quotaObject)
+        return resultList
+        
+    def _evaluateNumpy(self, warningFactor, criticalFactor):
+        """
+        Returns: tuples (index, blockViolation, blockCritical, fileViolation, fileCritical) of the violating entries
+        """
+        blockUsage = numpy.frombuffer(self.blockUsage, dtype=numpy.int64)
+        blockQuota = numpy.frombuffer(self.blockQuota, dtype=numpy.int64)
+        filesUsage = numpy.frombuffer(self.filesUsage, dtype=numpy.int64)
+        filesQuota = numpy.frombuffer(self.filesQuota, dtype=numpy.int64)
+        
+        # a quota of 0 means no limit
+        blockCritical = (blockQuota != 0) & (blockUsage > blockQuota * criticalFactor)
+        blockViolation = blockCritical | ((blockQuota != 0) & (blockUsage > blockQuota * warningFactor))
+        fileCritical = (filesQuota != 0) & (filesUsage > filesQuota * criticalFactor)
+        fileViolation = fileCritical | ((filesQuota != 0) & (filesUsage > filesQuota * warningFactor))
+        
+        indices = numpy.flatnonzero(blockViolation | fileViolation)
+        return zip(indices.tolist(), blockViolation[indices].tolist(), blockCritical[indices].tolist(), fileViolation[indices].tolist(), fileCritical[indices].tolist())
+        
+    def _evaluateArray(self, warningFactor, criticalFactor):
+        """
+        Returns: tuples (index, blockViolation, blockCritical, fileViolation, fileCritical) of the violating entries
+        """
+        # the candidates over the lower threshold are selected over the whole arrays with map and compress (the loops
+        # run in C), only the few candidates are evaluated per row
+        factor = itertools.repeat(min(warningFactor, criticalFactor))
+        blockCandidates = map(operator.gt, self.blockUsage, map(operator.mul, self.blockQuota, factor))
+        fileCandidates = map(operator.gt, self.filesUsage, map(operator.mul, self.filesQuota, factor))
+        # a quota of 0 means no limit
+        blockCandidates = map(operator.and_, map(operator.truth, self.blockQuota), blockCandidates)
+        fileCandidates = map(operator.and_, map(operator.truth, self.filesQuota), fileCandidates)
+        candidates = itertools.compress(itertools.count(), map(operator.or_, blockCandidates, fileCandidates))
+        return [self._evaluateRow(idx, warningFactor, criticalFactor) for idx in candidates]
+    
+    def _evaluateRow(self, idx, warningFactor, criticalFactor):
+        """
+        Returns: tuple (index, blockViolation, blockCritical, fileViolation, fileCritical) of the entry idx if it violates, None otherwise
+        """
+        blockUsage, blockQuota, filesUsage, filesQuota = self.blockUsage[idx], self.blockQuota[idx], self.filesUsage[idx], self.filesQuota[idx]
+        blockCritical = blockQuota != 0 and blockUsage > blockQuota * criticalFactor
+        blockViolation = blockCritical or (blockQuota != 0 and blockUsage > blockQuota * warningFactor)
+        fileCritical = filesQuota != 0 and filesUsage > filesQuota * criticalFactor
+        fileViolation = fileCritical or (filesQuota != 0 and filesUsage > filesQuota * warningFactor)
+        if blockViolation or fileViolation:
+            return (idx, blockViolation, blockCritical, fileViolation, fileCritical)
+        return None
+    
+    
+class QuotaRanking:
+    """
+    Top N quota entries by block and file utilization (percent of the quota) and by block and file usage,
+    each kept in a bounded min-heap while the report is streamed, and the usage of the user quota entries summed
+    per fileset. The memory grows with N (and the number of filesets), not with the number of entries.
+    """
+    KINDS = ('blockPercent', 'filesPercent', 'blockUsage', 'filesUsage')
+    __slots__ = ('size', 'heaps', 'filesets', 'rows')
+    
+    def __init__(self, size):
+        self.size = size
+        self.heaps = dict((x, []) for x in self.KINDS)
+        # filesetname -> [blockUsage, filesUsage, users]
+        self.filesets = {}
+        self.rows = 0
+        
+    def addTable(self, quotaTable):
+        """
+        Add the entries of a QuotaTable chunk, only the size largest values of each kind in the chunk are
+        candidates for the heaps
+        """
+        count = len(quotaTable)
+        self.rows += count
+        # a quota of 0 means no limit, the entry is not ranked by its utilization
+        blockPercent = [usage * 100.0 / quota if quota else -1.0 for usage, quota in zip(quotaTable.blockUsage, quotaTable.blockQuota)]
+        filesPercent = [usage * 100.0 / quota if quota else -1.0 for usage, quota in zip(quotaTable.filesUsage, quotaTable.filesQuota)]
+        for kind, values in (('blockPercent', blockPercent), ('filesPercent', filesPercent), ('blockUsage', quotaTable.blockUsage), ('filesUsage', quotaTable.filesUsage)):
+            heap = self.heaps[kind]
+            for idx in heapq.nlargest(self.size, range(count), key=values.__getitem__):
+                value = values[idx]
+                if value < 0 or (len(heap) >= self.size and value <= heap[0][0]):
+                    continue
+                entry = (quotaTable.names[idx], quotaTable.types[idx], quotaTable.filesetNames[idx], quotaTable.blockUsage[idx], quotaTable.blockQuota[idx],
+                         quotaTable.filesUsage[idx], quotaTable.filesQuota[idx])
+                if len(heap) < self.size:
+                    heapq.heappush(heap, (value, entry))
+                else:
+                    heapq.heapreplace(heap, (value, entry))
+        filesets = self.filesets
+        for quotaType, filesetName, blockUsage, filesUsage in zip(quotaTable.types, quotaTable.filesetNames, quotaTable.blockUsage, quotaTable.filesUsage):
+            if quotaType == "USR":
+                # the user entries of a fileset do not overlap, the group entries would count the usage twice
+                usage = filesets.get(filesetName)
+                if usage is None:
+                    usage = filesets[filesetName] = [0, 0, 0]
+                usage[0] += blockUsage
+                usage[1] += filesUsage
+                usage[2] += 1
+            
+    def getTop(self, kind):
+        """
+        Returns: list of tuples (value, entry) of kind (one of KINDS), the largest value first
+        """
+        return sorted(self.heaps[kind], reverse=True)
+    
+    def getFileSets(self):
+        """
+        Returns: list of tuples (filesetName, blockUsage, filesUsage, users) of the size filesets with the largest block usage of their users
+        """
+        return [(x[0],) + tuple(x[1]) for x in heapq.nlargest(self.size, self.filesets.items(), key=lambda x: x[1][0])]
+    
+    def getLongOutput(self):
+        """
+        Returns: the ranking as text for the long output
+        """
+        describe = lambda entry: entry[0] + " (" + entry[1] + (", " + entry[2] if entry[2] else "") + ")"
+        lines = ["Top " + str(self.size) + " of " + str(self.rows) + " quota entries"]
+        lines.append("Block Utilization: " + ", ".join(describe(entry) + " " + str(round(value, 1)) + "% of " + str(entry[4]) + "KB" for value, entry in self.getTop('blockPercent')))
+        lines.append("File Utilization: " + ", ".join(describe(entry) + " " + str(round(value, 1)) + "% of " + str(entry[6]) for value, entry in self.getTop('filesPercent')))
+        lines.append("Block Usage: " + ", ".join(describe(entry) + " " + str(value) + "KB" for value, entry in self.getTop('blockUsage')))
+        lines.append("File Usage: " + ", ".join(describe(entry) + " " + str(value) for value, entry in self.getTop('filesUsage')))
+        lines.append("FileSet Usage (users): " + ", ".join((name or "-") + " " + str(blockUsage) + "KB " + str(filesUsage) + " files " + str(users) + " users"
+                                                          for name, blockUsage, filesUsage, users in self.getFileSets()))
+        return "\n".join(lines)
+    
+    
+class QuotaIndex:
+    """
+    Persisted index of the entries of a quota report: a digest of the name, usage and limit fields and the
+    last evaluated state per (quotaType, id, filesetname), packed in one integer (digest << 4 | state bits).
+    Unchanged entries are not evaluated again and the violations which were entered or cleared since the
+    last run are tracked with the changed entries only. The thresholds and the digest of the rules file are
+    kept in the header, the states are not reused if they differ.
+    """
+    
+    VERSION = 2
+    
+    def __init__(self, path, warning, critical, rulesDigest=""):
+        self.path = path
+        self.warning = float(warning)
+        self.critical = float(critical)
+        self.rulesDigest = rulesDigest
+        self.previous = {}
+        self.previousNames = {}
+        self.reusable = False
+        self.entries = {}
+        self.names = {}
+        self.changedRows = 0
+        self.entered = []
+        self.cleared = []
+        self._seenPrevious = 0
+        self._columns = None
+        self._positions = None
+        try:
+            with open(path) as indexFile:
+                data = json.load(indexFile)
+            if data["version"] == self.VERSION:
+                self.previous = data["entries"]
+                self.previousNames = data["names"]
+                self.reusable = data["warning"] == self.warning and data["critical"] == self.critical and data.get("rules", "") == self.rulesDigest
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+        
+    def getKey(self, record):
+        """
+        Returns: tuple of the key and the digest of the quota entry of a MachineReadableRecord
+        """
+        if record.columns is not self._columns:
+            # positions of the key and digest fields, the columns are shared by all records of a header
+            columns = self._columns = record.columns
+            self._positions = (columns["quotaType"], columns["id"], columns.get("filesetname"), columns["name"], columns["filesGrace"] + 1)
+        typeColumn, idColumn, filesetColumn, firstColumn, lastColumn = self._positions
+        fields = record.fields
+        key = fields[typeColumn] + ":" + fields[idColumn] + ":" + (fields[filesetColumn] if filesetColumn is not None else "")
+        # the raw fields from the name to the last file field (usage, quota, limit, in doubt and grace of blocks and files)
+        digest = zlib.crc32(":".join(fields[firstColumn:lastColumn]).encode())
+        return key, digest
+    
+    @staticmethod
+    def _describe(key, name):
+        """
+        Returns: the name of an entry with its type and fileset, e.g. user1 (USR, home)
+        """
+        quotaType, id, filesetName = key.split(":", 2)
+        return name + " (" + quotaType + (", " + filesetName if filesetName else "") + ")"
+    
+    def getUnchanged(self, key, digest):
+        """
+        Returns: the stored state bits if the entry did not change since the last run, None otherwise
+        """
+        value = self.previous.get(key)
+        if value is None or value >> 4 != digest or not self.reusable:
+            return None
+        self.entries[key] = value
+        self._seenPrevious += 1
+        state = value & 15
+        if state:
+            self.names[key] = self.previousNames.get(key, "")
+        return state
+    
+    def getQuotaObject(self, key, state):
+        """
+        Returns: the QuotaObject of a stored entry with the state bits of a violation
+        """
+        quotaType, id, filesetName = key.split(":", 2)
+        quotaObject = QuotaObject(self.names[key], quotaType, filesetName)
+        quotaObject.blockViolation = bool(state & 1)
+        quotaObject.blockCritical = bool(state & 2)
+        quotaObject.fileViolation = bool(state & 4)
+        quotaObject.fileCritical = bool(state & 8)
+        return quotaObject
+    
+    def addEvaluated(self, quotaTable, keys, violations):
+        """
+        Store the state of the evaluated entries
+        
+        Args:
+            quotaTable    -    QuotaTable of the changed entries
+            keys          -    list of tuples of the key and the digest of each entry of the quotaTable
+            violations    -    violations of the quotaTable from getViolations
+        """
+        states = {}
+        for idx, blockViolation, blockCritical, fileViolation, fileCritical in violations:
+            states[idx] = blockViolation * 1 | blockCritical * 2 | fileViolation * 4 | fileCritical * 8
+        for idx, (key, digest) in enumerate(keys):
+            state = states.get(idx, 0)
+            self.entries[key] = digest << 4 | state
+            previous = self.previous.get(key)
+            if previous is not None:
+                self._seenPrevious += 1
+            previousState = previous & 15 if previous is not None else 0
+            if state:
+                self.names[key] = quotaTable.names[idx]
+                if not previousState:
+                    self.entered.append(self._describe(key, quotaTable.names[idx]))
+            elif previousState:
+                self.cleared.append(self._describe(key, self.previousNames.get(key, "")))
+        self.changedRows += len(keys)
+        
+    def finish(self):
+        """
+        Track the violations of the entries which are no longer in the report
+        
+        Return:
+            True if the index changed since the last run
+        """
+        removed = self._seenPrevious < len(self.previous)
+        if removed:
+            for key, previous in self.previous.items():
+                if previous & 15 and key not in self.entries:
+                    self.cleared.append(self._describe(key, self.previousNames.get(key, "")))
+        return removed or self.changedRows > 0
+        
+    def save(self):
+        """
+        Write the index atomically to its path
+        """
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        writeFileAtomic(self.path, json.dumps({"version": self.VERSION, "warning": self.warning, "critical": self.critical, "rules": self.rulesDigest, "entries": self.entries, "names": self.names}, separators=(",", ":")))
+        
+        
+class HistoryStore:
+    """
+    History of (timestamp, value) samples per metric in one memory-mapped file with a fixed-size slot per
+    metric. A slot holds a ring buffer of the last window samples and the sums of the linear regression
+    over them, so appending a sample and the forecast are O(1) and reading the samples is O(window).
+    The metric names are appended to <path>.names in the order of their slots. The metrics without a sample
+    for expiry seconds are removed when the store is closed, which compacts the slots and increments the
+    generation in the header and the names file (a mismatch after a crash starts the history anew).
+    The store is locked exclusively while it is open.
+    """
+    
+    MAGIC = b"CSSHIST1"
+    # magic, window, generation of the slots and names
+    HEADER = struct.Struct("<8sII")
+    # next position in the ring, number of samples, origin of the timestamps of the sums, sums of t, v, t*t and t*v
+    SLOT = struct.Struct("<III4d")
+    # timestamp, value
+    SAMPLE = struct.Struct("<Id")
+    
+    def __init__(self, path, window=HISTORY_WINDOW, expiry=HISTORY_EXPIRY):
+        self.path = path
+        self.window = int(window)
+        if self.window < 2:
+            raise ValueError("history window must be at least 2 samples")
+        self.expiry = float(expiry)
+        self.generation = 0
+        self.slotSize = self.SLOT.size + self.window * self.SAMPLE.size
+        self.slots = {}
+        self._newNames = []
+        self._map = None
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._file = os.fdopen(os.open(path, os.O_RDWR | os.O_CREAT, 0o644), "r+b")
+        try:
+            if not waitForLock(self._file, MAX_COMMAND_WAIT):
+                raise OSError("history " + path + " is locked by another check")
+            self._load()
+        except BaseException:
+            self._file.close()
+            raise
+        
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exception):
+        self.close()
+        
+    def _load(self):
+        """
+        Map the slots and read the metric names, a file of another window is started anew
+        """
+        header = self._file.read(self.HEADER.size)
+        try:
+            with open(self.path + ".names") as namesFile:
+                text = namesFile.read()
+        except FileNotFoundError:
+            text = ""
+        # a name without line break was not written completely
+        names = text[:text.rfind("\n") + 1]
+        namesGeneration = 0
+        if names.startswith("#generation "):
+            line, names = names.split("\n", 1)
+            namesGeneration = int(line.split()[1]) if line.split()[1].isdigit() else -1
+        magic, window, generation = self.HEADER.unpack(header) if len(header) == self.HEADER.size else (None, None, None)
+        if magic != self.MAGIC or window != self.window or generation != namesGeneration:
+            self._file.seek(0)
+            self._file.truncate()
+            self._file.write(self.HEADER.pack(self.MAGIC, self.window, 0))
+            self._file.flush()
+            names = ""
+            generation = 0
+        self.generation = generation
+        header = "#generation " + str(generation) + "\n" if generation else ""
+        if header + names != text:
+            writeFileAtomic(self.path + ".names", header + names)
+        size = os.fstat(self._file.fileno()).st_size
+        capacity = (size - self.HEADER.size) // self.slotSize
+        for name in names.split("\n")[:-1]:
+            if len(self.slots) < capacity:
+                self.slots[name] = len(self.slots)
+        if capacity > 0:
+            self._map = mmap.mmap(self._file.fileno(), size)
+            
+    def _allocate(self, name):
+        """
+        Returns: the offset of a new empty slot for the metric name
+        """
+        index = len(self.slots)
+        offset = self.HEADER.size + index * self.slotSize
+        if self._map is None or offset + self.slotSize > len(self._map):
+            capacity = max(HISTORY_SLOTS, 2 * index)
+            if self._map is not None:
+                self._map.close()
+            os.ftruncate(self._file.fileno(), self.HEADER.size + capacity * self.slotSize)
+            self._map = mmap.mmap(self._file.fileno(), self.HEADER.size + capacity * self.slotSize)
+        # the slot may hold samples of a name which was not written before a crash
+        self.SLOT.pack_into(self._map, offset, 0, 0, 0, 0.0, 0.0, 0.0, 0.0)
+        self.slots[name] = index
+        self._newNames.append(name)
+        return offset
+    
+    def _readRing(self, offset, head, count):
+        """
+        Returns: list of the (timestamp, value) samples of the slot at offset, oldest first
+        """
+        samples = offset + self.SLOT.size
+        first = (head - count) % self.window
+        return [self.SAMPLE.unpack_from(self._map, samples + ((first + x) % self.window) * self.SAMPLE.size) for x in range(count)]
+    
+    def getSamples(self, name):
+        """
+        Returns: list of the (timestamp, value) samples of the metric name, oldest first
+        """
+        index = self.slots.get(name)
+        if index is None:
+            return []
+        offset = self.HEADER.size + index * self.slotSize
+        head, count = self.SLOT.unpack_from(self._map, offset)[:2]
+        return self._readRing(offset, head, count)
+    
+    def addSample(self, name, timestamp, value, limit=None):
+        """
+        Append a sample to the history of the metric name, a sample with the timestamp of the last one
+        replaces it and older samples are ignored
+        
+        Args:
+            name         -    name of the metric
+            timestamp    -    time of the value in seconds since the epoch
+            value        -    value of the metric
+            limit        -    value at which the metric is exhausted, e.g. 0 for free space
+            
+        Return:
+            Hours until the regression line over the history reaches the limit (see forecastHours)
+        """
+        index = self.slots.get(name)
+        if index is None:
+            offset = self._allocate(name)
+        else:
+            offset = self.HEADER.size + index * self.slotSize
+        head, count, origin, sumT, sumV, sumTT, sumTV = self.SLOT.unpack_from(self._map, offset)
+        timestamp = int(timestamp)
+        value = float(value)
+        samples = offset + self.SLOT.size
+        last = samples + ((head - 1) % self.window) * self.SAMPLE.size
+        lastTimestamp, lastValue = self.SAMPLE.unpack_from(self._map, last) if count else (0, 0.0)
+        if count and timestamp == lastTimestamp:
+            self.SAMPLE.pack_into(self._map, last, timestamp, value)
+            sumV += value - lastValue
+            sumTV += (timestamp - origin) * (value - lastValue)
+        elif not count or timestamp > lastTimestamp:
+            if not count:
+                origin = timestamp
+            position = samples + head * self.SAMPLE.size
+            if count == self.window:
+                # the oldest sample is overwritten
+                oldTimestamp, oldValue = self.SAMPLE.unpack_from(self._map, position)
+                t = oldTimestamp - origin
+                sumT -= t
+                sumV -= oldValue
+                sumTT -= t * t
+                sumTV -= t * oldValue
+            else:
+                count += 1
+            self.SAMPLE.pack_into(self._map, position, timestamp, value)
+            t = timestamp - origin
+            sumT += t
+            sumV += value
+            sumTT += t * t
+            sumTV += t * value
+            head = (head + 1) % self.window
+            if head == 0:
+                # recompute the sums once per round relative to the oldest sample, which bounds the rounding errors
+                ring = self._readRing(offset, head, count)
+                origin = ring[0][0]
+                sumT = float(sum(x[0] - origin for x in ring))
+                sumV = sum(x[1] for x in ring)
+                sumTT = float(sum((x[0] - origin) ** 2 for x in ring))
+                sumTV = sum((x[0] - origin) * x[1] for x in ring)
+        else:
+            value = lastValue
+        self.SLOT.pack_into(self._map, offset, head, count, origin, sumT, sumV, sumTT, sumTV)
+        if limit is None:
+            return None
+        return forecastHours(count, sumT, sumV, sumTT, sumTV, value, limit)
+    
+    def prune(self):
+        """
+        Remove the metrics whose last sample is older than expiry seconds and move the remaining slots to the front
+        
+        Return:
+            Number of removed metrics
+        """
+        if self._map is None:
+            return 0
+        oldest = time.time() - self.expiry
+        kept = []
+        for name, index in sorted(self.slots.items(), key=lambda x: x[1]):
+            offset = self.HEADER.size + index * self.slotSize
+            head, count = self.SLOT.unpack_from(self._map, offset)[:2]
+            if count and self.SAMPLE.unpack_from(self._map, offset + self.SLOT.size + ((head - 1) % self.window) * self.SAMPLE.size)[0] >= oldest:
+                kept.append(name)
+        removed = len(self.slots) - len(kept)
+        if removed == 0:
+            return 0
+        # a crash before the names are written leaves different generations, which starts the history anew
+        self.generation += 1
+        self.HEADER.pack_into(self._map, 0, self.MAGIC, self.window, self.generation)
+        for newIndex, name in enumerate(kept):
+            index = self.slots[name]
+            if index != newIndex:
+                source = self.HEADER.size + index * self.slotSize
+                target = self.HEADER.size + newIndex * self.slotSize
+                self._map[target:target + self.slotSize] = self._map[source:source + self.slotSize]
+        self.slots = dict((name, index) for index, name in enumerate(kept))
+        self._map.flush()
+        size = self.HEADER.size + max(HISTORY_SLOTS, len(kept)) * self.slotSize
+        if size < len(self._map):
+            self._map.close()
+            os.ftruncate(self._file.fileno(), size)
+            self._map = mmap.mmap(self._file.fileno(), size)
+        with openFileAtomic(self.path + ".names", 0o644) as namesFile:
+            namesFile.write("#generation " + str(self.generation) + "\n" + "".join(x + "\n" for x in kept))
+        self._newNames = []
+        return removed
+    
+    def close(self):
+        """
+        Remove the expired metrics, write the names of the new metrics and release the lock
+        """
+        if self._file.closed:
+            return
+        try:
+            if self._map is not None:
+                self.prune()
+                self._map.close()
+            if self._newNames:
+                with open(self.path + ".names", "a") as namesFile:
+                    namesFile.write("\n".join(self._newNames) + "\n")
+                self._newNames = []
+        finally:
+            self._file.close()
+        
+        
+class Rule:
+    """
+    Simple class which holds a line of the rules file: the thresholds in percent (None for the ones of the
+    arguments) or the exclusion of the matching objects
+    """
+    __slots__ = ('index', 'kind', 'pattern', 'warning', 'critical', 'exclude')
+    
+    def __init__(self, index, kind, pattern, warning=None, critical=None, exclude=False):
+        self.index = index
+        self.kind = kind
+        self.pattern = pattern
+        self.warning = warning
+        self.critical = critical
+        self.exclude = exclude
+        
+    def getThresholds(self, warning, critical):
+        """
+        Returns: tuple of the warning and critical threshold of the rule, the given ones where the rule has none
+        """
+        return (warning if self.warning is None else self.warning, critical if self.critical is None else self.critical)
+    
+    def __str__(self):
+        """
+        Returns: the string of the class"""
+        return "[kind: " + self.kind + ", pattern: " + self.pattern + ", warning: " + str(self.warning) + ", critical: " + str(self.critical) + ", exclude: " + str(self.exclude) + "]"
+    
+    
+class RuleSet:
+    """
+    Rules per kind of object (node, fileset, pool, user, group, filesetquota) compiled for the lookup of
+    many names: plain names in a dict, globs ending with the only * in dicts per prefix length and all
+    other globs and regular expressions (re:) in combined regular expressions, one per literal prefix of
+    the patterns, so a name is only matched against the patterns which share its prefix. Regular
+    expressions with groups or global flags are matched on their own, their backreferences and group
+    names would change in the combined expression. The first matching rule in the order of the rules
+    file wins.
+    """
+    
+    KINDS = ('node', 'filesystem', 'fileset', 'pool', 'user', 'group', 'filesetquota')
+    
+    def __init__(self, digest=""):
+        self.digest = digest
+        self.rules = []
+        self._exact = {}
+        self._prefixes = {}
+        self._patterns = {}
+        self._combined = {}
+        self._separate = {}
+        
+    @staticmethod
+    def _getLiteralPrefix(expression):
+        """
+        Returns: the literal text every match of the regular expression starts with (may be empty)
+        """
+        if "|" in expression:
+            return ""
+        prefix = ""
+        for position, character in enumerate(expression):
+            if not (character.isalnum() or character in "_-:@%/="):
+                break
+            if expression[position + 1:position + 2] in ("?", "*", "+", "{"):
+                # the character may be missing or repeated
+                break
+            prefix += character
+        return prefix
+        
+    def __len__(self):
+        return len(self.rules)
+    
+    def add(self, kind, pattern, warning=None, critical=None, exclude=False):
+        """
+        Append a rule, the rules have to be compiled before they are matched
+        
+        Args:
+            kind        -    kind of the objects, one of KINDS
+            pattern     -    name, glob or regular expression with the prefix re:
+            warning     -    warning threshold in percent, None for the one of the arguments
+            critical    -    critical threshold in percent, None for the one of the arguments
+            exclude     -    exclude the matching objects from the check
+        """
+        if kind not in self.KINDS:
+            raise ValueError("unknown kind '" + kind + "', use one of " + ", ".join(self.KINDS))
+        rule = Rule(len(self.rules), kind, pattern, warning, critical, exclude)
+        if pattern.startswith("re:"):
+            expression = pattern[3:]
+            compiled = re.compile(expression)
+            if compiled.groups or re.match(r"\(\?[aiLmsux]+\)", expression):
+                self._separate.setdefault(kind, []).append((rule, compiled))
+            else:
+                self._patterns.setdefault(kind, []).append((rule, expression, self._getLiteralPrefix(expression)))
+        elif not any(x in pattern for x in "*?["):
+            self._exact.setdefault(kind, {}).setdefault(pattern, rule)
+        elif pattern.endswith("*") and not any(x in pattern[:-1] for x in "*?["):
+            self._prefixes.setdefault(kind, {}).setdefault(len(pattern) - 1, {}).setdefault(pattern[:-1], rule)
+        else:
+            literal = re.split(r"[*?\[]", pattern, 1)[0]
+            self._patterns.setdefault(kind, []).append((rule, fnmatch.translate(pattern), literal))
+        self.rules.append(rule)
+        
+    def compile(self):
+        """
+        Combine the patterns of each kind and literal prefix into one regular expression with a named group per rule
+        """
+        self._combined = {}
+        for kind, patterns in self._patterns.items():
+            groups = {}
+            for rule, expression, prefix in patterns:
+                groups.setdefault(len(prefix), {}).setdefault(prefix, []).append((rule, expression))
+            combined = self._combined[kind] = {}
+            for length, prefixes in groups.items():
+                combined[length] = {}
+                for prefix, rules in prefixes.items():
+                    expression = "|".join("(?P<r" + str(rule.index) + ">" + x + ")" for rule, x in rules)
+                    combined[length][prefix] = (re.compile(expression), dict(("r" + str(rule.index), rule) for rule, x in rules))
+            
+    def hasRules(self, kind):
+        """
+        Returns: true if there are rules of kind
+        """
+        return kind in self._exact or kind in self._prefixes or kind in self._combined or kind in self._separate
+    
+    def match(self, kind, name):
+        """
+        Returns: the first Rule of kind matching name, None if there is none
+        """
+        rule = None
+        exact = self._exact.get(kind)
+        if exact is not None:
+            rule = exact.get(name)
+        prefixes = self._prefixes.get(kind)
+        if prefixes is not None:
+            for length, rules in prefixes.items():
+                candidate = rules.get(name[:length]) if len(name) >= length else None
+                if candidate is not None and (rule is None or candidate.index < rule.index):
+                    rule = candidate
+        combined = self._combined.get(kind)
+        if combined is not None:
+            for length, expressions in combined.items():
+                expression = expressions.get(name[:length]) if len(name) >= length else None
+                match = expression[0].fullmatch(name) if expression is not None else None
+                if match is not None:
+                    candidate = expression[1][match.lastgroup]
+                    if rule is None or candidate.index < rule.index:
+                        rule = candidate
+        for candidate, expression in self._separate.get(kind, ()):
+            if rule is not None and rule.index < candidate.index:
+                break
+            if expression.fullmatch(name) is not None:
+                rule = candidate
+                break
+        return rule
+    
+    def isExcluded(self, kind, name):
+        """
+        Returns: true if the first rule of kind matching name excludes it
+        """
+        rule = self.match(kind, name)
+        return rule is not None and rule.exclude
+    
+    def getThresholds(self, kind, name, warning, critical):
+        """
+        Returns: tuple of the warning and critical threshold of the first rule of kind matching name, the given ones where it has none
+        """
+        rule = self.match(kind, name)
+        if rule is None:
+            return warning, critical
+        return rule.getThresholds(warning, critical)
+        
+        
+################################################################################
+# # Function definition
+################################################################################
+def importNumpy():
+    """
+    Returns: the numpy module, None if it is not installed (the quota evaluation falls back to the array module)
+    """
+    global numpy
+    if numpy is None:
+        try:
+            import numpy as module
+            numpy = module
+        except ImportError:
+            numpy = False
+    return numpy or None
+
+
+def parseMachineReadable(lines):
+    """
+    Single pass parser for the machine-readable (-Y) output of the mm* commands. The header to
+    column map is build once for each HEADER record and the following data rows of the same
+    record type (e.g. mmdf:nsd, mmdf:fsTotal) are yielded as they are read.
+    
+    Args:
+        lines    -    iterable of the output lines
+        
+    Return:
+        Generator of MachineReadableRecord
+    """
+    headers = {}
+    for line in lines:
+        fields = line.rstrip("\n").split(":")
+        if len(fields) < 3:
+            continue
+        key = (fields[0], fields[1])
+        if fields[2] == "HEADER":
+            columns = {}
+            for col, name in enumerate(fields):
+                columns.setdefault(name, col)
+            headers[key] = columns
+        elif key in headers:
+            yield MachineReadableRecord(fields[0], fields[1], headers[key], fields)
+
+
+def executeBashCommand(command, cacheTtl=None, timeout=None):
+    """
+    Args:
+        command    -    command to execute in bash
+        cacheTtl   -    seconds the output may be served from the cache (default from CACHE_TTL)
+        timeout    -    seconds after the command is killed (default from COMMAND_TIMEOUT, 0 for none)
+        
+    Return:
+        Returned string from command as CommandOutput
+    """
+    with streamBashCommand(command, cacheTtl, timeout) as stream:
+        text = "".join(stream)
+    return CommandOutput(text, cached=stream.cached, age=stream.age, queueTime=stream.queueTime)
+
+
+def streamBashCommand(command, cacheTtl=None, timeout=None):
+    """
+    Args:
+        command    -    command line (split on white space) or argument list to execute
+        cacheTtl   -    seconds the output may be served from the cache (default from CACHE_TTL)
+        timeout    -    seconds after the command is killed (default from COMMAND_TIMEOUT, 0 for none)
+        
+    Return:
+        CommandStream over the returned lines from command
+    """
+    return CommandStream(command, cacheTtl, timeout)
+
+
+def mmCommand(name, arguments=""):
+    """
+    Args:
+        name         -    name of the mm* command
+        arguments    -    arguments of the command
+        
+    Return:
+        Command line to execute the mm* command from MMFS_BIN_DIRECTORY (the backend adds sudo)
+    """
+    command = os.path.join(MMFS_BIN_DIRECTORY, name)
+    if arguments:
+        command += " " + arguments
+    return command
+
+
+def getCommandBackend():
+    """
+    Returns: the backend which executes the commands, SubprocessBackend if none is set
+    """
+    global COMMAND_BACKEND
+    if COMMAND_BACKEND is None:
+        COMMAND_BACKEND = SubprocessBackend()
+    return COMMAND_BACKEND
+
+
+def createCommandBackend(name, recordDirectory=None):
+    """
+    Args:
+        name               -    subprocess, helper, record or replay
+        recordDirectory    -    directory of the recordings for record and replay
+        
+    Return:
+        New command backend
+    """
+    if name == "helper":
+        return HelperBackend()
+    if name in ("record", "replay") and not recordDirectory:
+        raise ValueError("--record-dir is required for the " + name + " backend")
+    if name == "record":
+        return RecordBackend(recordDirectory, SubprocessBackend())
+    if name == "replay":
+        return ReplayBackend(recordDirectory)
+    return SubprocessBackend()
+
+
+def getRecordPath(directory, argv):
+    """
+    Returns: tuple of the path (without extension) of the recording of the argument list in directory
+             and the command line without the directory of the command, so recordings work with any --mmfs-bin
+    """
+    argv = list(argv)
+    key = formatCommand([os.path.basename(argv[0])] + argv[1:])
+    return os.path.join(directory, os.path.basename(argv[0]) + "-" + hashlib.sha1(key.encode()).hexdigest()[:16]), key
+
+
+def getHelperBinDirectory():
+    """
+    Returns: the directory of the mm* commands of the helper sessions, from HELPER_CONFIG if it is owned by root and
+             only writable by root, DEFAULT_MMFS_BIN_DIRECTORY otherwise
+    """
+    try:
+        with open(HELPER_CONFIG) as configFile:
+            status = os.fstat(configFile.fileno())
+            if status.st_uid != 0 or status.st_mode & 0o022:
+                return DEFAULT_MMFS_BIN_DIRECTORY
+            for line in configFile:
+                name, separator, value = line.split("#", 1)[0].partition("=")
+                if separator and name.strip() == "mmfs-bin" and os.path.isabs(value.strip()):
+                    return value.strip()
+    except OSError:
+        pass
+    return DEFAULT_MMFS_BIN_DIRECTORY
+
+
+def runHelper(args):
+    """
+    Helper session of the HelperBackend, which is started once with sudo. Executes the mm* commands
+    from the directory of getHelperBinDirectory it receives on stdin and writes their output as frames to stdout.
+    The directory of the caller (--mmfs-bin) is refused, it would let the caller run any mm* binary as root.
+    """
+    if any(x == "--mmfs-bin" or x.startswith("--mmfs-bin=") for x in sys.argv[1:]):
+        return CheckResult(STATE_UNKNOWN, "UNKNOWN - The helper does not accept --mmfs-bin, set mmfs-bin in " + HELPER_CONFIG)
+    running = []
+    
+    def stop(signum, frame):
+        for process in running:
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except OSError:
+                pass
+        os._exit(1)
+        
+    signal.signal(signal.SIGTERM, stop)
+    serveHelperRequests(sys.stdin.buffer, sys.stdout.buffer, getHelperBinDirectory(), running)
+    return CheckResult(STATE_OK, "OK - Helper session closed")
+
+
+def serveHelperRequests(requests, responses, binDirectory, running):
+    """
+    Execute the requests of a helper session until the end of requests
+    
+    Args:
+        requests        -    binary file with the requests "<length>\\n<JSON list of the arguments>"
+        responses       -    binary file for the output frames "<status> <length>\\n<data>"
+        binDirectory    -    directory of the mm* commands which may be executed
+        running         -    list of the running processes (for the termination of the session)
+    """
+    binDirectory = os.path.abspath(binDirectory)
+    while True:
+        header = requests.readline()
+        if not header:
+            break
+        try:
+            argv = json.loads(requests.read(int(header)).decode())
+        except ValueError:
+            argv = None
+        # only the mm* commands are executed with the privileges of the helper
+        if not isinstance(argv, list) or not argv or not all(isinstance(x, str) for x in argv) \
+                or os.path.dirname(os.path.abspath(argv[0])) != binDirectory or not os.path.basename(argv[0]).startswith("mm"):
+            responses.write(b"126 0\n")
+            responses.flush()
+            continue
+        try:
+            process = subprocess.Popen(argv, stdout=subprocess.PIPE, start_new_session=True)
+        except OSError:
+            responses.write(b"127 0\n")
+            responses.flush()
+            continue
+        running.append(process)
+        fd = process.stdout.fileno()
+        while True:
+            chunk = os.read(fd, 65536)
+            if not chunk:
+                break
+            responses.write(b"-1 " + str(len(chunk)).encode() + b"\n" + chunk)
+            responses.flush()
+        process.stdout.close()
+        returnCode = process.wait()
+        running.remove(process)
+        # killed by a signal like in the shell
+        if returnCode < 0:
+            returnCode = 128 - returnCode
+        responses.write(str(returnCode).encode() + b" 0\n")
+        responses.flush()
+
+
+def getCommandArgv(command):
+    """
+    Returns: the argument list of a command line (split on white space) or a copy of an argument list
+    """
+    if isinstance(command, str):
+        return command.split()
+    return list(command)
+
+
+def formatCommand(command):
+    """
+    Returns: the command line of an argument list (quoted like the shell), a command line unchanged
+    """
+    if isinstance(command, str):
+        return command
+    return " ".join(shlex.quote(x) for x in command)
+
+
+def getCommandName(command):
+    """
+    Returns: the name of the mm* command in the command line or argument list, None if there is none
+    """
+    for token in getCommandArgv(command):
+        name = os.path.basename(token)
+        if name.startswith("mm"):
+            return name
+    return None
+
+
+def getCacheTtl(command):
+    """
+    Args:
+        command    -    command line of a mm* command
+        
+    Return:
+        Default time to live of the cached output for the mm* command, 0 if not cacheable
+    """
+    return CACHE_TTL.get(getCommandName(command), 0)
+
+
+def waitForLock(lockFile, maxWait):
+    """
+    Args:
+        lockFile    -    opened file to lock exclusively
+        maxWait     -    maximum seconds to wait for the lock, None to wait without limit
+        
+    Return:
+        True if the lock was acquired, False if maxWait was exceeded
+    """
+    if maxWait is None:
+        fcntl.flock(lockFile, fcntl.LOCK_EX)
+        return True
+    deadline = time.monotonic() + maxWait
+    delay = 0.01
+    while True:
+        try:
+            fcntl.flock(lockFile, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except BlockingIOError:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(delay)
+            delay = min(delay * 2, 0.5)
+
+
+def acquireCommandSlot():
+    """
+    Wait for one of the MAX_CONCURRENT_COMMANDS host-wide slots, which are counting lock files in
+    the state directory. The slot is released by closing the returned file.
+    
+    Return:
+        Opened file of the locked slot, None if the limit is disabled or not usable,
+        False if no slot got free within MAX_COMMAND_WAIT seconds
+    """
+    if MAX_CONCURRENT_COMMANDS <= 0:
+        return None
+    slotDirectory = os.path.join(STATE_DIRECTORY, "slots")
+    slotFiles = []
+    try:
+        os.makedirs(slotDirectory, exist_ok=True)
+        for slot in range(MAX_CONCURRENT_COMMANDS):
+            slotFiles.append(open(os.path.join(slotDirectory, "slot." + str(slot)), "a"))
+    except OSError:
+        for slotFile in slotFiles:
+            slotFile.close()
+        return None
+    
+    # start at a random slot, so that the waiting processes do not all try the same one first
+    offset = random.randrange(len(slotFiles))
+    slotFiles = slotFiles[offset:] + slotFiles[:offset]
+    deadline = time.monotonic() + MAX_COMMAND_WAIT
+    delay = 0.01
+    acquired = False
+    try:
+        while True:
+            for slotFile in slotFiles:
+                try:
+                    fcntl.flock(slotFile, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    acquired = slotFile
+                    return slotFile
+                except BlockingIOError:
+                    continue
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(delay)
+            delay = min(delay * 2, 0.5)
+    finally:
+        for slotFile in slotFiles:
+            if slotFile is not acquired:
+                slotFile.close()
+
+
+def terminateProcessGroup(process, grace=2.0):
+    """
+    Terminate the process group of process (started with start_new_session) and kill it
+    if it is still running after grace seconds
+    """
+    for signum in (signal.SIGTERM, signal.SIGKILL):
+        try:
+            os.killpg(process.pid, signum)
+        except OSError:
+            pass
+        try:
+            process.wait(grace)
+            return
+        except subprocess.TimeoutExpired:
+            continue
+
+
+def writeFileAtomic(path, text):
+    """
+    Write the text to a temporary file in the same directory and rename it to path,
+    so that readers see either the old or the new content
+    """
+    with openFileAtomic(path) as temporaryFile:
+        temporaryFile.write(text)
+
+
+@contextlib.contextmanager
+def openFileAtomic(path, mode=0o600):
+    """
+    Context with a temporary file in the directory of path to write to, which is renamed to path when the
+    context is left without an error and removed otherwise
+    
+    Args:
+        path    -    path of the file
+        mode    -    permissions of the file
+    """
+    fd, temporaryPath = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as temporaryFile:
+            if mode != 0o600:
+                os.fchmod(temporaryFile.fileno(), mode)
+            yield temporaryFile
+        os.replace(temporaryPath, path)
+    except BaseException:
+        try:
+            os.unlink(temporaryPath)
+        except OSError:
+            pass
+        raise
+
+
+def spawnBackgroundJob(arguments):
+    """
+    Start this script with the arguments as detached process in its own session, which keeps
+    running after the check returned. The global cache and state settings are passed on.
+    
+    Args:
+        arguments    -    list of the subcommand and its arguments
+    """
+    command = [sys.executable, os.path.abspath(__file__), "--state-dir", STATE_DIRECTORY, "--mmfs-bin", MMFS_BIN_DIRECTORY]
+    if not USE_SUDO:
+        command.append("--no-sudo")
+    backend = getCommandBackend()
+    command += ["--backend", backend.name]
+    if backend.name in ("record", "replay"):
+        command += ["--record-dir", backend.directory]
+    if CACHE_DIRECTORY is None:
+        command.append("--no-cache")
+    else:
+        command += ["--cache-dir", CACHE_DIRECTORY]
+    subprocess.Popen(command + arguments, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, close_fds=True, start_new_session=True)
+
+
+def getFileSetSizePath(device):
+    """
+    Returns: the path of the file with the fileset data sizes of device collected in the background
+    """
+    return os.path.join(STATE_DIRECTORY, "filesetsizes-" + device + ".json")
+
+
+def readFileSetSizes(device):
+    """
+    Args:
+        device    -    device of the filesets
+        
+    Return:
+        Tuple of the dict filesetName->dataSize in KB and the age of the data in seconds, (None, None) if there is no data
+    """
+    try:
+        with open(getFileSetSizePath(device)) as sizeFile:
+            data = json.load(sizeFile)
+        return data["sizes"], max(0.0, time.time() - data["timestamp"])
+    except (OSError, ValueError, KeyError):
+        return None, None
+
+
+def refreshFileSetSizes(device):
+    """
+    Start the collection of the fileset data sizes of device in the background, if it is not already running
+    """
+    try:
+        os.makedirs(STATE_DIRECTORY, exist_ok=True)
+        with open(getFileSetSizePath(device) + ".lock", "a") as lockFile:
+            fcntl.flock(lockFile, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            fcntl.flock(lockFile, fcntl.LOCK_UN)
+    except OSError:
+        # collection is already in flight (or the state directory is not usable)
+        return
+    spawnBackgroundJob(["collect-sizes", "-d", device])
+
+
+def collectFileSetSizes(args):
+    """
+    Collect the data size of all filesets of the device with mmlsfileset -d, which needs several minutes,
+    and store them with a timestamp in the state directory. Only one collection runs per device.
+    """
+    os.makedirs(STATE_DIRECTORY, exist_ok=True)
+    sizePath = getFileSetSizePath(args.device)
+    with open(sizePath + ".lock", "a") as lockFile:
+        try:
+            fcntl.flock(lockFile, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return CheckResult(STATE_OK, "OK - Collection of the fileset data sizes of " + args.device + " is already running")
+        
+        timestamp = time.time()
+        sizes = {}
+        with streamBashCommand(mmCommand("mmlsfileset", args.device + " -d -Y"), 0, args.timeout) as output:
+            for record in parseMachineReadable(output):
+                sizes[record["filesetName"]] = record.getInt("dataInKB")
+        if output.returnCode != 0:
+            return CheckResult(STATE_UNKNOWN, "UNKNOWN - mmlsfileset failed with exit code " + str(output.returnCode))
+        writeFileAtomic(sizePath, json.dumps({"timestamp": timestamp, "sizes": sizes}))
+    return CheckResult(STATE_OK, "OK - Collected the data size of " + str(len(sizes)) + " filesets of " + args.device)
+
+
+def cachePerformanceData(output):
+    """
+    Args:
+        output     -    CommandOutput of executeBashCommand or CommandStream of streamBashCommand
+        
+    Return:
+        Performance data whether the output came from the cache and how old it is
+    """
+    return "cached=" + str(int(output.cached)) + " cacheAge=" + str(round(output.age, 1)) + "s"
+    
+    
+def readRuleSet(path):
+    """
+    Read and compile a rules file with one rule per line (# starts a comment):
+        <kind> <pattern> [warning=<percent>] [critical=<percent>] [exclude]
+    
+    Args:
+        path    -    path of the rules file
+        
+    Return:
+        RuleSet of the file
+    """
+    with open(path, "rb") as rulesFile:
+        text = rulesFile.read()
+    ruleSet = RuleSet(hashlib.sha1(text).hexdigest())
+    for number, line in enumerate(text.decode().split("\n"), 1):
+        try:
+            fields = line.split("#", 1)[0].split()
+            if not fields:
+                continue
+            if len(fields) < 2:
+                raise ValueError("kind and pattern are required")
+            options = {}
+            for field in fields[2:]:
+                name, separator, value = field.partition("=")
+                if field == "exclude":
+                    options["exclude"] = True
+                elif name in ("warning", "critical") and separator:
+                    options[name] = float(value)
+                else:
+                    raise ValueError("unknown option '" + field + "'")
+            if fields[0] == "node" and ("warning" in options or "critical" in options):
+                raise ValueError("node rules only support exclude")
+            ruleSet.add(fields[0], fields[1], **options)
+        except (ValueError, re.error) as error:
+            raise ValueError("rules file " + path + " line " + str(number) + ": " + str(error))
+    ruleSet.compile()
+    return ruleSet
+
+
+def getRuleSet():
+    """
+    Returns: the RuleSet of the rules file in use (empty without one), it is read again when the file changed
+    """
+    if RULES_FILE is None:
+        return RuleSet()
+    status = os.stat(RULES_FILE)
+    version = (status.st_mtime_ns, status.st_size)
+    with RULE_SET_LOCK:
+        cached = RULE_SET_CACHE.get(RULES_FILE)
+        if cached is None or cached[0] != version:
+            cached = (version, readRuleSet(RULES_FILE))
+            RULE_SET_CACHE[RULES_FILE] = cached
+    return cached[1]
+
+
+def getHistoryPath(name):
+    """
+    Returns: the path of the HistoryStore name in the state directory
+    """
+    return os.path.join(STATE_DIRECTORY, "history-" + name + ".dat")
+
+
+def openHistory(args, name):
+    """
+    Returns: the HistoryStore name for the window of args if a forecast threshold is set, None otherwise
+    """
+    if args.forecastWarning is None and args.forecastCritical is None:
+        return None
+    return HistoryStore(getHistoryPath(name), args.historyWindow)
+
+
+def forecastHours(count, sumT, sumV, sumTT, sumTV, value, limit):
+    """
+    Project when a metric reaches its limit with the slope of the linear regression over its history
+    
+    Args:
+        count     -    number of samples
+        sumT      -    sum of the timestamps (relative to any origin)
+        sumV      -    sum of the values
+        sumTT     -    sum of the squared timestamps
+        sumTV     -    sum of the timestamps times the values
+        value     -    latest value
+        limit     -    value at which the metric is exhausted
+        
+    Return:
+        Hours from the latest value to the limit, None if there are too few samples or the metric does not move towards the limit
+    """
+    if count < HISTORY_MIN_SAMPLES:
+        return None
+    denominator = count * sumTT - sumT * sumT
+    if denominator <= 0:
+        return None
+    slope = (count * sumTV - sumT * sumV) / denominator
+    if slope == 0:
+        return None
+    seconds = (limit - value) / slope
+    if seconds < 0:
+        return None
+    return seconds / 3600.0
+
+
+def getForecastState(hours, args):
+    """
+    Returns: STATE_CRITICAL or STATE_WARNING if the forecasted hours are within the forecast thresholds of args, STATE_OK otherwise
+    """
+    if hours is None:
+        return STATE_OK
+    if args.forecastCritical is not None and hours <= args.forecastCritical:
+        return STATE_CRITICAL
+    if args.forecastWarning is not None and hours <= args.forecastWarning:
+        return STATE_WARNING
+    return STATE_OK
+
+
+def forecastPerformanceData(states):
+    """
+    Args:
+        states    -    list of the forecast states of the metrics
+        
+    Return:
+        Performance data with the number of metrics which are forecasted within the warning and critical hours
+    """
+    return "forecastWarning=" + str(states.count(STATE_WARNING)) + " forecastCritical=" + str(states.count(STATE_CRITICAL))
+
+
+def checkRequirements(args=None):
+    """
+    Check if following tools are installed on the system:
+        -IBM Spectrum Scale
+        -the additional commands of the check (requiredCommands of its subcommand, e.g. mmdiag)
+        
+    Args:
+        args    -    parsed arguments of the check
+        
+    Return:
+        CheckResult in critical state if the requirements are missing, None otherwise
+    """
+
+    requiredCommands = ["mmgetstate", "mmlsfileset", "mmrepquota", "mmfs"]
+    missingCommands = [x for x in getattr(args, 'requiredCommands', []) if not os.path.isfile(os.path.join(MMFS_BIN_DIRECTORY, x))]
+    if missingCommands and os.path.isfile(os.path.join(MMFS_BIN_DIRECTORY, "mmfs")):
+        return CheckResult(STATE_CRITICAL, "CRITICAL - Missing IBM Spectrum Scale commands: " + ", ".join(missingCommands), "")
+    if not (os.path.isdir(MMFS_BIN_DIRECTORY) and all(os.path.isfile(os.path.join(MMFS_BIN_DIRECTORY, x)) for x in requiredCommands)):
+        checkResult = CheckResult()
+        checkResult.returnCode = STATE_CRITICAL
+        checkResult.returnMessage = "CRITICAL - No IBM Spectrum Scale Installation detected."
+        checkResult.performanceData = ""
+        return checkResult
+    return None
+    
+
+def getNodeStatePath():
+    """
+    Returns: the path of the file with the node state of the mmaddcallback events
+    """
+    return os.path.join(STATE_DIRECTORY, "nodestate.json")
+
+
+def readNodeState():
+    """
+    Returns: the dict of the node state file, None if there is none
+    """
+    try:
+        with open(getNodeStatePath()) as stateFile:
+            return json.load(stateFile)
+    except (OSError, ValueError):
+        return None
+
+
+def updateNodeState(function):
+    """
+    Apply function to the dict of the node state file and write it atomically, the events and the
+    reconciliation are serialized with a lock file
+    
+    Args:
+        function    -    function which changes the dict of the node state (an empty dict if there is no file)
+        
+    Return:
+        The dict of the node state
+    """
+    os.makedirs(STATE_DIRECTORY, exist_ok=True)
+    statePath = getNodeStatePath()
+    with open(statePath + ".lock", "a") as lockFile:
+        fcntl.flock(lockFile, fcntl.LOCK_EX)
+        nodeState = readNodeState() or {}
+        function(nodeState)
+        # the events are written by root, the checks read it as the monitoring user
+        with openFileAtomic(statePath, 0o644) as stateFile:
+            json.dump(nodeState, stateFile)
+    return nodeState
+
+
+def applyNodeEvent(nodeState, event, eventNodes, myNode, upNodes=None, downNodes=None):
+    """
+    Change the node state by a mmaddcallback event
+    
+    Args:
+        nodeState    -    dict of the node state
+        event        -    name of the event, one of NODE_STATE_EVENTS
+        eventNodes   -    list of the nodes of the event (%eventNode)
+        myNode       -    name of this node (%myNode)
+        upNodes      -    list of the nodes which are up (%upNodes), None if it is not passed
+        downNodes    -    list of the nodes which are down (%downNodes), None if it is not passed
+    """
+    down = set(nodeState.get("down", []))
+    nodesUp = nodeState.get("nodesUp", 0)
+    if event == "nodeJoin":
+        down.difference_update(eventNodes)
+        nodesUp += len(eventNodes)
+        if myNode in eventNodes:
+            nodeState["state"] = "active"
+    elif event == "nodeLeave":
+        down.update(eventNodes)
+        nodesUp -= len(eventNodes)
+        if myNode in eventNodes:
+            nodeState["state"] = "down"
+    elif event == "quorumReached":
+        nodeState["quorum"] = True
+        if nodeState.get("state") != "down":
+            nodeState["state"] = "active"
+    elif event == "quorumLoss":
+        nodeState["quorum"] = False
+        if nodeState.get("state") != "down":
+            nodeState["state"] = "arbitrating"
+    elif event == "startup":
+        nodeState["state"] = "active"
+    elif event == "shutdown":
+        nodeState["state"] = "down"
+    # the lists of the nodes which are up and down are exact, the counting above is the fallback
+    if upNodes is not None:
+        nodesUp = len(upNodes)
+    if downNodes is not None:
+        down = set(downNodes)
+    totalNodes = nodeState.get("totalNodes")
+    nodeState["nodesUp"] = max(0, min(nodesUp, totalNodes) if totalNodes is not None else nodesUp)
+    nodeState["down"] = sorted(down)
+    nodeState["event"] = event
+    nodeState["updated"] = time.time()
+    
+    
+def getNodeStateFromRecord(record):
+    """
+    Returns: the dict of the node state from the mmgetstate -LY record of the local node
+    """
+    return {"node": record["nodeName"], "state": record["state"], "quorum": True, "quorumNeeded": getQuorumNeeded(record),
+            "nodesUp": record.getInt("nodesUp"), "totalNodes": record.getInt("totalNodes"), "down": [], "event": None}
+    
+    
+def getNodeState(args, timer):
+    """
+    Get the node state from the file of the mmaddcallback events without any mm* command. If the file is missing
+    or was not reconciled for args.reconcile seconds, the state is read with mmgetstate -LY and written to the file,
+    unless an event arrived in the meantime.
+    
+    Args:
+        args     -    parsed arguments with reconcile, cacheTtl and timeout
+        timer    -    CheckTimer of the check
+        
+    Return:
+        Tuple of the dict of the node state and the CommandOutput of mmgetstate (None if the state is from the file)
+    """
+    with timer.phase('parse'):
+        nodeState = readNodeState()
+    if nodeState is not None and "totalNodes" in nodeState and time.time() - nodeState.get("reconciled", 0) <= args.reconcile:
+        timer.rows = 1
+        return nodeState, None
+    
+    with timer.phase('exec'):
+        output = executeBashCommand(mmCommand("mmgetstate", "-LY"), args.cacheTtl, args.timeout)
+    timer.addCommand(output)
+    with timer.phase('parse'):
+        record = next(parseMachineReadable(output.split("\n")), None)
+        if record is None:
+            return None, output
+        timer.rows = 1
+        reconciled = getNodeStateFromRecord(record)
+        reconciled["reconciled"] = reconciled["updated"] = time.time() - output.age
+        
+        def reconcile(nodeState):
+            if nodeState.get("updated", 0) <= reconciled["updated"]:
+                nodeState.clear()
+                nodeState.update(reconciled)
+        try:
+            updateNodeState(reconcile)
+        except OSError:
+            # the state is reconciled by the next check
+            pass
+    return reconciled, output
+
+
+def handleNodeEvent(args):
+    """
+    Handler of the events registered with mmaddcallback (callback subcommand), which updates the node state file
+    of status -E. It runs no mm* command, the callback is invoked by the GPFS daemon.
+    """
+    # GPFS substitutes an empty string if a node list does not apply to the event
+    splitNodes = lambda nodes: [x for x in nodes.split(",") if x] if nodes else None
+    nodeState = updateNodeState(lambda nodeState: applyNodeEvent(nodeState, args.event, splitNodes(args.eventNode) or [], args.myNode,
+                                                                 splitNodes(args.upNodes), splitNodes(args.downNodes)))
+    return CheckResult(STATE_OK, "OK - Node state updated by " + args.event + ": " + str(nodeState.get("state")) + ", " + str(nodeState["nodesUp"]) + " nodes are up")
+
+
+def getNodeStateCallbackParameters():
+    """
+    Returns: the parameter string of the event handler for mmaddcallback --parms, which GPFS splits on white space
+             after the substitution of the variables (= keeps the options when a node list is empty)
+    """
+    return " ".join(["--state-dir=" + STATE_DIRECTORY, "event", "--event=%eventName", "--event-node=%eventNode", "--my-node=%myNode",
+                     "--up-nodes=%upNodes", "--down-nodes=%downNodes"])
+
+
+def registerNodeStateCallback(args):
+    """
+    Register the event handler of this script for NODE_STATE_EVENTS with mmaddcallback, or remove it with mmdelcallback
+    """
+    if args.remove:
+        command = mmCommand("mmdelcallback", NODE_STATE_CALLBACK)
+    else:
+        command = [mmCommand("mmaddcallback"), NODE_STATE_CALLBACK, "--command", os.path.abspath(__file__), "--event", ",".join(NODE_STATE_EVENTS),
+                   "--async", "--parms", getNodeStateCallbackParameters()]
+    with streamBashCommand(command, 0, args.timeout) as output:
+        text = "".join(output).strip()
+    if output.returnCode != 0:
+        return CheckResult(STATE_CRITICAL, "CRITICAL - " + getCommandName(command) + " failed with exit code " + str(output.returnCode) + ": " + text)
+    if args.remove:
+        return CheckResult(STATE_OK, "OK - Removed the callback " + NODE_STATE_CALLBACK)
+    return CheckResult(STATE_OK, "OK - Registered the callback " + NODE_STATE_CALLBACK + " for " + ", ".join(NODE_STATE_EVENTS))
+
+
+def checkStatus(args):
+    """
+    Check depending on the arguments following settings:
+        - gpfs status
+        - quorum status
+	- nodes
+    """
+    if args.allNodes:
+        return checkAllNodes(args)
+    
+    checkResult = CheckResult()
+    timer = CheckTimer()
+    if args.events:
+        nodeState, output = getNodeState(args, timer)
+    else:
+        with timer.phase('exec'):
+            output = executeBashCommand(mmCommand("mmgetstate", "-LY"), args.cacheTtl, args.timeout)
+        timer.addCommand(output)
+        with timer.phase('parse'):
+            # the first row is the local node
+            record = next(parseMachineReadable(output.split("\n")), None)
+            nodeState = getNodeStateFromRecord(record) if record is not None else None
+            timer.rows = 1
+    if nodeState is None:
+        return CheckResult(STATE_UNKNOWN, "UNKNOWN - No node state in the output of mmgetstate")
+    
+    timer.switch('eval')
+    state = nodeState["state"]
+    quorumNeeded = nodeState["quorumNeeded"]
+    nodeName = nodeState["node"]
+    quorumsUp = nodeState["nodesUp"]
+    totalNodes = nodeState["totalNodes"]
+
+    if args.quorum: 
+        if quorumsUp < quorumNeeded :   
+            checkResult.returnCode = STATE_CRITICAL
+            checkResult.returnMessage = "Critical - GPFS is ReadOnly because only " + str(quorumsUp) + " nodes are online and " + str(quorumNeeded) + " are required for quorum"  
+        elif not nodeState["quorum"]:
+            checkResult.returnCode = STATE_CRITICAL
+            checkResult.returnMessage = "Critical - GPFS lost the quorum, " + str(quorumsUp) + " nodes are online and " + str(quorumNeeded) + " are required for quorum"
+        else:
+            checkResult.returnCode = STATE_OK
+            checkResult.returnMessage = "OK - " + str(quorumsUp) + " are up and " + str(quorumNeeded) + " are required for quorum"
+        checkResult.performanceData = "qourumUp=" + str(quorumsUp) + ";" + str(quorumNeeded) + ";;; quorumNeeded=" + str(quorumNeeded) + ";;; totalNodes=" + str(totalNodes)
+                
+    if args.status:                
+        if not(state == "active"):
+            checkResult.returnCode = STATE_CRITICAL
+            checkResult.returnMessage = "Critical - Node" + str(nodeName) + " is in state:" + str(state)
+        else:
+            checkResult.returnCode = STATE_OK
+            checkResult.returnMessage = "OK - Node " + str(nodeName) + " is in state:" + str(state)
+        checkResult.performanceData = "quorumUp=" + str(quorumsUp) + ";" + str(quorumNeeded) + ";;; quorumNeeded=" + str(quorumNeeded) + ";;; totalNodes=" + str(totalNodes)
+    if args.nodes:
+        if totalNodes < int(args.critical) :   
+            checkResult.returnCode = STATE_CRITICAL
+            checkResult.returnMessage = "Critical - Only " + str(totalNodes) + " are up"
+        elif totalNodes < int(args.warning) :
+            checkResult.returnCode = STATE_WARNING
+            checkResult.returnMessage = "WARNING - Only " + str(totalNodes) + " are up"
+        else:
+            checkResult.returnCode = STATE_OK
+            checkResult.returnMessage = "OK - " + str(totalNodes) + " are up"
+        checkResult.performanceData = "quorumsUp=" + str(quorumsUp) + ";" + str(quorumNeeded) + ";;; quorumNeeded=" + str(quorumNeeded) + ";;; totalNodes=" + str(totalNodes)
+   
+    if args.longOutput and nodeState["event"]:
+        checkResult.longOutput = "Last event: " + nodeState["event"] + " at " + time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(nodeState["updated"])) + "\n"
+        checkResult.longOutput += "Down nodes: " + ", ".join(nodeState["down"]) + "\n"
+    if output is not None:
+        checkResult.addPerformanceData(cachePerformanceData(output))
+    else:
+        checkResult.addPerformanceData("stateAge=" + str(round(time.time() - nodeState["updated"], 1)) + "s reconcileAge=" + str(round(time.time() - nodeState["reconciled"], 1)) + "s")
+    timer.switch(None)
+    if args.timings:
+        checkResult.addPerformanceData(timer.getPerformanceData())
+    return checkResult
+        
+    
+def getQuorumNeeded(record):
+    """
+    Returns: the number of quorum nodes needed from a mmgetstate -LY record
+    """
+    #filter asterix if tie braker disk is used
+    return int(record["quorum"].replace('*', '') or 0)
+
+
+def checkAllNodes(args):
+    """
+    Check the state of all nodes in the cluster with a single mmgetstate -a -LY:
+        - number of nodes per state
+        - down and arbitrating nodes
+        - quorum status
+    """
+    checkResult = CheckResult()
+    timer = CheckTimer()
+    with timer.phase('exec'):
+        output = executeBashCommand(mmCommand("mmgetstate", "-a -LY"), args.cacheTtl, args.timeout)
+    timer.addCommand(output)
+    
+    timer.switch('parse')
+    rules = getRuleSet()
+    nodesByState = {"active": [], "arbitrating": [], "down": []}
+    quorumNeeded = quorumsUp = totalNodes = None
+    excludedNodes = 0
+    for record in parseMachineReadable(output.split("\n")):
+        state = record["state"]
+        if quorumNeeded is None and state == "active":
+            # the quorum values are only reported by active nodes
+            quorumNeeded = getQuorumNeeded(record)
+            quorumsUp = record.getInt("nodesUp")
+            totalNodes = record.getInt("totalNodes")
+        timer.rows += 1
+        if rules.isExcluded("node", record["nodeName"]):
+            # e.g. nodes in maintenance, the quorum is still evaluated for the whole cluster
+            excludedNodes += 1
+            continue
+        nodesByState.setdefault(state, []).append(record["nodeName"])
+    
+    timer.switch('eval')
+    activeNodes = len(nodesByState["active"])
+    if totalNodes is None:
+        totalNodes = sum(len(x) for x in nodesByState.values())
+    else:
+        totalNodes -= excludedNodes
+    counts = ", ".join(x + ": " + str(len(nodesByState[x])) for x in sorted(nodesByState) if x != "active" and len(nodesByState[x]) > 0)
+    summary = str(activeNodes) + "/" + str(totalNodes) + " nodes active" + (" (" + counts + ")" if counts else "")
+    
+    if quorumNeeded is None:
+        checkResult.returnCode = STATE_CRITICAL
+        checkResult.returnMessage = "Critical - No node is active: " + summary
+    elif quorumsUp < quorumNeeded:
+        checkResult.returnCode = STATE_CRITICAL
+        checkResult.returnMessage = "Critical - Quorum lost, only " + str(quorumsUp) + " nodes are up and " + str(quorumNeeded) + " are required: " + summary
+    elif activeNodes < int(args.critical):
+        checkResult.returnCode = STATE_CRITICAL
+        checkResult.returnMessage = "Critical - Only " + summary
+    elif activeNodes < int(args.warning) or len(nodesByState["arbitrating"]) > 0:
+        checkResult.returnCode = STATE_WARNING
+        checkResult.returnMessage = "WARNING - " + summary
+    else:
+        checkResult.returnCode = STATE_OK
+        checkResult.returnMessage = "OK - " + summary
+        
+    timer.switch('output')
+    checkResult.performanceData = "active=" + str(activeNodes) + ";" + str(args.warning) + ";" + str(args.critical) + ";0;" + str(totalNodes)
+    for state in sorted(nodesByState):
+        if state != "active":
+            checkResult.performanceData += " " + state + "=" + str(len(nodesByState[state])) + ";;;0;" + str(totalNodes)
+    checkResult.performanceData += " quorumUp=" + str(quorumsUp or 0) + ";" + str(quorumNeeded or 0) + ";;; quorumNeeded=" + str(quorumNeeded or 0) + ";;; totalNodes=" + str(totalNodes)
+    if excludedNodes:
+        checkResult.performanceData += " excluded=" + str(excludedNodes)
+    
+    if args.longOutput:
+        checkResult.longOutput = "Down Nodes: " + ", ".join(nodesByState["down"]) + "\n"
+        checkResult.longOutput += "Arbitrating Nodes: " + ", ".join(nodesByState["arbitrating"]) + "\n"
+        for state in sorted(nodesByState):
+            if state not in ("active", "arbitrating", "down"):
+                checkResult.longOutput += state[0].upper() + state[1:] + " Nodes: " + ", ".join(nodesByState[state]) + "\n"
+    checkResult.addPerformanceData(cachePerformanceData(output))
+    timer.switch(None)
+    if args.timings:
+        checkResult.addPerformanceData(timer.getPerformanceData())
+    return checkResult
+        
+    
+def parseDiskFree(lines, fileSystemObject):
+    """
+    Read the mmdf -Y output of a file system into fileSystemObject
+    
+    Args:
+        lines               -    iterable of the output lines
+        fileSystemObject    -    FileSystemObject of the device
+        
+    Return:
+        Number of parsed records
+    """
+    rows = 0
+    for record in parseMachineReadable(lines):
+        fileSystemObject.addDiskFreeRecord(record)
+        rows += 1
+    fileSystemObject.diskFree = rows > 0
+    return rows
+
+
+def collectDiskFree(fileSystemObject, args):
+    """
+    Read the capacity and the inodes of a file system with mmdf -Y, the output is cached per device
+    because mmdf has to scan the allocation maps
+    
+    Args:
+        fileSystemObject    -    FileSystemObject of the device, error is set if mmdf failed
+        args                -    parsed arguments with cacheTtl and timeout
+        
+    Return:
+        Tuple of the number of parsed records and the CommandStream of mmdf
+    """
+    output = streamBashCommand(mmCommand("mmdf", fileSystemObject.name + " -Y"), args.cacheTtl, args.timeout)
+    try:
+        with output:
+            rows = parseDiskFree(output, fileSystemObject)
+    except CommandTimeoutError as error:
+        fileSystemObject.error = str(error)
+        return 0, output
+    if output.returnCode != 0:
+        fileSystemObject.error = "mmdf failed with exit code " + str(output.returnCode)
+    elif not fileSystemObject.diskFree:
+        fileSystemObject.error = "no records in the output of mmdf"
+    return rows, output
+
+
+def collectFileSystems(args, timer):
+    """
+    Read the nodes each file system is mounted on with a single mmlsmount all -L and the capacity of the
+    mounted ones with mmdf (concurrently per device), mark the ones over the usage thresholds
+    
+    Args:
+        args     -    parsed arguments with device, warning, critical, cacheTtl and timeout
+        timer    -    CheckTimer of the check
+        
+    Return:
+        Tuple of the list of FileSystemObject, the CommandStream of mmlsmount and the list of the CommandStream of mmdf
+    """
+    rules = getRuleSet()
+    fileSystems = {}
+    # mmlsmount does not list the file systems which are not mounted anywhere
+    with timer.phase('exec'):
+        devices = getDevices(args.device)
+    for device in devices:
+        if not rules.isExcluded("filesystem", device):
+            fileSystems[device] = FileSystemObject(device)
+    
+    output = streamBashCommand(mmCommand("mmlsmount", "all -L -Y"), args.cacheTtl, args.timeout)
+    with output, timer.phase('parse'):
+        for record in parseMachineReadable(timer.iterate(output)):
+            timer.rows += 1
+            fileSystemObject = fileSystems.get(record["localDevName"])
+            if fileSystemObject is not None and record.get("nodeName"):
+                fileSystemObject.nodes.append(record["nodeName"])
+    timer.addCommand(output)
+    if output.returnCode != 0:
+        raise ValueError("mmlsmount failed with exit code " + str(output.returnCode))
+    
+    mounted = [x for x in fileSystems.values() if x.nodes]
+    with timer.phase('exec'):
+        results = mapDevices(lambda x: collectDiskFree(x, args), mounted)
+    diskFreeOutputs = []
+    for rows, diskFreeOutput in results:
+        timer.rows += rows
+        timer.addCommand(diskFreeOutput)
+        diskFreeOutputs.append(diskFreeOutput)
+    
+    timer.switch('eval')
+    resultList = list(fileSystems.values())
+    for fileSystemObject in resultList:
+        fileSystemObject.warning, fileSystemObject.critical = rules.getThresholds("filesystem", fileSystemObject.name, args.warning, args.critical)
+        if not fileSystemObject.diskFree:
+            continue
+        if fileSystemObject.freeSize < calculatePercentageOfValue(fileSystemObject.critical, fileSystemObject.totalSize):
+            fileSystemObject.criticalData = True
+        if fileSystemObject.freeSize < calculatePercentageOfValue(fileSystemObject.warning, fileSystemObject.totalSize):
+            fileSystemObject.warningData = True
+        freeInodes = fileSystemObject.maxInodes - fileSystemObject.usedInodes
+        if freeInodes < calculatePercentageOfValue(fileSystemObject.critical, fileSystemObject.maxInodes):
+            fileSystemObject.criticalInodes = True
+        if freeInodes < calculatePercentageOfValue(fileSystemObject.warning, fileSystemObject.maxInodes):
+            fileSystemObject.warningInodes = True
+    timer.switch(None)
+    return resultList, output, diskFreeOutputs
+
+
+def checkFileSystems(args):
+    """
+    Check all (or the given) file systems in one run:
+        - mount state, critical if a file system is mounted on less nodes than required
+        - capacity and inode utilization from mmdf
+    """
+    checkResult = CheckResult()
+    timer = CheckTimer()
+    resultList, output, diskFreeOutputs = collectFileSystems(args, timer)
+    
+    timer.switch('eval')
+    minNodes = int(args.minNodes)
+    notMounted = [x for x in resultList if len(x.nodes) < minNodes]
+    failed = [x for x in resultList if x.nodes and not x.diskFree]
+    criticalData = [x for x in resultList if x.criticalData]
+    warningData = [x for x in resultList if x.warningData and not x.criticalData]
+    criticalInodes = [x for x in resultList if x.criticalInodes]
+    warningInodes = [x for x in resultList if x.warningInodes and not x.criticalInodes]
+    
+    if notMounted or criticalData or criticalInodes:
+        checkResult.returnCode = STATE_CRITICAL
+        checkResult.returnMessage = "Critical - Not mounted: " + str(len(notMounted)) + " Capacity: " + str(len(criticalData)) + " Inodes: " + str(len(criticalInodes))
+    elif warningData or warningInodes:
+        checkResult.returnCode = STATE_WARNING
+        checkResult.returnMessage = "Warning - Capacity: " + str(len(warningData)) + " Inodes: " + str(len(warningInodes))
+    elif failed:
+        checkResult.returnCode = STATE_UNKNOWN
+        checkResult.returnMessage = "UNKNOWN - No capacity of " + ", ".join(x.name + " (" + x.error + ")" for x in failed)
+    else:
+        checkResult.returnCode = STATE_OK
+        checkResult.returnMessage = "OK - All " + str(len(resultList)) + " file systems are mounted and in range"
     
-
-class QuotaObject:
+    timer.switch('output')
+    if args.longOutput:
+        checkResult.longOutput = "Not mounted: " + ", ".join(x.name + " (" + str(len(x.nodes)) + " nodes)" for x in notMounted) + "\n"
+        checkResult.longOutput += "Critical Capacity: " + ", ".join(x.name for x in criticalData) + "\n"
+        checkResult.longOutput += "Warning Capacity: " + ", ".join(x.name for x in warningData) + "\n"
+        checkResult.longOutput += "Critical Inodes: " + ", ".join(x.name for x in criticalInodes) + "\n"
+        checkResult.longOutput += "Warning Inodes: " + ", ".join(x.name for x in warningInodes) + "\n"
+        checkResult.longOutput += "No Capacity: " + ", ".join(x.name + " (" + x.error + ")" for x in failed)
+    performanceData = []
+    for x in resultList:
+        performanceData.append(x.name + "_nodes=" + str(len(x.nodes)) + ";;" + str(minNodes) + ":;0;")
+        if x.diskFree:
+            performanceData.append(x.name + "_free=" + str(x.freeSize) + "KB;" + str(calculatePercentageOfValue(x.warning, x.totalSize)) + ";" + str(calculatePercentageOfValue(x.critical, x.totalSize)) + ";0;" + str(x.totalSize))
+            performanceData.append(x.name + "_inodesFree=" + str(x.maxInodes - x.usedInodes) + ";" + str(calculatePercentageOfValue(x.warning, x.maxInodes)) + ";" + str(calculatePercentageOfValue(x.critical, x.maxInodes)) + ";0;" + str(x.maxInodes))
+    checkResult.performanceData = " ".join(performanceData)
+    checkResult.addPerformanceData(cachePerformanceData(output))
+    if diskFreeOutputs:
+        checkResult.addPerformanceData("mmdfCacheAge=" + str(round(max(x.age for x in diskFreeOutputs), 1)) + "s")
+    timer.switch(None)
+    if args.timings:
+        checkResult.addPerformanceData(timer.getPerformanceData())
+    return checkResult
+    
+    
+def getMonitorRequestPath():
     """
-    Simple class whitch holds the name,type of a Violation and the corrosponding boolean values for block/File violation
+    Returns: the path of the mmpmon input file with the fs_io_s and io_s requests, which is written if it is missing
     """
+    path = os.path.join(STATE_DIRECTORY, "mmpmon-io.requests")
+    if not os.path.isfile(path):
+        os.makedirs(STATE_DIRECTORY, exist_ok=True)
+        writeFileAtomic(path, "fs_io_s\nio_s\n")
+    return path
+
+
+def parseMonitorOutput(lines):
+    """
+    Parse the fs_io_s and io_s responses of mmpmon -p (keyword value pairs, e.g. _fs_io_s_ _n_ 10.0.0.1 ... _br_ 6291456)
     
-    def __init__(self, name, type):
-        self.name = name
-        self.type = type
-        self.blockViolation = False
-        self.fileViolation = False
-        self.fileCritical = False
-        self.blockCritical = False
+    Args:
+        lines    -    iterable of the output lines
         
-    def isVioliation(self):
-        """
-        Returns: true if block or file violation flag is set
-        """
-        return self.blockViolation or self.fileViolation
-    
-    def isCritical(self):
-        """
-        Returns: true if block or file critical flag is set
-        """
-        return self.blockCritical or self.fileCritical
+    Return:
+        Generator of IoObject, the name of a filesystem is its device and the one of the node totals is empty
+    """
+    for line in lines:
+        fields = line.split()
+        if not fields or fields[0] not in ("_fs_io_s_", "_io_s_"):
+            continue
+        values = dict(zip(fields[1::2], fields[2::2]))
+        if values.get("_rc_") != "0":
+            # e.g. no filesystem is mounted
+            continue
+        timestamp = int(values["_t_"]) + int(values.get("_tu_", 0)) / 1000000.0
+        name = values.get("_fs_", "") if fields[0] == "_fs_io_s_" else ""
+        yield IoObject(name, timestamp, [int(values["_" + x + "_"]) for x in IO_COUNTERS])
+
+
+def calculateIoRates(ioObject, previous):
+    """
+    Set the rates of ioObject from the counters of the previous sample. A decreasing operation counter
+    wrapped at 32 bit, a decreasing byte counter (64 bit) means that the counters were reset (mmpmon reset
+    or a restart of the daemon), then no rates are set and reset is marked.
     
-    def __str__(self):
-        """
-        Returns: the string of the class"""
-        return "[name: " + self.name + ", type: " + self.type + ", blockViolation: " + str(self.blockViolation) + ", blockCritical: " + str(self.blockCritical) + ", fileViolation: " + str(self.fileViolation) + ", fileCritical: " + str(self.fileCritical) + "]"
+    Args:
+        ioObject    -    IoObject of the current sample
+        previous    -    list of the timestamp and the counters of the previous sample
+    """
+    interval = ioObject.timestamp - previous[0]
+    if interval <= 0:
+        return
+    deltas = []
+    for value, previousValue, bits in zip(ioObject.counters, previous[1:], IO_COUNTER_BITS):
+        delta = value - previousValue
+        if delta < 0:
+            if bits == 64:
+                ioObject.reset = True
+                return
+            delta += 1 << bits
+        deltas.append(delta)
+    ioObject.rates = [x / interval for x in deltas]
     
     
-################################################################################
-# # Function definition
-################################################################################
-def getValueFromList(list, header, row):
+def getIoStatePath():
     """
-    Args:
-        list     -     list with first line header and following lines data
-        header   -     the header name (col) to search
-        row      -     the specific row to return
-    Return:
-        Value from the given list
+    Returns: the path of the file with the last mmpmon counter samples
     """
-    col = list[0].index(header)
-    return list[row][col]
+    return os.path.join(STATE_DIRECTORY, "io-counters.json")
 
-def executeBashCommand(command):
+
+def collectIo(args, timer):
     """
+    Read the I/O counters of the filesystems and the node with mmpmon, calculate their rates since the last
+    sample in the state file and mark the filesystems over the thresholds. The state file holds the current
+    and the previous sample, so that checks which get the same sample (e.g. in a batch) use the previous one.
+    
     Args:
-        command    -    command to execute in bash
+        args     -    parsed arguments with device, warning, critical, opsWarning, opsCritical and timeout
+        timer    -    CheckTimer of the check
         
     Return:
-        Returned string from command
+        Tuple of the list of IoObject of the filesystems and the IoObject of the node (None if it is missing)
     """
+    output = streamBashCommand(mmCommand("mmpmon", "-p -s -i " + getMonitorRequestPath()), None, args.timeout)
+    with output, timer.phase('parse'):
+        ioObjects = list(parseMonitorOutput(timer.iterate(output)))
+    timer.addCommand(output)
+    timer.rows = len(ioObjects)
+    if output.returnCode != 0:
+        raise ValueError("mmpmon failed with exit code " + str(output.returnCode))
+    
+    timer.switch('eval')
+    statePath = getIoStatePath()
+    os.makedirs(STATE_DIRECTORY, exist_ok=True)
+    # concurrent checks would lose the previous samples of each other between reading and writing the state
+    with open(statePath + ".lock", "a") as lockFile:
+        fcntl.flock(lockFile, fcntl.LOCK_EX)
+        try:
+            with open(statePath) as stateFile:
+                state = json.load(stateFile)
+        except (OSError, ValueError):
+            state = {}
+        current = state.get("current", {})
+        previous = state.get("previous", {})
+        samples = dict(current)
+        for ioObject in ioObjects:
+            key = "fs:" + ioObject.name if ioObject.name else "node"
+            sample = current.get(key)
+            if sample is not None and sample[0] >= ioObject.timestamp:
+                # the sample was already taken by another check (or a newer one), it stays the current one
+                sample = previous.get(key)
+            else:
+                samples[key] = [ioObject.timestamp] + ioObject.counters
+                previous[key] = sample
+            if sample is not None:
+                calculateIoRates(ioObject, sample)
+        if samples != current:
+            writeFileAtomic(statePath, json.dumps({"current": samples, "previous": dict((x, y) for x, y in previous.items() if y is not None and x in samples)}))
     
-    process = subprocess.Popen(command.split(), stdout=subprocess.PIPE, universal_newlines=True)
-    return str(process.communicate()[0])
+    node = next((x for x in ioObjects if not x.name), None)
+    resultList = [x for x in ioObjects if x.name]
+    if args.device != "all":
+        devices = set(getDevices(args.device))
+        resultList = [x for x in resultList if x.name in devices]
+    rules = getRuleSet()
+    throughputWarning = args.warning * 1000000 if args.warning is not None else None
+    throughputCritical = args.critical * 1000000 if args.critical is not None else None
+    resultList = [x for x in resultList if not rules.isExcluded("filesystem", x.name)]
+    for ioObject in [x for x in resultList if x.rates is not None]:
+        throughput = ioObject.getThroughput()
+        operations = ioObject.getOperations()
+        ioObject.critical = (throughputCritical is not None and throughput > throughputCritical) or (args.opsCritical is not None and operations > args.opsCritical)
+        ioObject.warning = (throughputWarning is not None and throughput > throughputWarning) or (args.opsWarning is not None and operations > args.opsWarning)
+    timer.switch(None)
+    return resultList, node
     
     
-def checkRequirements():
+def checkIo(args):
     """
-    Check if following tools are installed on the system:
-        -IBM Spectrum Scale
+    Check the I/O throughput and the operation rates of the filesystems on this node from the mmpmon counters
     """
-
-    if not (os.path.isdir("/usr/lpp/mmfs/bin/") and os.path.isfile("/usr/lpp/mmfs/bin/mmgetstate") and os.path.isfile("/usr/lpp/mmfs/bin/mmlsfileset") and os.path.isfile("/usr/lpp/mmfs/bin/mmrepquota") and os.path.isfile("/usr/lpp/mmfs/bin/mmfs")):
-        checkResult = CheckResult()
+    checkResult = CheckResult()
+    timer = CheckTimer()
+    resultList, node = collectIo(args, timer)
+    
+    timer.switch('eval')
+    measured = [x for x in resultList if x.rates is not None]
+    reset = [x.name for x in resultList if x.reset]
+    critical = [x for x in measured if x.critical]
+    warning = [x for x in measured if x.warning and not x.critical]
+    
+    if critical:
         checkResult.returnCode = STATE_CRITICAL
-        checkResult.returnMessage = "CRITICAL - No IBM Spectrum Scale Installation detected."
-        checkResult.performanceData = ""
-        checkResult.printMonitoringOutput()     
+        checkResult.returnMessage = "Critical - I/O of " + ", ".join(x.name + " (" + formatIoRates(x) + ")" for x in critical)
+    elif warning:
+        checkResult.returnCode = STATE_WARNING
+        checkResult.returnMessage = "Warning - I/O of " + ", ".join(x.name + " (" + formatIoRates(x) + ")" for x in warning)
+    elif not measured and not reset:
+        checkResult.returnCode = STATE_OK
+        checkResult.returnMessage = "OK - First sample of the I/O counters of " + str(len(resultList)) + " filesystems, the rates are reported from the next run"
+    else:
+        checkResult.returnCode = STATE_OK
+        checkResult.returnMessage = "OK - I/O of " + str(len(measured)) + " filesystems in range"
+        
+    timer.switch('output')
+    if args.longOutput:
+        checkResult.longOutput = "".join(x.name + ": " + formatIoRates(x) + "\n" for x in measured)
+        checkResult.longOutput += "Counters reset: " + ", ".join(reset)
+    throughputWarning = str(args.warning * 1000000) if args.warning is not None else ""
+    throughputCritical = str(args.critical * 1000000) if args.critical is not None else ""
+    performanceData = []
+    for x in measured + ([node] if node is not None and node.rates is not None else []):
+        label = x.name or "node"
+        performanceData.append(label + "_throughput=" + str(round(x.getThroughput())) + "B;" + throughputWarning + ";" + throughputCritical + ";0;")
+        performanceData.append(label + "_ops=" + str(round(x.getOperations(), 2)) + ";" + (str(args.opsWarning) if args.opsWarning is not None else "") + ";" + (str(args.opsCritical) if args.opsCritical is not None else "") + ";0;")
+        for name, rate in zip(IO_COUNTER_LABELS, x.rates):
+            performanceData.append(label + "_" + name + "=" + (str(round(rate)) + "B" if name in ("read", "write") else str(round(rate, 2))))
+    checkResult.performanceData = " ".join(performanceData)
+    if reset:
+        checkResult.addPerformanceData("resets=" + str(len(reset)))
+    timer.switch(None)
+    if args.timings:
+        checkResult.addPerformanceData(timer.getPerformanceData())
+    return checkResult
+
+
+def formatIoRates(ioObject):
+    """
+    Returns: the throughput in MB/s and the operations per second of ioObject for the output
+    """
+    return str(round(ioObject.getThroughput() / 1000000.0, 1)) + " MB/s, " + str(round(ioObject.getOperations(), 1)) + " ops/s"
     
+    
+def getWaiterReason(description):
+    """
+    Returns: the reason of a waiter description without the addresses, numbers and the target, e.g.
+             for I/O completion, RecvWorkerCondvar or the quoted reason
+    """
+    match = WAITER_REASON_PATTERN.search(description)
+    if match is not None:
+        return match.group(1)
+    description = WAITER_TARGET_PATTERN.split(description, 1)[0]
+    if description.startswith("on ThCond") or description.startswith("on ThMutex"):
+        # the name of the condition variable or mutex is in the last parentheses
+        start = description.rfind("(")
+        if start >= 0:
+            return description[start + 1:].rstrip(")")
+    return " ".join(WAITER_NUMBER_PATTERN.sub("", description).split())
 
-def checkStatus(args):
+
+def parseWaiters(lines, machineReadable=False):
     """
-    Check depending on the arguments following settings:
-        - gpfs status
-        - quorum status
-	- nodes
+    Single pass parser for the waiters of mmdiag --waiters (-Y if machineReadable), the reasons are derived
+    once per distinct description
+    
+    Args:
+        lines              -    iterable of the output lines
+        machineReadable    -    lines are the output of mmdiag --waiters -Y
+        
+    Return:
+        Generator of WaiterObject
+    """
+    reasons = {}
+    if machineReadable:
+        for record in parseMachineReadable(lines):
+            reason = record.get("condVarReason") or record.get("mutexReason") or record.get("delayReason") or record.get("localReason") or record.get("condVar") or ""
+            target = record.get("nodeIP") or record.get("nodeName") or record.get("ioDeviceName") or record.get("ioDevice") or None
+            yield WaiterObject(record.getInt("threadId"), record.get("threadName", ""), float(record.get("waitTime") or 0), reason, target, record.get("isMonitored", "") not in ("no", "0"))
+        return
+    for line in lines:
+        match = WAITER_PATTERN.search(line)
+        if match is None:
+            continue
+        waitTime, monitored, thread, threadName, description = match.groups()
+        reason = reasons.get(description)
+        if reason is None:
+            reason = reasons[description] = getWaiterReason(description)
+        target = WAITER_TARGET_PATTERN.search(description)
+        yield WaiterObject(int(thread), threadName, float(waitTime), reason, target.group(1) if target is not None else None, monitored != "ignored")
+
+
+def checkWaiters(args):
+    """
+    Check the long waiters of this node (mmdiag --waiters): the waiters are bucketed by their reason with the
+    number and the maximum age per bucket, warning/critical on the age of the longest waiter and the number of
+    waiters which wait longer than the minimum age
     """
     checkResult = CheckResult()
-    output = executeBashCommand("sudo /usr/lpp/mmfs/bin/mmgetstate -LY")
+    timer = CheckTimer()
+    output = streamBashCommand(mmCommand("mmdiag", "--waiters" + (" -Y" if args.machineReadable else "")), args.cacheTtl, args.timeout)
+    buckets = {}
+    maxAge = 0.0
+    count = 0
+    longest = None
+    minAge = args.minAge
+    with output, timer.phase('parse'):
+        for waiter in parseWaiters(timer.iterate(output), args.machineReadable):
+            timer.rows += 1
+            if waiter.waitTime < minAge or (not waiter.monitored and not args.allWaiters):
+                continue
+            count += 1
+            bucket = buckets.get(waiter.reason)
+            if bucket is None:
+                bucket = buckets[waiter.reason] = [0, 0.0]
+            bucket[0] += 1
+            if waiter.waitTime > bucket[1]:
+                bucket[1] = waiter.waitTime
+            if waiter.waitTime > maxAge:
+                maxAge = waiter.waitTime
+                longest = waiter
+    timer.addCommand(output)
+    if output.returnCode != 0:
+        return CheckResult(STATE_UNKNOWN, "UNKNOWN - mmdiag failed with exit code " + str(output.returnCode))
     
-    lines = output.split("\n")
-    list = []
+    timer.switch('eval')
+    summary = str(count) + " waiters over " + str(minAge) + "s"
+    if longest is not None:
+        summary += ", longest " + str(round(maxAge, 1)) + "s " + longest.threadName + ": " + longest.reason + (" (" + longest.target + ")" if longest.target else "")
+    if maxAge > args.critical or (args.countCritical is not None and count > args.countCritical):
+        checkResult.returnCode = STATE_CRITICAL
+        checkResult.returnMessage = "Critical - " + summary
+    elif maxAge > args.warning or (args.countWarning is not None and count > args.countWarning):
+        checkResult.returnCode = STATE_WARNING
+        checkResult.returnMessage = "Warning - " + summary
+    else:
+        checkResult.returnCode = STATE_OK
+        checkResult.returnMessage = "OK - " + summary
+        
+    timer.switch('output')
+    # the buckets with the longest waiters first
+    ordered = sorted(buckets.items(), key=lambda x: -x[1][1])
+    if args.longOutput:
+        checkResult.longOutput = "\n".join(reason + ": " + str(bucket[0]) + " waiters, longest " + str(round(bucket[1], 1)) + "s" for reason, bucket in ordered)
+    performanceData = ["waiters=" + str(count) + ";" + (str(args.countWarning) if args.countWarning is not None else "") + ";" + (str(args.countCritical) if args.countCritical is not None else "") + ";0;",
+                       "maxAge=" + str(round(maxAge, 3)) + "s;" + str(args.warning) + ";" + str(args.critical) + ";0;"]
+    for reason, bucket in ordered:
+        label = re.sub(r'[^A-Za-z0-9]+', '_', reason).strip('_') or "unknown"
+        performanceData.append(label + "_count=" + str(bucket[0]) + " " + label + "_maxAge=" + str(round(bucket[1], 3)) + "s")
+    checkResult.performanceData = " ".join(performanceData)
+    timer.switch(None)
+    if args.timings:
+        checkResult.addPerformanceData(timer.getPerformanceData())
+    return checkResult
+    
+    
+def parseIoHistory(lines):
+    """
+    Parse the I/O history of mmdiag --iohist, e.g.
+        14:25:22.169617  R  LLIndBlock    1:1075622848       64   13.073       Srv  dm-12
+        
+    Args:
+        lines    -    iterable of the output lines
+        
+    Return:
+        Generator of tuples of the disk (device or NSD id, the disk number if it is missing), the I/O type
+        (read/write and data/metadata) and the service time in ms
+    """
     for line in lines:
-        list.append(line.split(":"))     
-   
-    state = getValueFromList(list, "state", 1)
-    quorumNeeded = getValueFromList(list, "quorum", 1)
-    #filter asterix if tie braker disk is used
-    quorumNeeded = quorumNeeded.replace('*','')
-    nodeName = getValueFromList(list, "nodeName", 1)
-    quorumsUp = getValueFromList(list, "nodesUp", 1)
-    totalNodes = getValueFromList(list, "totalNodes", 1)
+        fields = line.split()
+        if len(fields) < 6 or fields[1] not in ("R", "W") or fields[0][:1] not in "0123456789":
+            continue
+        try:
+            latency = float(fields[5])
+        except ValueError:
+            continue
+        ioType = ("read_" if fields[1] == "R" else "write_") + ("data" if fields[2] == "data" else "metadata")
+        disk = fields[7] if len(fields) > 7 else fields[3].split(":")[0]
+        yield disk, ioType, latency
 
-    if args.quorum: 
-        if quorumsUp < quorumNeeded :   
-            checkResult.returnCode = STATE_CRITICAL
-            checkResult.returnMessage = "Critical - GPFS is ReadOnly because only " + str(quorumsUp) + " nodes are online and " + str(quorumNeeded) + " are required for quorum"  
-        else:
-            checkResult.returnCode = STATE_OK
-            checkResult.returnMessage = "OK - " + str(quorumsUp) + " are up and " + str(quorumNeeded) + " are required for quorum"
-        checkResult.performanceData = "qourumUp=" + str(quorumsUp) + ";" + str(quorumNeeded) + ";;; quorumNeeded=" + str(quorumNeeded) + ";;; totalNodes=" + str(totalNodes)
-                
-    if args.status:                
-        if not(state == "active"):
-            checkResult.returnCode = STATE_CRITICAL
-            checkResult.returnMessage = "Critical - Node" + str(nodeName) + " is in state:" + str(state)
-        else:
-            checkResult.returnCode = STATE_OK
-            checkResult.returnMessage = "OK - Node " + str(nodeName) + " is in state:" + str(state)
-        checkResult.performanceData = "quorumUp=" + str(quorumsUp) + ";" + str(quorumNeeded) + ";;; quorumNeeded=" + str(quorumNeeded) + ";;; totalNodes=" + str(totalNodes)
-    if args.nodes:
-        if totalNodes < args.critical :   
-            checkResult.returnCode = STATE_CRITICAL
-            checkResult.returnMessage = "Critical - Only " + str(totalNodes) + " are up"
-        elif totalNodes < args.warning :
-            checkResult.returnCode = STATE_WARNING
-            checkResult.returnMessage = "WARNING - Only " + str(totalNodes) + " are up"
-        else:
-            checkResult.returnCode = STATE_OK
-            checkResult.returnMessage = "OK - " + str(totalNodes) + " are up"
-        checkResult.performanceData = "quorumsUp=" + str(quorumsUp) + ";" + str(quorumNeeded) + ";;; quorumNeeded=" + str(quorumNeeded) + ";;; totalNodes=" + str(totalNodes)
-   
-    checkResult.printMonitoringOutput()
+
+def checkIoLatency(args):
+    """
+    Check the service time of the I/Os of this node in the history of mmdiag --iohist: the percentiles and the
+    maximum per disk and per I/O type from latency histograms, warning/critical if the chosen percentile of a
+    disk or an I/O type with at least the minimum number of I/Os is over the thresholds
+    """
+    checkResult = CheckResult()
+    timer = CheckTimer()
+    output = streamBashCommand(mmCommand("mmdiag", "--iohist"), args.cacheTtl, args.timeout)
+    disks = {}
+    ioTypes = {}
+    with output, timer.phase('parse'):
+        for disk, ioType, latency in parseIoHistory(timer.iterate(output)):
+            timer.rows += 1
+            histogram = disks.get(disk)
+            if histogram is None:
+                histogram = disks[disk] = LatencyHistogram()
+            histogram.add(latency)
+            histogram = ioTypes.get(ioType)
+            if histogram is None:
+                histogram = ioTypes[ioType] = LatencyHistogram()
+            histogram.add(latency)
+    timer.addCommand(output)
+    if output.returnCode != 0:
+        return CheckResult(STATE_UNKNOWN, "UNKNOWN - mmdiag failed with exit code " + str(output.returnCode))
+    
+    timer.switch('eval')
+    percentile = args.percentile
+    critical = []
+    warning = []
+    for name, histogram in sorted(ioTypes.items()) + sorted(disks.items()):
+        if histogram.count < args.minIos:
+            continue
+        latency = histogram.getPercentile(percentile)
+        if latency > args.critical:
+            critical.append(name + " (" + str(round(latency, 1)) + "ms)")
+        elif latency > args.warning:
+            warning.append(name + " (" + str(round(latency, 1)) + "ms)")
+    
+    summary = "p" + str(percentile) + " of " + str(timer.rows) + " I/Os on " + str(len(disks)) + " disks"
+    if critical:
+        checkResult.returnCode = STATE_CRITICAL
+        checkResult.returnMessage = "Critical - " + summary + " over " + str(args.critical) + "ms: " + ", ".join(critical)
+    elif warning:
+        checkResult.returnCode = STATE_WARNING
+        checkResult.returnMessage = "Warning - " + summary + " over " + str(args.warning) + "ms: " + ", ".join(warning)
+    else:
+        checkResult.returnCode = STATE_OK
+        checkResult.returnMessage = "OK - " + summary + " in range"
         
+    timer.switch('output')
+    performanceData = []
+    longOutput = []
+    for name, histogram in sorted(ioTypes.items()) + sorted(disks.items()):
+        label = re.sub(r'[^A-Za-z0-9._:-]+', '_', name)
+        values = [(x, histogram.getPercentile(x)) for x in LATENCY_PERCENTILES]
+        for x, latency in values:
+            thresholds = ";" + str(args.warning) + ";" + str(args.critical) + ";0;" if x == percentile else ""
+            performanceData.append(label + "_p" + str(x) + "=" + str(round(latency, 3)) + "ms" + thresholds)
+        performanceData.append(label + "_max=" + str(round(histogram.max, 3)) + "ms " + label + "_ios=" + str(histogram.count))
+        longOutput.append(name + ": " + ", ".join("p" + str(x) + " " + str(round(latency, 1)) + "ms" for x, latency in values) + ", max " + str(round(histogram.max, 1)) + "ms, " + str(histogram.count) + " I/Os")
+    checkResult.performanceData = " ".join(performanceData)
+    if args.longOutput:
+        checkResult.longOutput = "\n".join(longOutput)
+    timer.switch(None)
+    if args.timings:
+        checkResult.addPerformanceData(timer.getPerformanceData())
+    return checkResult
     
-def checkFileSystems(args):
-    """
     
+def collectFileSets(args, timer):
     """
+    Read the filesets of the device with mmlsfileset and mark the ones over the inode thresholds
     
-def checkFileSets(args):
-    """
-        Check depending on the arguments following settings:
-        - inode utilization on filesets
-        - mount status
-        - blocksize utilization
+    Args:
+        args     -    parsed arguments with device, filesets, size, exclude_filesets, warning, critical, forecast thresholds, cacheTtl and timeout
+        timer    -    CheckTimer of the check
+        
+    Return:
+        Tuple of the list of FileSetObject and the CommandStream of mmlsfileset
     """
-    checkResult = CheckResult()
-    command = "sudo /usr/lpp/mmfs/bin/mmlsfileset " + args.device
+    command = mmCommand("mmlsfileset", args.device)
     if args.filesets:
         command += " " + args.filesets
     if args.size:
         command += " -d"
     command += " -Y"
   
-    # compile list of fileset names to be excluded
+    # compile set of fileset names to be excluded
     if args.exclude_filesets:
-        exclude_filesets = args.exclude_filesets.split(',')
+        exclude_filesets = set(args.exclude_filesets.split(','))
     else:
-        exclude_filesets = []
+        exclude_filesets = set()
+    rules = getRuleSet()
+    filesetRules = rules.hasRules("fileset")
+
+    output = streamBashCommand(command, args.cacheTtl, args.timeout)
 
-    output = executeBashCommand(command)
-    lines = output.split("\n")
-    list = []
-    for line in lines:
-        list.append(line.split(":"))
-    # Clear uneccesary last line 
-    list.remove(list[-1])
-    
     resultList = []
-    
-    for i in list:
-        idx = list.index(i)
-        # Skipp header
-        if idx > 0:
-            if list[idx][7] in exclude_filesets:
+    with output, timer.phase('parse'):
+        for record in parseMachineReadable(timer.iterate(output)):
+            timer.rows += 1
+            if record["filesetName"] in exclude_filesets:
                 # fileset is on our exclude list, ignore it
                 continue
+            rule = rules.match("fileset", record["filesetName"]) if filesetRules else None
+            if rule is not None and rule.exclude:
+                continue
 
             if args.size:
-                filesetObject = FileSetObject(filesystemName=list[idx][6], filesetName=list[idx][7], id=list[idx][7], status=list[idx][10], maxInodes=list[idx][32], allocInodes=list[idx][33], dataSize=list[idx][15])
+                filesetObject = FileSetObject(filesystemName=record["filesystemName"], filesetName=record["filesetName"], id=record["id"], status=record["status"], maxInodes=record["maxInodes"], allocInodes=record["allocInodes"], dataSize=record["dataInKB"])
             else:
-                filesetObject = FileSetObject(filesystemName=list[idx][6], filesetName=list[idx][7], id=list[idx][7], status=list[idx][10], maxInodes=list[idx][32], allocInodes=list[idx][33])
-            if filesetObject.freeInodes < calculatePercentageOfValue(args.warning, filesetObject.maxInodes):
-                     filesetObject.warningInodes = True   
-            if filesetObject.freeInodes < calculatePercentageOfValue(args.warning, filesetObject.maxInodes):
-                     filesetObject.criticalInodes = True      
+                filesetObject = FileSetObject(filesystemName=record["filesystemName"], filesetName=record["filesetName"], id=record["id"], status=record["status"], maxInodes=record["maxInodes"], allocInodes=record["allocInodes"])
+            filesetObject.warning, filesetObject.critical = rule.getThresholds(args.warning, args.critical) if rule is not None else (args.warning, args.critical)
+            if filesetObject.freeInodes < calculatePercentageOfValue(filesetObject.warning, filesetObject.maxInodes):
+                     filesetObject.warningInodes = True
+            if filesetObject.freeInodes < calculatePercentageOfValue(filesetObject.critical, filesetObject.maxInodes):
+                     filesetObject.criticalInodes = True
             resultList.append(filesetObject)
+    timer.addCommand(output)
+    
+    history = openHistory(args, args.device + "-filesets")
+    if history is not None:
+        with history, timer.phase('eval'):
+            timestamp = time.time() - output.age
+            # dependent filesets share the inode space of their parent and have no own limit
+            for filesetObject in [x for x in resultList if x.maxInodes > 0]:
+                filesetObject.hoursLeftInodes = history.addSample("inodes:" + filesetObject.filesetName, timestamp, filesetObject.freeInodes, 0)
+                state = getForecastState(filesetObject.hoursLeftInodes, args)
+                if state == STATE_CRITICAL:
+                    filesetObject.criticalInodes = True
+                if state != STATE_OK:
+                    filesetObject.warningInodes = True
+    return resultList, output
+
+
+def checkFileSets(args):
+    """
+        Check depending on the arguments following settings:
+        - inode utilization on filesets
+        - mount status
+        - blocksize utilization
+    """
+    if isMultiDevice(args):
+        return checkDevices(args)
+    
+    checkResult = CheckResult()
+    timer = CheckTimer()
+    resultList, output = collectFileSets(args, timer)
+            
+    timer.switch('eval')
+    if args.sizeBackground and not args.size:
+        # attach the last known data size and refresh it in the background if it is too old
+        sizes, sizeAge = readFileSetSizes(args.device)
+        if sizes is None or sizeAge > args.sizeMaxAge:
+            refreshFileSetSizes(args.device)
+        if sizes is not None:
+            for x in resultList:
+                x.dataSize = sizes.get(x.filesetName, 0)
     checkResult = CheckResult()   
 
     if args.inodes:
@@ -355,17 +3703,23 @@ def checkFileSets(args):
             checkResult.returnCode = STATE_OK
             checkResult.returnMessage = "OK - Inode utilization is normal"
             
+        timer.switch('output')
+        forecasts = [x for x in resultList if getForecastState(x.hoursLeftInodes, args) != STATE_OK]
         if args.longOutput:       
             checkResult.longOutput = "Critical FileSets: " + ", ".join(criticalNodeUtilization) + "\n"   
             checkResult.longOutput += "Warning FileSets: " + ", ".join(warningNodeUtilization) + "\n"
-        checkResult.performanceData = ""
-        for x in resultList:
-            checkResult.performanceData += x.filesetName + "=" + str(x.freeInodes) + ";" + str(calculatePercentageOfValue(args.warning, x.maxInodes)) + ";" + str(calculatePercentageOfValue(args.critical, x.maxInodes)) + ";0;" + str(x.maxInodes)+" "+x.filesetName+"_blockSiz="+str(x.dataSize)+"KB;;;; ";
+            if args.forecastWarning is not None or args.forecastCritical is not None:
+                checkResult.longOutput += "Forecast FileSets: " + ", ".join(x.filesetName + " (" + str(round(x.hoursLeftInodes, 1)) + "h)" for x in forecasts) + "\n"
+        # joined once, += on the string copies it for every fileset
+        checkResult.performanceData = "".join(x.filesetName + "=" + str(x.freeInodes) + ";" + str(calculatePercentageOfValue(x.warning, x.maxInodes)) + ";" + str(calculatePercentageOfValue(x.critical, x.maxInodes)) + ";0;" + str(x.maxInodes)+" "+x.filesetName+"_blockSiz="+str(x.dataSize)+"KB;;;; " for x in resultList)
+        if args.forecastWarning is not None or args.forecastCritical is not None:
+            checkResult.addPerformanceData(forecastPerformanceData([getForecastState(x.hoursLeftInodes, args) for x in forecasts]))
             
     elif args.link:
         linkedList=[x.filesetName for x in resultList if x.status == 'Linked']
         unlinkedList=[x.filesetName  for x in resultList if x.status == 'Unlinked']
         deletedList=[x.filesetName  for x in resultList if x.status == 'Deleted']
+        timer.switch('output')
         if args.longOutput:       
             checkResult.longOutput = "Linked FileSets: " + ", ".join(linkedList) + "\n"   
             checkResult.longOutput += "Unlinked FileSets: " + ", ".join(unlinkedList) + "\n"
@@ -382,22 +3736,29 @@ def checkFileSets(args):
         
         checkResult.performanceData = "Linked=" + str(len(linkedList)) + ";" + str(args.warning) + ";" + str(args.critical) + ";0;" + str(len(resultList)) + " Unlinked=" + str(len(unlinkedList)) + ";" + str(args.warning) + ";" + str(args.critical) + ";0;" + str(len(resultList)) 
         checkResult.performanceData +=" Deleted=" + str(len(deletedList)) + ";" + str(args.warning) + ";" + str(args.critical) + ";0;" + str(len(resultList)) + " ";
+        if args.size or args.sizeBackground:
+            checkResult.performanceData += "".join(x.filesetName + "_blockSiz=" + str(x.dataSize) + "KB;;;; " for x in resultList)
           
-    checkResult.printMonitoringOutput()
+    if args.sizeBackground and not args.size:
+        if sizeAge is None:
+            checkResult.addPerformanceData("dataSizeAge=U")
+        else:
+            checkResult.addPerformanceData("dataSizeAge=" + str(int(sizeAge)) + "s")
+    checkResult.addPerformanceData(cachePerformanceData(output))
+    timer.switch(None)
+    if args.timings:
+        checkResult.addPerformanceData(timer.getPerformanceData())
+    return checkResult
         
   
-def checkPools(args):
+def parsePoolList(output):
     """
-        Check depending on the arguments following settings:
-        - disk usage all pools
-        - disk usage meta/data pools
-        - disk usage single pool
+    Args:
+        output    -    output of mmlspool
+        
+    Return:
+        List of PoolObject
     """
-    checkResult = CheckResult()
-    command = "sudo /usr/lpp/mmfs/bin/mmlspool"
-    command += " " + args.device
-    
-    output = executeBashCommand(command)
     match=re.search(r'\([^(]*\)',output)
     if(match != None):
         unit=match.group().replace('(','').replace(')','')
@@ -405,32 +3766,97 @@ def checkPools(args):
         unit='KB'
     output =re.sub('\\([^\\(]*\\)','',output)
     output = re.sub(' {1,}', ';', output)
-    # print(output)
     lines = output.split("\n")
     list = []
     for line in lines:
         list.append(line.split(";"))
     # Clear uneccesary last line 
-    # print(list)
     list.remove(list[-1])
     list.remove(list[1])
     list.remove(list[0])
-    # print(list)
+    
     resultList = []
     for row in list:
-        poolObject = PoolObject(name=row[0], id=row[1], data=row[4], meta=row[5], dataTotal=row[6], dataFree=row[7], metaTotal=row[8], metaFree=row[9],unit=unit)
-        if poolObject.dataFree < calculatePercentageOfValue(args.critical, poolObject.dataTotal):
+        resultList.append(PoolObject(name=row[0], id=row[1], data=row[4], meta=row[5], dataTotal=row[6], dataFree=row[7], metaTotal=row[8], metaFree=row[9],unit=unit))
+    return resultList
+
+
+def collectPools(args, timer):
+    """
+    Read the pools of the device with mmlspool and mark the ones over the usage thresholds
+    
+    Args:
+        args     -    parsed arguments with device, warning, critical, forecast thresholds, cacheTtl and timeout
+        timer    -    CheckTimer of the check
+        
+    Return:
+        Tuple of the list of PoolObject and the CommandOutput of mmlspool
+    """
+    command = mmCommand("mmlspool", args.device)
+    
+    with timer.phase('exec'):
+        output = executeBashCommand(command, args.cacheTtl, args.timeout)
+    timer.addCommand(output)
+    with timer.phase('parse'):
+        poolList = parsePoolList(output)
+    timer.rows = len(poolList)
+    
+    timer.switch('eval')
+    rules = getRuleSet()
+    resultList = []
+    for poolObject in poolList:
+        rule = rules.match("pool", poolObject.name)
+        if rule is not None and rule.exclude:
+            continue
+        poolObject.warning, poolObject.critical = rule.getThresholds(args.warning, args.critical) if rule is not None else (args.warning, args.critical)
+        if poolObject.dataFree < calculatePercentageOfValue(poolObject.critical, poolObject.dataTotal):
                      poolObject.criticalData = True
-        if poolObject.metaFree < calculatePercentageOfValue(args.critical, poolObject.metaTotal):
+        if poolObject.metaFree < calculatePercentageOfValue(poolObject.critical, poolObject.metaTotal):
                      poolObject.criticalMeta = True
-        if poolObject.dataFree < calculatePercentageOfValue(args.warning, poolObject.dataTotal):
+        if poolObject.dataFree < calculatePercentageOfValue(poolObject.warning, poolObject.dataTotal):
                      poolObject.warningData = True
-        if poolObject.metaFree < calculatePercentageOfValue(args.warning, poolObject.metaTotal):
+        if poolObject.metaFree < calculatePercentageOfValue(poolObject.warning, poolObject.metaTotal):
                      poolObject.warningMeta = True
         resultList.append(poolObject)
+        
+    history = openHistory(args, args.device + "-pools")
+    if history is not None:
+        with history:
+            timestamp = time.time() - output.age
+            for poolObject in resultList:
+                if poolObject.data:
+                    poolObject.hoursLeftData = history.addSample("data:" + poolObject.name, timestamp, poolObject.dataFree, 0)
+                    state = getForecastState(poolObject.hoursLeftData, args)
+                    poolObject.criticalData = poolObject.criticalData or state == STATE_CRITICAL
+                    poolObject.warningData = poolObject.warningData or state != STATE_OK
+                if poolObject.meta:
+                    poolObject.hoursLeftMeta = history.addSample("meta:" + poolObject.name, timestamp, poolObject.metaFree, 0)
+                    state = getForecastState(poolObject.hoursLeftMeta, args)
+                    poolObject.criticalMeta = poolObject.criticalMeta or state == STATE_CRITICAL
+                    poolObject.warningMeta = poolObject.warningMeta or state != STATE_OK
+    timer.switch(None)
+    return resultList, output
+
+
+def checkPools(args):
+    """
+        Check depending on the arguments following settings:
+        - disk usage all pools
+        - disk usage meta/data pools
+        - disk usage single pool
+    """
+    if isMultiDevice(args):
+        return checkDevices(args)
+    
+    checkResult = CheckResult()
+    timer = CheckTimer()
+    resultList, output = collectPools(args, timer)
+    cacheInfo = cachePerformanceData(output)
             
+    timer.switch('eval')
     if args.pools:
-        resultList = [x for x in resultList if x.name in args.pools.split(',')]
+        pools = set(args.pools.split(','))
+        resultList = [x for x in resultList if x.name in pools]
         
     if args.type == "m":
         resultList = [x for x in resultList if x.meta == True]
@@ -440,15 +3866,16 @@ def checkPools(args):
     criticalData = [x for x in resultList if x.criticalData == True]
     warningData = [x for x in resultList if x.warningData == True and x.criticalData == False]
     criticalMeta = [x for x in resultList if x.criticalMeta == True]
-    warningMeta = [x for x in resultList if x.warningMeta == True and x.ciriticalMeta == False]
+    warningMeta = [x for x in resultList if x.warningMeta == True and x.criticalMeta == False]
     
     checkResult = CheckResult()
 
+    timer.switch('output')
     checkResult.performanceData = ""
     for x in [x for x in resultList if x.data == True]:
-        checkResult.performanceData += "Data_free" + x.name + "=" + str(x.dataFree)+x.unit + ";" + str(calculatePercentageOfValue(args.warning, x.dataTotal)) + ";" + str(calculatePercentageOfValue(args.critical, x.dataTotal)) + ";;" + str(x.dataTotal) + " ";
+        checkResult.performanceData += "Data_free" + x.name + "=" + str(x.dataFree)+x.unit + ";" + str(calculatePercentageOfValue(x.warning, x.dataTotal)) + ";" + str(calculatePercentageOfValue(x.critical, x.dataTotal)) + ";;" + str(x.dataTotal) + " ";
     for x in [x for x in resultList if x.meta == True]:
-        checkResult.performanceData += "Meta_free" + x.name + "=" + str(x.metaFree)+x.unit + ";" + str(calculatePercentageOfValue(args.warning, x.metaTotal)) + ";" + str(calculatePercentageOfValue(args.critical, x.metaTotal)) + ";;" + str(x.metaTotal) + " ";
+        checkResult.performanceData += "Meta_free" + x.name + "=" + str(x.metaFree)+x.unit + ";" + str(calculatePercentageOfValue(x.warning, x.metaTotal)) + ";" + str(calculatePercentageOfValue(x.critical, x.metaTotal)) + ";;" + str(x.metaTotal) + " ";
             
     if len(criticalData) > 0 or len(criticalMeta) > 0 :
         checkResult.returnCode = STATE_CRITICAL
@@ -465,20 +3892,272 @@ def checkPools(args):
             criticalData = [x.name for x in resultList if x.criticalData == True]
             warningData = [x.name for x in resultList if x.warningData == True and x.criticalData == False]
             criticalMeta = [x.name for x in resultList if x.criticalMeta == True]
-            warningMeta = [x.name for x in resultList if x.warningMeta == True and x.ciriticalMeta == False] 
+            warningMeta = [x.name for x in resultList if x.warningMeta == True and x.criticalMeta == False] 
             checkResult.longOutput = "Critical Data Pool: " + ", ".join(criticalData) + "\n"   
             checkResult.longOutput += "Warning Data Pool: " + ", ".join(warningData) + "\n"
             checkResult.longOutput += "Critical Meta Pool: " + ", ".join(criticalMeta) + "\n"   
             checkResult.longOutput += "Warning Meta Pool: " + ", ".join(warningMeta) 
-    checkResult.printMonitoringOutput()
+            if args.forecastWarning is not None or args.forecastCritical is not None:
+                forecastData = [x.name + " (" + str(round(x.hoursLeftData, 1)) + "h)" for x in resultList if x.data and getForecastState(x.hoursLeftData, args) != STATE_OK]
+                forecastMeta = [x.name + " (" + str(round(x.hoursLeftMeta, 1)) + "h)" for x in resultList if x.meta and getForecastState(x.hoursLeftMeta, args) != STATE_OK]
+                checkResult.longOutput += "\nForecast Data Pool: " + ", ".join(forecastData) + "\n"
+                checkResult.longOutput += "Forecast Meta Pool: " + ", ".join(forecastMeta)
+    if args.forecastWarning is not None or args.forecastCritical is not None:
+        states = [getForecastState(x.hoursLeftData, args) for x in resultList if x.data] + [getForecastState(x.hoursLeftMeta, args) for x in resultList if x.meta]
+        checkResult.addPerformanceData(forecastPerformanceData(states))
+    checkResult.addPerformanceData(cacheInfo)
+    timer.switch(None)
+    if args.timings:
+        checkResult.addPerformanceData(timer.getPerformanceData())
+    return checkResult
         
         
 def calculatePercentageOfValue(percent, value):
     """
-    Return - (100.0-percent*value)/100.0
+    Return - (100.0-percent*value)/100.0
+    """
+    return ((100.0 - float(percent)) * float(value)) / 100.0
+
+    
+def forecastQuota(history, forecasts, timestamp, args, quotaType, name, filesetName, blockUsage, blockQuota, filesUsage, filesQuota):
+    """
+    Add the block and file usage of a quota entry to the history, if it has a quota and uses at least
+    historyMinUsage percent of it, and keep a QuotaObject in forecasts if the usage is projected to reach the
+    quota within the forecast thresholds. Only these entries get a slot, the history of entries below stops
+    and expires.
+    
+    Args:
+        history      -    HistoryStore of the quota
+        forecasts    -    list of the forecasted QuotaObject
+        timestamp    -    time of the usage in seconds since the epoch
+        args         -    parsed arguments with the forecast thresholds
+        quotaType    -    USR, GRP or FILESET
+        name         -    name of the user/group/fileset
+        filesetName  -    fileset of the entry, empty for the whole device
+        blockUsage, blockQuota, filesUsage, filesQuota    -    usage and quota of the entry
+    """
+    key = quotaType + ":" + name + ":" + filesetName
+    minUsage = getattr(args, 'historyMinUsage', HISTORY_QUOTA_MIN_USAGE) / 100.0
+    hoursLeftBlock = history.addSample("block:" + key, timestamp, blockUsage, blockQuota) if blockQuota and blockUsage >= blockQuota * minUsage else None
+    hoursLeftFiles = history.addSample("files:" + key, timestamp, filesUsage, filesQuota) if filesQuota and filesUsage >= filesQuota * minUsage else None
+    blockState = getForecastState(hoursLeftBlock, args)
+    fileState = getForecastState(hoursLeftFiles, args)
+    if blockState == STATE_OK and fileState == STATE_OK:
+        return
+    quotaObject = QuotaObject(name, quotaType, filesetName)
+    if blockState != STATE_OK:
+        quotaObject.hoursLeftBlock = hoursLeftBlock
+        quotaObject.blockViolation = True
+        quotaObject.blockCritical = blockState == STATE_CRITICAL
+    if fileState != STATE_OK:
+        quotaObject.hoursLeftFiles = hoursLeftFiles
+        quotaObject.fileViolation = True
+        quotaObject.fileCritical = fileState == STATE_CRITICAL
+    forecasts.append(quotaObject)
+    
+    
+def mergeQuotaForecasts(resultList, forecasts):
+    """
+    Merge the forecasted QuotaObject into the list of violating QuotaObject, an entry with both keeps the worse state
+    """
+    violations = dict(((x.type, x.name, x.filesetName or ""), x) for x in resultList)
+    for forecast in forecasts:
+        quotaObject = violations.get((forecast.type, forecast.name, forecast.filesetName))
+        if quotaObject is None:
+            resultList.append(forecast)
+            continue
+        quotaObject.blockViolation = quotaObject.blockViolation or forecast.blockViolation
+        quotaObject.blockCritical = quotaObject.blockCritical or forecast.blockCritical
+        quotaObject.fileViolation = quotaObject.fileViolation or forecast.fileViolation
+        quotaObject.fileCritical = quotaObject.fileCritical or forecast.fileCritical
+        quotaObject.hoursLeftBlock = forecast.hoursLeftBlock
+        quotaObject.hoursLeftFiles = forecast.hoursLeftFiles
+        
+        
+def collectQuotaReport(args, names, timer, index=None, history=None, ranking=None):
+    """
+    Read the quota report of all users/groups of the device with mmrepquota and evaluate it in chunks
+    
+    Args:
+        args     -    parsed arguments of the quota check
+        names    -    set of the users/groups to keep, empty for all
+        timer    -    CheckTimer of the check
+        index    -    QuotaIndex, only the entries which changed since its last run are evaluated
+        history  -    HistoryStore, the usage of all entries is added and forecasted
+        ranking  -    QuotaRanking, all entries are added (also the ones the index does not evaluate again)
+        
+    Return:
+        Tuple of the list of violating QuotaObject and the CommandStream of mmrepquota
+    """
+    command = mmCommand("mmrepquota", "-Y")
+    if args.type:
+        command += " -" + args.type
+  
+    command += " " + args.device
+    
+    if args.fileset:
+        command += ":" + args.fileset
+  
+    
+    output = streamBashCommand(command, args.cacheTtl, args.timeout)
+    # user/group and fileset are unique in the output, so reading can stop after the match
+    stopAfterName = len(names) == 1 and args.type is not None and args.fileset is not None
+
+    resultList = []
+    forecasts = []
+    timestamp = None
+    quotaTable = QuotaTable()
+    keys = []
+    rules = getRuleSet()
+    quotaRules = any(rules.hasRules(x) for x in QUOTA_RULE_KINDS.values())
+    
+    # the entries which the index does not evaluate again are only ranked
+    rankingTable = QuotaTable()
+    
+    def rankTable():
+        with timer.phase('eval'):
+            ranking.addTable(rankingTable)
+            rankingTable.clear()
+            
+    def evaluateTable():
+        with timer.phase('eval'):
+            if ranking is not None:
+                ranking.addTable(quotaTable)
+            violations = quotaTable.getViolations(args.warning, args.critical)
+            if index is not None:
+                index.addEvaluated(quotaTable, keys, violations)
+                del keys[:]
+            resultList.extend(quotaTable.getQuotaObjects(violations))
+            quotaTable.clear()
+            
+    with output, timer.phase('parse'):
+        for record in parseMachineReadable(timer.iterate(output)):
+            timer.rows += 1
+            if names and record["name"] not in names:
+                continue
+            thresholds = None
+            if quotaRules:
+                rule = rules.match(QUOTA_RULE_KINDS.get(record["quotaType"], ""), record["name"])
+                if rule is not None:
+                    if rule.exclude:
+                        continue
+                    thresholds = rule.getThresholds(args.warning, args.critical)
+            if history is not None:
+                if timestamp is None:
+                    # the age of a cached output is known with its first line
+                    timestamp = time.time() - output.age
+                fields = record.fields
+                columns = record.columns
+                forecastQuota(history, forecasts, timestamp, args, fields[columns["quotaType"]], record["name"], record.get("filesetname", ""),
+                              int(fields[columns["blockUsage"]]), int(fields[columns["blockQuota"]]), int(fields[columns["filesUsage"]]), int(fields[columns["filesQuota"]]))
+            if index is not None:
+                key, digest = index.getKey(record)
+                state = index.getUnchanged(key, digest)
+                if state is not None:
+                    if state:
+                        resultList.append(index.getQuotaObject(key, state))
+                    if ranking is not None:
+                        rankingTable.appendRecord(record)
+                        if len(rankingTable) >= QUOTA_CHUNK_SIZE:
+                            rankTable()
+                    continue
+                keys.append((key, digest))
+            quotaTable.appendRecord(record, thresholds)
+            if len(quotaTable) >= QUOTA_CHUNK_SIZE:
+                evaluateTable()
+            if stopAfterName:
+                break
+        else:
+            stopAfterName = False
+    timer.addCommand(output)
+    # the command is stopped after the match of stopAfterName, otherwise a failed report would look like no violations
+    if not stopAfterName and output.returnCode != 0:
+        raise ValueError("mmrepquota failed with exit code " + str(output.returnCode))
+    evaluateTable()
+    if ranking is not None:
+        rankTable()
+    mergeQuotaForecasts(resultList, forecasts)
+    return resultList, output
+
+
+def getQuotaIndexPath(args):
+    """
+    Returns: the path of the QuotaIndex of the quota report of the check
     """
-    return ((100.0 - float(percent)) * float(value)) / 100.0
+    name = "quotaindex-" + args.device
+    if args.fileset:
+        name += "-" + args.fileset
+    if args.type:
+        name += "-" + args.type
+    return os.path.join(STATE_DIRECTORY, name + ".json")
+
 
+def collectQuotaNames(args, names, timer, history=None, ranking=None):
+    """
+    Query only the quota of the given users/groups with one mmlsquota per name (and type) instead of
+    the report of all users/groups, the queries run concurrently
+    
+    Args:
+        args     -    parsed arguments of the quota check
+        names    -    set of the users/groups
+        timer    -    CheckTimer of the check
+        history  -    HistoryStore, the usage of all entries is added and forecasted
+        ranking  -    QuotaRanking, all entries are added
+        
+    Return:
+        Tuple of the list of violating QuotaObject, a CommandOutput with the cache state of all queries
+        and the list of the names without quota
+    """
+    device = args.device
+    if args.fileset:
+        device += ":" + args.fileset
+    # without a type the name may be an user or a group
+    types = [args.type] if args.type else ['u', 'g']
+    
+    rules = getRuleSet()
+    
+    def queryQuota(name, quotaType):
+        quotaTable = QuotaTable()
+        rows = 0
+        with streamBashCommand(mmCommand("mmlsquota", "-" + quotaType + " " + name + " -Y " + device), args.cacheTtl, args.timeout) as output:
+            for record in parseMachineReadable(output):
+                rows += 1
+                rule = rules.match(QUOTA_RULE_KINDS.get(record["quotaType"], ""), record["name"])
+                if rule is None:
+                    quotaTable.appendRecord(record)
+                elif not rule.exclude:
+                    quotaTable.appendRecord(record, rule.getThresholds(args.warning, args.critical))
+        return name, quotaTable, rows, output
+    
+    for name in names:
+        if not name or name.startswith("-") or len(name.split()) != 1:
+            raise ValueError("invalid user/group name '" + name + "'")
+    with timer.phase('exec'), concurrent.futures.ThreadPoolExecutor(max_workers=QUOTA_QUERY_WORKERS) as executor:
+        queries = [executor.submit(queryQuota, name, quotaType) for name in sorted(names) for quotaType in types]
+        queries = [x.result() for x in queries]
+        
+    resultList = []
+    foundNames = set()
+    with timer.phase('eval'):
+        for name, quotaTable, rows, output in queries:
+            timer.rows += rows
+            if output.returnCode == 0 and rows > 0:
+                foundNames.add(name)
+            resultList.extend(quotaTable.evaluate(args.warning, args.critical))
+            if ranking is not None:
+                ranking.addTable(quotaTable)
+            if history is not None:
+                forecasts = []
+                for idx in range(len(quotaTable)):
+                    forecastQuota(history, forecasts, time.time() - output.age, args, quotaTable.types[idx], quotaTable.names[idx], quotaTable.filesetNames[idx],
+                                  quotaTable.blockUsage[idx], quotaTable.blockQuota[idx], quotaTable.filesUsage[idx], quotaTable.filesQuota[idx])
+                mergeQuotaForecasts(resultList, forecasts)
+    outputs = [x[3] for x in queries]
+    # the cache state of the queries is reported as if it was a single command
+    output = CommandOutput("", cached=all(x.cached for x in outputs), age=max(x.age for x in outputs), queueTime=max(x.queueTime for x in outputs))
+    timer.addCommand(output)
+    return resultList, output, sorted(names - foundNames)
+    
     
 def checkQuota(args):
     """
@@ -487,68 +4166,39 @@ def checkQuota(args):
         - quota on cluster
         - quota per users
     """
-    checkResult = CheckResult()
-    command = "sudo /usr/lpp/mmfs/bin/mmrepquota -Y " 
-    if args.type:
-        command += "-" + args.type
-  
-    command += " " + args.device
+    if isMultiDevice(args):
+        return checkDevices(args)
     
-    if args.fileset:
-        command += ":" + args.fileset
-  
+    checkResult = CheckResult()
+    timer = CheckTimer()
+    names = set(args.name.split(",")) if args.name else set()
+    missingNames = []
+    index = None
+    ranking = QuotaRanking(args.top) if args.top else None
+    historyName = args.device + ("-" + args.fileset if args.fileset else "") + "-quota"
+    if names and not args.fullScan:
+        # the few queried names are kept apart from the history of the whole report
+        history = openHistory(args, historyName + "-names")
+        with history or contextlib.nullcontext():
+            resultList, output, missingNames = collectQuotaNames(args, names, timer, history, ranking)
+    else:
+        if args.incremental and not names:
+            index = QuotaIndex(getQuotaIndexPath(args), args.warning, args.critical, getRuleSet().digest)
+        history = openHistory(args, historyName)
+        with history or contextlib.nullcontext():
+            resultList, output = collectQuotaReport(args, names, timer, index, history, ranking)
+        # an incomplete report would clear the missing entries
+        if index is not None and output.returnCode == 0:
+            with timer.phase('eval'):
+                changed = index.finish()
+            if changed:
+                with timer.phase('output'):
+                    index.save()
     
-    output = executeBashCommand(command)
-    lines = output.split("\n")
-    list = []
-    for line in lines:
-        list.append(line.split(":"))
-    # Clear uneccesary last line 
-    list.remove(list[-1])
-
-
-    resultList = []
-    for i in list:
-        idx = list.index(i)
-        # Skipp header
-        if idx > 0:
-            name = getValueFromList(list, "name", idx)
-            quota = getValueFromList(list, "quota", idx)
-            type = getValueFromList(list, "quotaType", idx)
-            filesetname = getValueFromList(list, "filesetname", idx)
-            blockUsage = eval(getValueFromList(list, "blockUsage", idx))
-            blockQuota = eval(getValueFromList(list, "blockQuota", idx))
-            fileUsage = eval(getValueFromList(list, "filesUsage", idx))
-            fileQuota = eval(getValueFromList(list, "filesQuota", idx))
-            
-            warningValue = blockQuota * (float(args.warning) / 100.0)
-            criticalValue = blockQuota * (float(args.critical) / 100.0)
-        
-            quotaObject = QuotaObject(name, type)
-
-            # Check Block Quota
-            if blockUsage > criticalValue and blockQuota != 0:
-                quotaObject.blockViolation = True 
-                quotaObject.blockCritical = True
-              
-            if blockUsage > warningValue and blockQuota != 0:
-                quotaObject.blockViolation = True
-                
-            # Check file quota
-            warningValue = fileQuota * (float(args.warning) / 100.0)
-            criticalValue = fileQuota * (float(args.critical) / 100.0)
-            if fileUsage > criticalValue and blockQuota != 0:
-                quotaObject.fileCritical = True 
-                quotaObject.fileViolation = True 
-                
-            if fileUsage > warningValue and blockQuota != 0:
-                quotaObject.fileViolation = True 
-                
-            if quotaObject.isVioliation():
-                resultList.append(quotaObject)
-    # Filter for single user/grp request
-    if args.name != None:   
-        resultList = [x for x in resultList if x.name == args.name]
+    timer.switch('eval')
+    # Filter for user/grp request
+    if names:   
+        resultList = [x for x in resultList if x.name in names]
         
     blockViolation = len([x for x in resultList if x.blockViolation == True and x.blockCritical == False])
     fileViolation = len([x for x in resultList if x.fileViolation == True and x.fileCritical == False])
@@ -557,6 +4207,7 @@ def checkQuota(args):
     
     checkResult = CheckResult()
     
+    timer.switch('output')
     checkResult.performanceData = "blockViolation=" + str(blockViolation) + " blockCritical=" + str(blockCritical) + " fileViolation=" + str(fileViolation) + " fileCritical=" + str(fileCritical);
     if args.longOutput:
             userListBlockCritical = []
@@ -593,13 +4244,29 @@ def checkQuota(args):
             
             checkResult.longOutput = "User Block: " + ", ".join(userListBlock) + "\n"   
             checkResult.longOutput += "User Block Critical: " + ", ".join(userListBlockCritical) + "\n"
-            checkResult.longOutput += "User File: " + ", ".join(userListBlockCritical) + "\n"  
-            checkResult.longOutput += "User File Critical: " + ", ".join(userListBlockCritical) + "\n"
+            checkResult.longOutput += "User File: " + ", ".join(userListFile) + "\n"  
+            checkResult.longOutput += "User File Critical: " + ", ".join(userListFileCritical) + "\n"
             checkResult.longOutput += "Group Block: " + ", ".join(groupListBlock) + "\n"   
             checkResult.longOutput += "Group Block Critical: " + ", ".join(groupListBlockCritical) + "\n"
-            checkResult.longOutput += "Group File: " + ", ".join(groupListBlockCritical) + "\n"  
-            checkResult.longOutput += "Group File Critical: " + ", ".join(groupListBlockCritical)     
-    if blockViolation > 0 and blockCritical > 0 or fileViolation > 0 and fileViolation > 0:
+            checkResult.longOutput += "Group File: " + ", ".join(groupListFile) + "\n"  
+            checkResult.longOutput += "Group File Critical: " + ", ".join(groupListFileCritical)     
+            if index is not None:
+                checkResult.longOutput += "\nNew Violations: " + ", ".join(index.entered) + "\n"
+                checkResult.longOutput += "Cleared Violations: " + ", ".join(index.cleared)
+            if history is not None:
+                forecasts = []
+                for x in resultList:
+                    description = x.name + " (" + x.type + (", " + x.filesetName if x.filesetName else "") + ")"
+                    if x.hoursLeftBlock is not None:
+                        forecasts.append(description + " block " + str(round(x.hoursLeftBlock, 1)) + "h")
+                    if x.hoursLeftFiles is not None:
+                        forecasts.append(description + " files " + str(round(x.hoursLeftFiles, 1)) + "h")
+                checkResult.longOutput += "\nForecast: " + ", ".join(forecasts)
+    if ranking is not None:
+        # the ranking is the answer to who fills the fileset, it is shown without -L too
+        checkResult.longOutput = (checkResult.longOutput + "\n" if checkResult.longOutput else "") + ranking.getLongOutput()
+    # one entry over the critical threshold is enough, the warnings do not raise the state to critical
+    if blockCritical > 0 or fileCritical > 0:
         
         checkResult.returnCode = STATE_CRITICAL
         checkResult.returnMessage = "Critical - Block Critical: " + str(blockCritical) + " File Critical: " + str(fileCritical)
@@ -607,12 +4274,805 @@ def checkQuota(args):
     elif blockViolation > 0 or fileViolation > 0:
         checkResult.returnCode = STATE_WARNING
         checkResult.returnMessage = "WARNING - Block: " + str(blockViolation) + " File: " + str(fileViolation)
+    elif missingNames:
+        checkResult.returnCode = STATE_UNKNOWN
+        checkResult.returnMessage = "UNKNOWN - No quota found for: " + ", ".join(missingNames)
     else:
         checkResult.returnCode = STATE_OK
         checkResult.returnMessage = "OK - No Violations detected"
+    if history is not None:
+        states = [getForecastState(x.hoursLeftBlock, args) for x in resultList] + [getForecastState(x.hoursLeftFiles, args) for x in resultList]
+        checkResult.addPerformanceData(forecastPerformanceData(states))
+    if index is not None:
+        checkResult.addPerformanceData("changedRows=" + str(index.changedRows) + " newViolations=" + str(len(index.entered)) + " clearedViolations=" + str(len(index.cleared)))
 
 
-    checkResult.printMonitoringOutput()
+    checkResult.addPerformanceData(cachePerformanceData(output))
+    timer.switch(None)
+    if args.timings:
+        checkResult.addPerformanceData(timer.getPerformanceData())
+    return checkResult
+
+
+def runCheck(args):
+    """
+    Args:
+        args    -    parsed arguments of a check
+        
+    Return:
+        CheckResult of the check, UNKNOWN if the check failed with an error
+    """
+    try:
+        return args.func(args)
+    except CommandTimeoutError as error:
+        return CheckResult(STATE_UNKNOWN, "UNKNOWN - " + str(error), error.getPerformanceData())
+    except Exception as error:
+        return CheckResult(STATE_UNKNOWN, "UNKNOWN - " + args.func.__name__ + " failed: " + str(error))
+
+
+def profileCheck(args):
+    """
+    Run the check like runCheck with the profilers requested in args and write their reports:
+        - cProfile statistics to args.profile (e.g. for pstats or snakeviz)
+        - allocation sites with the most memory from tracemalloc to args.traceMemory
+        
+    Return:
+        CheckResult of the check
+    """
+    profiler = None
+    if args.traceMemory:
+        tracemalloc.start()
+    if args.profile:
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        return runCheck(args)
+    finally:
+        try:
+            if profiler is not None:
+                profiler.disable()
+                profiler.dump_stats(args.profile)
+            if args.traceMemory:
+                snapshot = tracemalloc.take_snapshot()
+                current, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                report = "current=" + str(current) + "B peak=" + str(peak) + "B\n"
+                for statistic in snapshot.statistics("lineno")[:TRACE_MEMORY_TOP]:
+                    report += str(statistic) + "\n"
+                writeFileAtomic(args.traceMemory, report)
+        except OSError as error:
+            # the check result is still reported
+            sys.stderr.write("Could not write the profile: " + str(error) + "\n")
+
+
+def readCheckSpecs(specFile=None, checks=None):
+    """
+    Args:
+        specFile    -    file with one check command line per line (# starts a comment)
+        checks      -    list of check command lines
+        
+    Return:
+        List of the check command lines as argument lists
+    """
+    specs = []
+    if specFile:
+        with open(specFile) as lines:
+            for line in lines:
+                line = line.strip()
+                if line and not line.startswith("#"):
+                    specs.append(shlex.split(line))
+    for check in checks or []:
+        specs.append(shlex.split(check))
+    return specs
+
+
+def getSpecLabel(argv):
+    """
+    Returns: the label of the check command line argv to qualify its performance data, e.g. filesets_d_fs1_i
+    """
+    return re.sub(r'[^A-Za-z0-9.]+', '_', " ".join(argv)).strip('_')
+
+
+def runBatch(parser, specs, workers=BATCH_WORKERS):
+    """
+    Run the checks of specs concurrently in a thread pool. Identical mm* commands of the checks are
+    executed only once (CommandMemo), so the batch takes about as long as its slowest command.
+    
+    Args:
+        parser     -    argument parser for the check command lines
+        specs      -    list of check command lines as argument lists
+        workers    -    number of checks which run concurrently
+        
+    Return:
+        List of the CheckResult of each spec in the order of specs
+    """
+    memo = CommandMemo()
+    
+    def runSpec(argv):
+        try:
+            args = parser.parse_args(argv)
+        except SystemExit:
+            return CheckResult(STATE_UNKNOWN, "UNKNOWN - Invalid check arguments: " + " ".join(argv))
+        if not hasattr(args, 'func') or args.func.__name__ not in READ_ONLY_CHECKS:
+            return CheckResult(STATE_UNKNOWN, "UNKNOWN - No check given in: " + " ".join(argv))
+        MEMO_CONTEXT.memo = memo
+        try:
+            return runCheck(args)
+        finally:
+            MEMO_CONTEXT.memo = None
+            
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        return list(executor.map(runSpec, specs))
+    
+    
+def checkAll(args):
+    """
+    Run several checks (e.g. status, filesets, pools and quota of a cluster) in one process with runBatch
+    and merge their results: the worst state, the summary of the states, the message of each check in
+    the long output and the performance data qualified with the label of each check
+    """
+    specs = readCheckSpecs(args.specFile, args.checks)
+    if not specs:
+        return CheckResult(STATE_UNKNOWN, "UNKNOWN - No checks given, use -f or -e")
+    
+    started = time.monotonic()
+    results = runBatch(argumentParser(), specs, args.workers)
+    
+    checkResult = mergeCheckResults(results, [" ".join(x) for x in specs], [getSpecLabel(x) for x in specs], "checks", args.longOutput)
+    checkResult.addPerformanceData("checks=" + str(len(results)) + " t_batch=" + str(round(time.monotonic() - started, 3)) + "s")
+    return checkResult
+
+
+def mergeCheckResults(results, names, labels, noun, longOutput=False):
+    """
+    Merge the results of several checks into one
+    
+    Args:
+        results       -    list of CheckResult
+        names         -    name of each result in the long output
+        labels        -    label of each result which qualifies its performance data (label::name=value)
+        noun          -    what the results are in the summary, e.g. checks
+        longOutput    -    add the long output of each result
+        
+    Return:
+        CheckResult with the worst state, the summary of the states, the message of each result in the long
+        output and the qualified performance data of all results
+    """
+    stateNames = {STATE_OK: "OK", STATE_WARNING: "WARNING", STATE_CRITICAL: "CRITICAL", STATE_UNKNOWN: "UNKNOWN"}
+    checkResult = CheckResult()
+    # an unknown check does not hide a critical one
+    checkResult.returnCode = max(results, key=lambda x: (x.returnCode != STATE_UNKNOWN, x.returnCode)).returnCode
+    counts = [str(len([x for x in results if x.returnCode == state])) + " " + stateNames[state].lower() for state in (STATE_CRITICAL, STATE_WARNING, STATE_UNKNOWN, STATE_OK)]
+    checkResult.returnMessage = stateNames[checkResult.returnCode] + " - " + str(len(results)) + " " + noun + ": " + ", ".join(counts)
+    
+    checkResult.longOutput = ""
+    performanceData = []
+    for name, label, result in zip(names, labels, results):
+        checkResult.longOutput += "[" + stateNames.get(result.returnCode, "UNKNOWN") + "] " + name + ": " + result.returnMessage + "\n"
+        if longOutput and result.longOutput:
+            checkResult.longOutput += "".join("    " + x + "\n" for x in result.longOutput.splitlines())
+        if result.performanceData:
+            performanceData.extend(label + "::" + x for x in result.performanceData.split())
+    checkResult.performanceData = " ".join(performanceData)
+    return checkResult
+
+
+def getDevices(device):
+    """
+    Args:
+        device    -    device, devices (delimiter is ,) or all
+        
+    Return:
+        List of the devices, for all the file systems of the cluster from mmlsfs all
+    """
+    if device != "all":
+        devices = []
+        for name in device.split(","):
+            if name and name not in devices:
+                devices.append(name)
+        return devices
+    devices = []
+    with streamBashCommand(mmCommand("mmlsfs", "all -T -Y")) as output:
+        for record in parseMachineReadable(output):
+            if record["deviceName"] not in devices:
+                devices.append(record["deviceName"])
+    if output.returnCode != 0 or not devices:
+        raise ValueError("no file systems found with mmlsfs all (exit code " + str(output.returnCode) + ")")
+    return devices
+
+
+def isMultiDevice(args):
+    """
+    Returns: true if the check is for several devices (delimiter is ,) or all
+    """
+    return args.device == "all" or "," in args.device
+
+
+def checkDevices(args):
+    """
+    Run the check of args (filesets, pools or quota) for each of its devices concurrently and merge the results
+    with the device as label of the performance data (e.g. fs1::blockViolation=0) and the worst state
+    """
+    devices = getDevices(args.device)
+    
+    def checkDevice(device):
+        deviceArgs = argparse.Namespace(**vars(args))
+        deviceArgs.device = device
+        return runCheck(deviceArgs)
+            
+    results = mapDevices(checkDevice, devices)
+    # the quota ranking is shown without -L too
+    return mergeCheckResults(results, devices, devices, "devices", args.longOutput or bool(getattr(args, 'top', None)))
+
+
+def mapDevices(function, devices):
+    """
+    Call function for each of devices concurrently by up to DEVICE_WORKERS threads, which share the
+    command results of the batch the calling thread runs a check for
+    
+    Return:
+        List of the results of function in the order of devices
+    """
+    if not devices:
+        return []
+    memo = getattr(MEMO_CONTEXT, "memo", None)
+    
+    def callFunction(device):
+        MEMO_CONTEXT.memo = memo
+        try:
+            return function(device)
+        finally:
+            MEMO_CONTEXT.memo = None
+            
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, min(DEVICE_WORKERS, len(devices)))) as executor:
+        return list(executor.map(callFunction, devices))
+
+
+def getFileSetResult(filesetObject, args):
+    """
+    Returns: the CheckResult of a single fileset from collectFileSets for its passive service
+    """
+    checkResult = CheckResult()
+    text = "Fileset " + filesetObject.filesetName + " is " + filesetObject.status + ", " + str(filesetObject.freeInodes) + " of " + str(filesetObject.maxInodes) + " inodes free"
+    if filesetObject.criticalInodes:
+        checkResult.returnCode = STATE_CRITICAL
+        checkResult.returnMessage = "Critical - " + text
+    elif filesetObject.warningInodes or filesetObject.status != 'Linked':
+        checkResult.returnCode = STATE_WARNING
+        checkResult.returnMessage = "Warning - " + text
+    else:
+        checkResult.returnCode = STATE_OK
+        checkResult.returnMessage = "OK - " + text
+    checkResult.performanceData = "freeInodes=" + str(filesetObject.freeInodes) + ";" + str(calculatePercentageOfValue(filesetObject.warning, filesetObject.maxInodes)) + ";" + str(calculatePercentageOfValue(filesetObject.critical, filesetObject.maxInodes)) + ";0;" + str(filesetObject.maxInodes)
+    return checkResult
+
+
+def getPoolResult(poolObject, args):
+    """
+    Returns: the CheckResult of a single pool from collectPools for its passive service
+    """
+    checkResult = CheckResult()
+    checkResult.performanceData = ""
+    if poolObject.data:
+        checkResult.performanceData += "Data_free=" + str(poolObject.dataFree) + poolObject.unit + ";" + str(calculatePercentageOfValue(poolObject.warning, poolObject.dataTotal)) + ";" + str(calculatePercentageOfValue(poolObject.critical, poolObject.dataTotal)) + ";;" + str(poolObject.dataTotal) + " "
+    if poolObject.meta:
+        checkResult.performanceData += "Meta_free=" + str(poolObject.metaFree) + poolObject.unit + ";" + str(calculatePercentageOfValue(poolObject.warning, poolObject.metaTotal)) + ";" + str(calculatePercentageOfValue(poolObject.critical, poolObject.metaTotal)) + ";;" + str(poolObject.metaTotal)
+    checkResult.performanceData = checkResult.performanceData.rstrip()
+    
+    text = "Pool " + poolObject.name
+    if poolObject.data:
+        text += " data: " + str(poolObject.dataFree) + poolObject.unit + " of " + str(poolObject.dataTotal) + poolObject.unit + " free"
+    if poolObject.meta:
+        text += " meta: " + str(poolObject.metaFree) + poolObject.unit + " of " + str(poolObject.metaTotal) + poolObject.unit + " free"
+    if (poolObject.data and poolObject.criticalData) or (poolObject.meta and poolObject.criticalMeta):
+        checkResult.returnCode = STATE_CRITICAL
+        checkResult.returnMessage = "Critical - " + text
+    elif (poolObject.data and poolObject.warningData) or (poolObject.meta and poolObject.warningMeta):
+        checkResult.returnCode = STATE_WARNING
+        checkResult.returnMessage = "Warning - " + text
+    else:
+        checkResult.returnCode = STATE_OK
+        checkResult.returnMessage = "OK - " + text
+    return checkResult
+
+
+def formatPassiveResult(timestamp, host, service, checkResult):
+    """
+    Returns: the external command PROCESS_SERVICE_CHECK_RESULT of the checkResult for the service of host
+    """
+    # the long output is passed with escaped line breaks
+    output = checkResult.getMonitoringOutput().replace("\\", "\\\\").replace("\n", "\\n")
+    return "[" + str(int(timestamp)) + "] PROCESS_SERVICE_CHECK_RESULT;" + host + ";" + service + ";" + str(checkResult.returnCode) + ";" + output + "\n"
+
+
+def writeCommandFile(path, commands):
+    """
+    Write the external commands to the command file (or FIFO) path with as few writes as possible. A FIFO
+    gets chunks of whole lines up to PIPE_BUF, which are not interleaved with the commands of other writers.
+    """
+    data = "".join(commands).encode()
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND)
+    try:
+        chunks = [data]
+        if os.path.exists(path) and os.stat(path).st_mode & 0o170000 == 0o010000:
+            chunks = []
+            chunk = b""
+            for line in data.splitlines(True):
+                if chunk and len(chunk) + len(line) > select.PIPE_BUF:
+                    chunks.append(chunk)
+                    chunk = b""
+                chunk += line
+            chunks.append(chunk)
+        for chunk in chunks:
+            while chunk:
+                chunk = chunk[os.write(fd, chunk):]
+    finally:
+        os.close(fd)
+        
+        
+def writeCheckResultSpool(directory, timestamp, host, results):
+    """
+    Write the results as one check result file to the spool directory of Nagios (check_result_path)
+    
+    Args:
+        directory    -    check result spool directory
+        timestamp    -    time of the results
+        host         -    host of the services
+        results      -    list of tuples of the service name and its CheckResult
+    """
+    text = "### Passive Check Result File ###\nfile_time=" + str(int(timestamp)) + "\n\n"
+    for service, checkResult in results:
+        text += "### Nagios Service Check Result ###\n"
+        text += "host_name=" + host + "\nservice_description=" + service + "\n"
+        text += "check_type=1\ncheck_options=0\nscheduled_check=0\nreschedule_check=0\nlatency=0.0\n"
+        text += "start_time=" + str(timestamp) + "\nfinish_time=" + str(timestamp) + "\nearly_timeout=0\nexited_ok=1\n"
+        text += "return_code=" + str(checkResult.returnCode) + "\n"
+        text += "output=" + checkResult.getMonitoringOutput().replace("\\", "\\\\").replace("\n", "\\n") + "\n\n"
+    # the file name has to be c + 6 characters, it is processed once the .ok file exists
+    while True:
+        path = os.path.join(directory, "c" + "".join(random.choice("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789") for x in range(6)))
+        try:
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+            break
+        except FileExistsError:
+            continue
+    with os.fdopen(fd, "w") as resultFile:
+        resultFile.write(text)
+    open(path + ".ok", "w").close()
+    
+    
+def submitPassiveResults(args):
+    """
+    Run the status, quota, filesets and pools checks of a device once and submit their results as passive
+    results: one service for the status, the quota, each fileset and each pool
+    """
+    timestamp = time.time()
+    prefix = args.servicePrefix + " "
+    timer = CheckTimer()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=3) as executor:
+        filesets = executor.submit(collectFileSets, args, timer)
+        pools = executor.submit(collectPools, args, CheckTimer())
+        checks = executor.submit(runBatch, argumentParser(), [["status", "-q"], ["quota", "-d", args.device, "-w", str(args.warning), "-c", str(args.critical)]])
+        statusResult, quotaResult = checks.result()
+        filesetList = filesets.result()[0]
+        poolList = pools.result()[0]
+        
+    results = [(prefix + "status", statusResult), (prefix + "quota " + args.device, quotaResult)]
+    for filesetObject in filesetList:
+        results.append((prefix + "fileset " + args.device + " " + filesetObject.filesetName, getFileSetResult(filesetObject, args)))
+    for poolObject in poolList:
+        results.append((prefix + "pool " + args.device + " " + poolObject.name, getPoolResult(poolObject, args)))
+    
+    if args.spoolDirectory:
+        writeCheckResultSpool(args.spoolDirectory, timestamp, args.host, results)
+        target = args.spoolDirectory
+    else:
+        writeCommandFile(args.commandFile, [formatPassiveResult(timestamp, args.host, service, checkResult) for service, checkResult in results])
+        target = args.commandFile
+        
+    checkResult = CheckResult()
+    checkResult.returnCode = STATE_OK
+    checkResult.returnMessage = "OK - Submitted " + str(len(results)) + " passive results of " + args.device + " to " + target
+    checkResult.performanceData = "results=" + str(len(results)) + " filesets=" + str(len(filesetList)) + " pools=" + str(len(poolList))
+    return checkResult
+
+
+def addNodeMetrics(writer, args):
+    """
+    Add the state of all nodes and the quorum of the cluster from mmgetstate -a -LY to the MetricsWriter
+    
+    Return:
+        Number of nodes
+    """
+    writer.declare("gpfs_node_state", "State of the node, 1 for the state it is in")
+    writer.declare("gpfs_quorum_nodes_up", "Number of quorum nodes which are up")
+    writer.declare("gpfs_quorum_nodes_needed", "Number of quorum nodes needed for the quorum")
+    writer.declare("gpfs_nodes", "Number of nodes of the cluster")
+    rules = getRuleSet()
+    quorum = None
+    nodes = 0
+    with streamBashCommand(mmCommand("mmgetstate", "-a -LY")) as output:
+        for record in parseMachineReadable(output):
+            if quorum is None and record["state"] == "active":
+                # the quorum values are only reported by active nodes
+                quorum = (record.getInt("nodesUp"), getQuorumNeeded(record), record.getInt("totalNodes"))
+            if rules.isExcluded("node", record["nodeName"]):
+                continue
+            writer.add("gpfs_node_state", MetricsWriter.formatLabels(("node", record["nodeName"]), ("state", record["state"])), 1)
+            nodes += 1
+    if output.returnCode != 0:
+        raise ValueError("mmgetstate failed with exit code " + str(output.returnCode))
+    quorumUp, quorumNeeded, totalNodes = quorum or (0, 0, nodes)
+    writer.add("gpfs_quorum_nodes_up", "", quorumUp)
+    writer.add("gpfs_quorum_nodes_needed", "", quorumNeeded)
+    writer.add("gpfs_nodes", "", totalNodes)
+    return nodes
+
+
+def addPoolMetrics(writer, device, poolList):
+    """
+    Add the size and the free space of the data and metadata of each PoolObject of poolList to the MetricsWriter
+    """
+    writer.declare("gpfs_pool_data_size_bytes", "Size of the data disks of the pool")
+    writer.declare("gpfs_pool_data_free_bytes", "Free space of the data disks of the pool")
+    writer.declare("gpfs_pool_metadata_size_bytes", "Size of the metadata disks of the pool")
+    writer.declare("gpfs_pool_metadata_free_bytes", "Free space of the metadata disks of the pool")
+    for poolObject in poolList:
+        labels = MetricsWriter.formatLabels(("device", device), ("pool", poolObject.name))
+        if poolObject.data:
+            writer.add("gpfs_pool_data_size_bytes", labels, poolObject.getBytes(poolObject.dataTotal))
+            writer.add("gpfs_pool_data_free_bytes", labels, poolObject.getBytes(poolObject.dataFree))
+        if poolObject.meta:
+            writer.add("gpfs_pool_metadata_size_bytes", labels, poolObject.getBytes(poolObject.metaTotal))
+            writer.add("gpfs_pool_metadata_free_bytes", labels, poolObject.getBytes(poolObject.metaFree))
+            
+
+def addFileSetMetrics(writer, device, filesetList):
+    """
+    Add the inodes, the link status and the last known data size (filesets -S) of each FileSetObject of filesetList
+    to the MetricsWriter
+    """
+    writer.declare("gpfs_fileset_max_inodes", "Maximum number of inodes of the fileset")
+    writer.declare("gpfs_fileset_alloc_inodes", "Number of allocated inodes of the fileset")
+    writer.declare("gpfs_fileset_free_inodes", "Number of inodes of the fileset which can still be allocated")
+    writer.declare("gpfs_fileset_linked", "1 if the fileset is linked")
+    writer.declare("gpfs_fileset_data_bytes", "Data size of the fileset collected in the background (filesets -S)")
+    sizes = readFileSetSizes(device)[0] or {}
+    for filesetObject in filesetList:
+        labels = MetricsWriter.formatLabels(("device", device), ("fileset", filesetObject.filesetName))
+        writer.add("gpfs_fileset_max_inodes", labels, filesetObject.maxInodes)
+        writer.add("gpfs_fileset_alloc_inodes", labels, filesetObject.allocInodes)
+        writer.add("gpfs_fileset_free_inodes", labels, filesetObject.freeInodes)
+        writer.add("gpfs_fileset_linked", labels, int(filesetObject.status == 'Linked'))
+        if filesetObject.filesetName in sizes:
+            writer.add("gpfs_fileset_data_bytes", labels, sizes[filesetObject.filesetName] * UNIT_BYTES['KB'])
+            
+
+def addQuotaMetrics(writer, args):
+    """
+    Add the usage, the quota and the limit of the blocks and files of each user, group and fileset quota entry
+    of the device to the MetricsWriter, the mmrepquota report is streamed
+    
+    Return:
+        Number of quota entries
+    """
+    families = (("gpfs_quota_block_usage_bytes", "blockUsage", UNIT_BYTES['KB'], "Block usage of the quota entry"),
+                ("gpfs_quota_block_quota_bytes", "blockQuota", UNIT_BYTES['KB'], "Block quota (soft limit) of the quota entry, 0 for none"),
+                ("gpfs_quota_block_limit_bytes", "blockLimit", UNIT_BYTES['KB'], "Block limit (hard limit) of the quota entry, 0 for none"),
+                ("gpfs_quota_files_usage", "filesUsage", 1, "Number of files of the quota entry"),
+                ("gpfs_quota_files_quota", "filesQuota", 1, "File quota (soft limit) of the quota entry, 0 for none"),
+                ("gpfs_quota_files_limit", "filesLimit", 1, "File limit (hard limit) of the quota entry, 0 for none"))
+    for name, column, factor, help in families:
+        writer.declare(name, help)
+    names = [x[0] for x in families]
+    rules = getRuleSet()
+    quotaRules = any(rules.hasRules(x) for x in QUOTA_RULE_KINDS.values())
+    prefixes = {}
+    rows = 0
+    with streamBashCommand(mmCommand("mmrepquota", "-Y " + args.device), args.cacheTtl, args.timeout) as output:
+        for record in parseMachineReadable(output):
+            quotaType = record["quotaType"]
+            if quotaRules and rules.isExcluded(QUOTA_RULE_KINDS.get(quotaType, ""), record["name"]):
+                continue
+            # the device and type labels are escaped once per device and type
+            prefix = prefixes.get(quotaType)
+            if prefix is None:
+                prefix = prefixes[quotaType] = MetricsWriter.formatLabels(("device", args.device), ("type", QUOTA_RULE_KINDS.get(quotaType, quotaType)))[:-1]
+            labels = prefix + ',principal="' + MetricsWriter.escapeLabel(record["name"]) + '",fileset="' + MetricsWriter.escapeLabel(record.get("filesetname", "")) + '"}'
+            fields = record.fields
+            columns = record.columns
+            writer.addRow(names, labels, [int(fields[columns[column]]) * factor for name, column, factor, help in families])
+            rows += 1
+    if output.returnCode != 0:
+        raise ValueError("mmrepquota failed with exit code " + str(output.returnCode))
+    return rows
+
+
+def writeMetricsFile(args):
+    """
+    Collect the node states and the pools, filesets and quota of the devices (concurrently per device) and write
+    them in the Prometheus/OpenMetrics text format atomically to a file of the node_exporter textfile collector
+    """
+    started = time.monotonic()
+    devices = getDevices(args.device)
+    writers = []
+    counts = {'nodes': 0, 'pools': 0, 'filesets': 0, 'quota': 0}
+    try:
+        if not args.noNodes:
+            writer = MetricsWriter()
+            writers.append(writer)
+            counts['nodes'] = addNodeMetrics(writer, args)
+            
+        def collectDevice(device):
+            deviceArgs = argparse.Namespace(**vars(args))
+            deviceArgs.device = device
+            writer = MetricsWriter()
+            writers.append(writer)
+            poolList = collectPools(deviceArgs, CheckTimer())[0]
+            addPoolMetrics(writer, device, poolList)
+            filesetList = collectFileSets(deviceArgs, CheckTimer())[0]
+            addFileSetMetrics(writer, device, filesetList)
+            rows = addQuotaMetrics(writer, deviceArgs) if not args.noQuota else 0
+            return len(poolList), len(filesetList), rows
+        
+        for pools, filesets, rows in mapDevices(collectDevice, devices):
+            counts['pools'] += pools
+            counts['filesets'] += filesets
+            counts['quota'] += rows
+        writer = MetricsWriter()
+        writers.append(writer)
+        writer.declare("gpfs_textfile_duration_seconds", "Seconds the collection of the metrics took")
+        writer.add("gpfs_textfile_duration_seconds", "", round(time.monotonic() - started, 3))
+        writer.declare("gpfs_textfile_timestamp_seconds", "Time the metrics were collected")
+        writer.add("gpfs_textfile_timestamp_seconds", "", round(time.time(), 3))
+        with openFileAtomic(args.output, 0o644) as output:
+            MetricsWriter.writeAll(output, writers)
+    finally:
+        for writer in writers:
+            writer.close()
+    
+    checkResult = CheckResult()
+    checkResult.returnCode = STATE_OK
+    checkResult.returnMessage = "OK - Wrote the metrics of " + str(len(devices)) + " devices to " + args.output
+    checkResult.performanceData = " ".join(x + "=" + str(counts[x]) for x in sorted(counts)) + " t_collect=" + str(round(time.monotonic() - started, 3)) + "s"
+    return checkResult
+
+
+def checkSpecKey(args):
+    """
+    Returns: the key which identifies the check of the parsed arguments in the agent
+    """
+    return args.func.__name__ + repr(sorted((name, value) for name, value in vars(args).items() if name not in AGENT_KEY_IGNORE))
+
+
+def checkAgentSettings(argv, args):
+    """
+    Raise a ValueError if argv passes one of AGENT_SETTINGS with another value than the agent process uses,
+    the checks of the agent run with its rules, state directory and mm* commands
+    """
+    agentValues = {'rulesFile': RULES_FILE, 'stateDirectory': STATE_DIRECTORY, 'mmfsBin': MMFS_BIN_DIRECTORY}
+    for option, name in AGENT_SETTINGS.items():
+        if not any(x == option or x.startswith(option + "=") for x in argv):
+            continue
+        value = getattr(args, name)
+        normalize = lambda path: os.path.abspath(path) if path else None
+        if normalize(value) != normalize(agentValues[name]):
+            raise ValueError(option + " " + str(value) + " differs from the agent (" + str(agentValues[name]) + "), run the check without the agent")
+
+
+class CheckAgent:
+    """
+    Runs the checks periodically in the background and keeps the latest CheckResult of each
+    check in memory, which is served to the clients on a Unix socket
+    """
+    
+    def __init__(self, parser, interval, maxAge, maxChecks=AGENT_MAX_CHECKS, idleExpiry=AGENT_IDLE_EXPIRY):
+        self.parser = parser
+        self.interval = float(interval)
+        self.maxAge = float(maxAge)
+        self.maxChecks = maxChecks
+        self.idleExpiry = float(idleExpiry)
+        self.specs = {}
+        self.results = {}
+        # key -> monotonic time of the last request, the checks of the spec file are pinned and never expire
+        self.requested = {}
+        self.pinned = set()
+        self.lock = threading.Lock()
+        self.resultAvailable = threading.Condition(self.lock)
+        
+    def addSpec(self, argv, pinned=False):
+        """
+        Register the check of the command line arguments argv and start its schedule
+        
+        Args:
+            argv      -    command line arguments of the check
+            pinned    -    the check is scheduled until the agent stops (spec file), otherwise it expires if it is not requested
+            
+        Return:
+            Key of the check
+        """
+        args = self.parser.parse_args(argv)
+        if not hasattr(args, 'func') or args.func.__name__ not in READ_ONLY_CHECKS:
+            raise ValueError("the agent only runs the checks status, filesystems, io, waiters, iolatency, filesets, pools and quota, not: " + " ".join(argv))
+        checkAgentSettings(argv, args)
+        key = checkSpecKey(args)
+        with self.lock:
+            self.requested[key] = time.monotonic()
+            if pinned:
+                self.pinned.add(key)
+            if key in self.specs:
+                return key
+            if not pinned and len(set(self.specs) - self.pinned) >= self.maxChecks:
+                raise ValueError("the agent already runs the maximum of " + str(self.maxChecks) + " requested checks")
+            self.specs[key] = args
+        thread = threading.Thread(target=self._schedule, args=(key, args), daemon=True)
+        thread.start()
+        return key
+    
+    def _schedule(self, key, args):
+        """
+        Run the check every interval seconds and store its result, until it was not requested for idleExpiry seconds
+        """
+        while True:
+            with self.lock:
+                if key not in self.pinned and time.monotonic() - self.requested[key] > self.idleExpiry:
+                    del self.specs[key], self.requested[key]
+                    self.results.pop(key, None)
+                    return
+            started = time.monotonic()
+            checkResult = runCheck(args)
+            with self.lock:
+                self.results[key] = (time.time(), checkResult)
+                self.resultAvailable.notify_all()
+            time.sleep(max(0.0, self.interval - (time.monotonic() - started)))
+            
+    def getResult(self, argv, wait=0.0):
+        """
+        Args:
+            argv    -    command line arguments of the check
+            wait    -    seconds to wait for the first result of a check which was not run yet
+            
+        Return:
+            Latest CheckResult of the check with its age, UNKNOWN if there is none or it is stale
+        """
+        try:
+            key = self.addSpec(argv)
+        except (ValueError, SystemExit) as error:
+            return CheckResult(STATE_UNKNOWN, "UNKNOWN - Invalid check arguments: " + str(error)), 0.0
+        with self.lock:
+            self.resultAvailable.wait_for(lambda: key in self.results, timeout=wait)
+            entry = self.results.get(key)
+        if entry is None:
+            return CheckResult(STATE_UNKNOWN, "UNKNOWN - No result available yet, the check is scheduled"), 0.0
+        
+        timestamp, checkResult = entry
+        age = max(0.0, time.time() - timestamp)
+        if age > self.maxAge:
+            return CheckResult(STATE_UNKNOWN, "UNKNOWN - Last result is " + str(round(age, 1)) + "s old (max " + str(round(self.maxAge, 1)) + "s): " + checkResult.returnMessage), age
+        return checkResult, age
+    
+    def serve(self, socketPath, group=None):
+        """
+        Answer the requests of the clients on the Unix socket socketPath until the process is terminated. The socket
+        is only accessible by the user of the agent and the group (mode 0660), a new directory of the socket only
+        by the user (mode 0700) or also searchable by the group (mode 0710).
+        
+        Args:
+            socketPath    -    path of the Unix socket
+            group         -    name or id of the group of the clients, None for the group of the agent process
+        """
+        agent = self
+        
+        class RequestHandler(socketserver.StreamRequestHandler):
+            def handle(self):
+                try:
+                    request = json.loads(self.rfile.readline().decode())
+                    checkResult, age = agent.getResult([str(x) for x in request["argv"]], float(request.get("wait", 0.0)))
+                except (ValueError, KeyError, TypeError) as error:
+                    checkResult, age = CheckResult(STATE_UNKNOWN, "UNKNOWN - Invalid request: " + str(error)), 0.0
+                response = dict(vars(checkResult), age=age)
+                self.wfile.write(json.dumps(response).encode() + b"\n")
+        
+        gid = -1
+        if group is not None:
+            gid = int(group) if str(group).isdigit() else grp.getgrnam(group).gr_gid
+        socketDirectory = os.path.dirname(socketPath)
+        if socketDirectory and not os.path.isdir(socketDirectory):
+            os.makedirs(socketDirectory, mode=0o700)
+            if gid >= 0:
+                os.chown(socketDirectory, -1, gid)
+                os.chmod(socketDirectory, 0o710)
+        # the socket is created with the umask in a private directory and moved to its path once its permissions are set
+        bindDirectory = tempfile.mkdtemp(dir=socketDirectory or ".", prefix=".agent")
+        try:
+            server = socketserver.ThreadingUnixStreamServer(os.path.join(bindDirectory, "socket"), RequestHandler)
+            if gid >= 0:
+                os.chown(server.server_address, -1, gid)
+            os.chmod(server.server_address, 0o660)
+            os.replace(server.server_address, socketPath)
+        finally:
+            if os.path.exists(os.path.join(bindDirectory, "socket")):
+                os.unlink(os.path.join(bindDirectory, "socket"))
+            os.rmdir(bindDirectory)
+        server.daemon_threads = True
+        try:
+            server.serve_forever()
+        finally:
+            server.server_close()
+            os.unlink(socketPath)
+
+
+def runAgent(args):
+    """
+    Start the agent which runs the checks of the spec file in the background and serves their results
+    """
+    # terminate cleanly, so that the socket is removed
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    agent = CheckAgent(argumentParser(), args.interval, args.maxAge, args.maxChecks, args.idleExpiry)
+    for argv in readCheckSpecs(args.specFile):
+        agent.addSpec(argv, pinned=True)
+    agent.serve(args.socket, args.group)
+
+
+def requestAgentResult(socketPath, argv, timeout):
+    """
+    Args:
+        socketPath    -    Unix socket of the agent
+        argv          -    command line arguments of the check
+        timeout       -    seconds to wait for the answer of the agent
+        
+    Return:
+        CheckResult from the agent with its age in the performance data
+    """
+    try:
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        client.settimeout(float(timeout))
+        with client:
+            client.connect(socketPath)
+            # leave the agent some time to run a check which is requested the first time
+            client.sendall(json.dumps({"argv": argv, "wait": float(timeout) * 0.8}).encode() + b"\n")
+            with client.makefile("rb") as response:
+                result = json.loads(response.readline().decode())
+    except (OSError, ValueError) as error:
+        return CheckResult(STATE_UNKNOWN, "UNKNOWN - Agent on " + socketPath + " is not available: " + str(error))
+    
+    checkResult = CheckResult(result["returnCode"], result["returnMessage"], result["performanceData"], result["longOutput"])
+    checkResult.addPerformanceData("resultAge=" + str(round(result["age"], 1)) + "s")
+    return checkResult
+
+
+def getAgentRequest(argv):
+    """
+    Find the agent of a check command line without the argument parser, so a client of the agent only connects to it
+    
+    Args:
+        argv    -    command line arguments
+        
+    Return:
+        Tuple of the socket and the timeout of the agent if argv requests a check result from it, None otherwise
+    """
+    socketPath = None
+    timeout = AGENT_TIMEOUT
+    position = 0
+    while position < len(argv) and argv[position].startswith("-"):
+        option, separator, value = argv[position].partition("=")
+        if option in ("-h", "--help", "-v", "--version"):
+            return None
+        if option in GLOBAL_VALUE_OPTIONS and not separator:
+            position += 1
+            value = argv[position] if position < len(argv) else None
+        if option == "--agent-socket":
+            socketPath = value
+        elif option == "--agent-timeout":
+            try:
+                timeout = float(value)
+            except (TypeError, ValueError):
+                return None
+        position += 1
+    # the agent itself and invalid command lines take the path of the argument parser
+    if not socketPath or position >= len(argv) or argv[position] == "agent":
+        return None
+    return socketPath, timeout
 
 
 def argumentParser():
@@ -622,6 +5082,22 @@ def argumentParser():
     parser = argparse.ArgumentParser(description='Check status of the gpfs cluster system')
     group = parser.add_argument_group();
     group.add_argument('-v', '--version', action='version', version='%(prog)s 1.0.0')
+    group.add_argument('--mmfs-bin', dest='mmfsBin', action='store', help='Directory of the IBM Spectrum Scale commands (default=' + DEFAULT_MMFS_BIN_DIRECTORY + ')', default=DEFAULT_MMFS_BIN_DIRECTORY)
+    group.add_argument('--no-sudo', dest='noSudo', action='store_true', help='Execute the mm* commands without sudo', default=False)
+    group.add_argument('--cache-dir', dest='cacheDirectory', action='store', help='Directory for the shared cache of the mm* command output (default=' + DEFAULT_CACHE_DIRECTORY + ')', default=DEFAULT_CACHE_DIRECTORY)
+    group.add_argument('--no-cache', dest='noCache', action='store_true', help='Always execute the mm* commands and bypass the cache', default=False)
+    group.add_argument('--state-dir', dest='stateDirectory', action='store', help='Directory for the persistent state of the checks (default=' + DEFAULT_STATE_DIRECTORY + ')', default=DEFAULT_STATE_DIRECTORY)
+    group.add_argument('--max-concurrent', dest='maxConcurrent', action='store', type=int, help='Host-wide maximum of concurrently running mm* commands, 0 for no limit (default=' + str(MAX_CONCURRENT_COMMANDS) + ')', default=MAX_CONCURRENT_COMMANDS)
+    group.add_argument('--max-wait', dest='maxWait', action='store', type=float, help='Maximum seconds to wait for a free mm* command slot (default=' + str(MAX_COMMAND_WAIT) + ')', default=MAX_COMMAND_WAIT)
+    group.add_argument('--agent-socket', dest='agentSocket', action='store', help='Request the check result from the agent listening on this Unix socket')
+    group.add_argument('--agent-timeout', dest='agentTimeout', action='store', type=float, help='Seconds to wait for the answer of the agent (default=' + str(AGENT_TIMEOUT) + ')', default=AGENT_TIMEOUT)
+    group.add_argument('--backend', dest='backend', choices=['subprocess', 'helper', 'record', 'replay'], help='Execution of the mm* commands: a new process (with sudo) per command, one long-lived helper session started once with sudo, recording the output to --record-dir or replaying it from there (default=subprocess)', default='subprocess')
+    group.add_argument('--record-dir', dest='recordDirectory', action='store', help='Directory of the recorded command output for the record and replay backends')
+    group.add_argument('--device-workers', dest='deviceWorkers', action='store', type=int, help='Number of devices which are checked concurrently by a check of several devices (default=' + str(DEVICE_WORKERS) + ')', default=DEVICE_WORKERS)
+    group.add_argument('--rules', dest='rulesFile', action='store', help='Rules file with thresholds and exclusions per node, fileset, pool, user, group and fileset quota (see README)')
+    group.add_argument('--timings', dest='timings', action='store_true', help='Add the time of each check phase (t_queue, t_exec, t_parse, t_eval, t_output), the parsed rows and the peak memory to the performance data', default=False)
+    group.add_argument('--profile', dest='profile', action='store', help='Write the cProfile statistics of the check to this file')
+    group.add_argument('--trace-memory', dest='traceMemory', action='store', help='Write the peak memory and the largest allocation sites left at the end of the check (tracemalloc) to this file')
   
     subParser = parser.add_subparsers()
     
@@ -630,48 +5106,178 @@ def argumentParser():
     statusParser.add_argument('-w', '--warning', dest='warning', action='store', help='Warning if online nodes below this value (default=5)', default=5)
     statusParser.add_argument('-c', '--critical', dest='critical', action='store', help='Critical if online nodes below this value (default=3)', default=3)
     statusParser.add_argument('-L', '--Long', dest='longOutput', action='store_true', help='Displaies additional informations in the long output', default=False)
+    statusParser.add_argument('--cache-ttl', dest='cacheTtl', action='store', type=float, help='Seconds the mmgetstate output is served from the cache (default=' + str(CACHE_TTL['mmgetstate']) + ')', default=CACHE_TTL['mmgetstate'])
+    statusParser.add_argument('-T', '--timeout', dest='timeout', action='store', type=float, help='Seconds after mmgetstate is killed and UNKNOWN is returned (default=' + str(COMMAND_TIMEOUT['mmgetstate']) + ')', default=COMMAND_TIMEOUT['mmgetstate'])
+    statusParser.add_argument('-E', '--events', dest='events', action='store_true', help='Answer from the node state file of the mmaddcallback events (see callback) instead of mmgetstate', default=False)
+    statusParser.add_argument('--reconcile', dest='reconcile', action='store', type=float, help='Seconds after the node state file of -E is reconciled with mmgetstate (default=' + str(NODE_STATE_RECONCILE) + ')', default=NODE_STATE_RECONCILE)
     statusGroup = statusParser.add_mutually_exclusive_group(required=True)
     statusGroup.add_argument('-q', '--quorum', dest='quorum', action='store_true', help='Check the quorum status, will critical if it is less than totalNodes/2+1')
     statusGroup.add_argument('-n', '--nodes', dest='nodes', action='store_true', help='Check state of the nodes')
     statusGroup.add_argument('-s', '--status', dest='status', action='store_true', help='Check state of this node')
-    # Maybe some paramter check of the filesystem in the future
-    #  fileSystemParser = subParser.add_parser('filesystems', help='Check filesystems')
-    # fileSystemParser.set_defaults(func=checkFileSystems) 
+    statusGroup.add_argument('-a', '--all-nodes', dest='allNodes', action='store_true', help='Check state of all nodes in the cluster and the quorum with one mmgetstate -a (run it on a manager node)')
+    
+    fileSystemParser = subParser.add_parser('filesystems', help='Check the mount state, capacity and inodes of the filesystems')
+    fileSystemParser.set_defaults(func=checkFileSystems, requiredCommands=['mmlsmount', 'mmdf', 'mmlsfs'])
+    fileSystemParser.add_argument('-w', '--warning', dest='warning', action='store', help='Warning if capacity or inode utilization is over this value (default=90 percent)', default=90)
+    fileSystemParser.add_argument('-c', '--critical', dest='critical', action='store', help='Critical if capacity or inode utilization is over this value (default=95 percent)', default=96)
+    fileSystemParser.add_argument('-d', '--device', dest='device', action='store', help='Devices to check (delimiter is ,) or all (default=all)', default='all')
+    fileSystemParser.add_argument('-m', '--min-nodes', dest='minNodes', action='store', help='Critical if a filesystem is mounted on less nodes than this (default=1)', default=1)
+    fileSystemParser.add_argument('-L', '--Long', dest='longOutput', action='store_true', help='Display additional informations in the long output', default=False)
+    fileSystemParser.add_argument('--cache-ttl', dest='cacheTtl', action='store', type=float, help='Seconds the mmlsmount/mmdf output is served from the cache (default=' + str(CACHE_TTL['mmlsmount']) + '/' + str(CACHE_TTL['mmdf']) + ')')
+    fileSystemParser.add_argument('-T', '--timeout', dest='timeout', action='store', type=float, help='Seconds after mmlsmount/mmdf is killed and UNKNOWN is returned (default=' + str(COMMAND_TIMEOUT['mmlsmount']) + '/' + str(COMMAND_TIMEOUT['mmdf']) + ')')
      
+    ioParser = subParser.add_parser('io', help='Check the I/O throughput and operation rates of the filesystems on this node (mmpmon)')
+    ioParser.set_defaults(func=checkIo, requiredCommands=['mmpmon'])
+    ioParser.add_argument('-w', '--warning', dest='warning', action='store', type=float, help='Warning if the read and write throughput of a filesystem is over this value in MB/s')
+    ioParser.add_argument('-c', '--critical', dest='critical', action='store', type=float, help='Critical if the read and write throughput of a filesystem is over this value in MB/s')
+    ioParser.add_argument('--ops-warning', dest='opsWarning', action='store', type=float, help='Warning if the opens, closes, reads, writes and readdir per second of a filesystem are over this value')
+    ioParser.add_argument('--ops-critical', dest='opsCritical', action='store', type=float, help='Critical if the opens, closes, reads, writes and readdir per second of a filesystem are over this value')
+    ioParser.add_argument('-d', '--device', dest='device', action='store', help='Devices to check (delimiter is ,) or all (default=all)', default='all')
+    ioParser.add_argument('-L', '--Long', dest='longOutput', action='store_true', help='Display the rates of each filesystem in the long output', default=False)
+    ioParser.add_argument('-T', '--timeout', dest='timeout', action='store', type=float, help='Seconds after mmpmon is killed and UNKNOWN is returned (default=' + str(COMMAND_TIMEOUT['mmpmon']) + ')', default=COMMAND_TIMEOUT['mmpmon'])
+    
+    waitersParser = subParser.add_parser('waiters', help='Check the long waiters on this node (mmdiag --waiters)')
+    waitersParser.set_defaults(func=checkWaiters, requiredCommands=['mmdiag'])
+    waitersParser.add_argument('-w', '--warning', dest='warning', action='store', type=float, help='Warning if a waiter waits longer than this value (default=60 seconds)', default=60)
+    waitersParser.add_argument('-c', '--critical', dest='critical', action='store', type=float, help='Critical if a waiter waits longer than this value (default=300 seconds)', default=300)
+    waitersParser.add_argument('--count-warning', dest='countWarning', action='store', type=int, help='Warning if more waiters than this wait longer than the minimum age')
+    waitersParser.add_argument('--count-critical', dest='countCritical', action='store', type=int, help='Critical if more waiters than this wait longer than the minimum age')
+    waitersParser.add_argument('-m', '--min-age', dest='minAge', action='store', type=float, help='Ignore the waiters which wait shorter than this value (default=1 second)', default=1)
+    waitersParser.add_argument('-a', '--all', dest='allWaiters', action='store_true', help='Include the waiters which GPFS ignores for the long waiter detection', default=False)
+    waitersParser.add_argument('-Y', '--machine-readable', dest='machineReadable', action='store_true', help='Read mmdiag --waiters -Y (IBM Spectrum Scale 5 and later)', default=False)
+    waitersParser.add_argument('-L', '--Long', dest='longOutput', action='store_true', help='Display the waiters per reason in the long output', default=False)
+    waitersParser.add_argument('--cache-ttl', dest='cacheTtl', action='store', type=float, help='Seconds the mmdiag output is served from the cache (default=' + str(CACHE_TTL['mmdiag']) + ')', default=CACHE_TTL['mmdiag'])
+    waitersParser.add_argument('-T', '--timeout', dest='timeout', action='store', type=float, help='Seconds after mmdiag is killed and UNKNOWN is returned (default=' + str(COMMAND_TIMEOUT['mmdiag']) + ')', default=COMMAND_TIMEOUT['mmdiag'])
+    
+    ioLatencyParser = subParser.add_parser('iolatency', help='Check the service time of the disk I/Os on this node (mmdiag --iohist)')
+    ioLatencyParser.set_defaults(func=checkIoLatency, requiredCommands=['mmdiag'])
+    ioLatencyParser.add_argument('-w', '--warning', dest='warning', action='store', type=float, help='Warning if the percentile of a disk or an I/O type is over this value (default=50 ms)', default=50)
+    ioLatencyParser.add_argument('-c', '--critical', dest='critical', action='store', type=float, help='Critical if the percentile of a disk or an I/O type is over this value (default=200 ms)', default=200)
+    ioLatencyParser.add_argument('-p', '--percentile', dest='percentile', type=int, choices=LATENCY_PERCENTILES, help='Percentile which is compared to the thresholds (default=95)', default=95)
+    ioLatencyParser.add_argument('-m', '--min-ios', dest='minIos', action='store', type=int, help='Compare only the disks and I/O types with at least this number of I/Os in the history (default=10)', default=10)
+    ioLatencyParser.add_argument('-L', '--Long', dest='longOutput', action='store_true', help='Display the percentiles of each disk and I/O type in the long output', default=False)
+    ioLatencyParser.add_argument('--cache-ttl', dest='cacheTtl', action='store', type=float, help='Seconds the mmdiag output is served from the cache (default=' + str(CACHE_TTL['mmdiag']) + ')', default=CACHE_TTL['mmdiag'])
+    ioLatencyParser.add_argument('-T', '--timeout', dest='timeout', action='store', type=float, help='Seconds after mmdiag is killed and UNKNOWN is returned (default=' + str(COMMAND_TIMEOUT['mmdiag']) + ')', default=COMMAND_TIMEOUT['mmdiag'])
+    
     filesetParser = subParser.add_parser('filesets', help='Check the filesets')
     filesetParser.set_defaults(func=checkFileSets) 
     filesetParser.add_argument('-w', '--warning', dest='warning', action='store', help='Warning if inode utilization is over this value (default=90 percent)', default=90)
     filesetParser.add_argument('-c', '--critical', dest='critical', action='store', help='Critical if inode utilization is over this value (default=95 percent)', default=96)
-    filesetParser.add_argument('-d', '--device', dest='device', action='store', help='Device to check the inode utilization', required=True) 
+    filesetParser.add_argument('-d', '--device', dest='device', action='store', help='Device to check the inode utilization, several devices (delimiter is ,) or all', required=True) 
     filesetParser.add_argument('-f', '--filesets', dest='filesets', action='store', help='Name of the filesets to check (delimiter is ,)')
     filesetParser.add_argument('-x', '--exclude-filesets', dest='exclude_filesets', action='store', help='Name of the filesets to exclude (delimiter is ,)')
     filesetParser.add_argument('-s', '--size', dest='size', action='store_true', help='Additional outputs the blocksize. Needs more than 5 minutes to respond!')
+    filesetParser.add_argument('-S', '--size-background', dest='sizeBackground', action='store_true', help='Additional outputs the last known blocksize, which is collected in a background job')
+    filesetParser.add_argument('--size-max-age', dest='sizeMaxAge', action='store', type=float, help='Start a new background collection of the blocksize if it is older than this (default=3600 seconds)', default=3600)
+    filesetParser.add_argument('--forecast-warning', dest='forecastWarning', action='store', type=float, help='Warning if the free inodes of a fileset is projected to run out within this many hours (linear regression over the history in the state directory)')
+    filesetParser.add_argument('--forecast-critical', dest='forecastCritical', action='store', type=float, help='Critical if the free inodes of a fileset is projected to run out within this many hours')
+    filesetParser.add_argument('--history-window', dest='historyWindow', action='store', type=int, help='Number of runs in the history of the forecast (default=' + str(HISTORY_WINDOW) + ')', default=HISTORY_WINDOW)
     filesetGroup = filesetParser.add_mutually_exclusive_group(required=True)
     filesetGroup.add_argument('-l', '--link', dest='link', action='store_true', help='Check the link status of given filesets')
     filesetGroup.add_argument('-i', '--inodes', dest='inodes', action='store_true', help='Check thei node utilization')
     
     filesetParser.add_argument('-L', '--Long', dest='longOutput', action='store_true', help='Display additional informations in the long output', default=False)
+    filesetParser.add_argument('--cache-ttl', dest='cacheTtl', action='store', type=float, help='Seconds the mmlsfileset output is served from the cache (default=' + str(CACHE_TTL['mmlsfileset']) + ')', default=CACHE_TTL['mmlsfileset'])
+    filesetParser.add_argument('-T', '--timeout', dest='timeout', action='store', type=float, help='Seconds after mmlsfileset is killed and UNKNOWN is returned (default=' + str(COMMAND_TIMEOUT['mmlsfileset']) + ')', default=COMMAND_TIMEOUT['mmlsfileset'])
      
     poolsParser = subParser.add_parser('pools', help='Check the pools');
     poolsParser.set_defaults(func=checkPools) 
     poolsParser.add_argument('-w', '--warning', dest='warning', action='store', help='Warning if pool usage is over this value (default=90 percent)', default=90)
     poolsParser.add_argument('-c', '--critical', dest='critical', action='store', help='Critical if pool usage is over this value (default=95 percent)', default=96)
     poolsParser.add_argument('-t', '--type', dest='type', choices=['m', 'd'], help='Check only meta-pool (m),data-pool (d)')
-    poolsParser.add_argument('-d', '--device', dest='device', action='store', help='Device to check the pool usage', required=True) 
+    poolsParser.add_argument('-d', '--device', dest='device', action='store', help='Device to check the pool usage, several devices (delimiter is ,) or all', required=True) 
     poolsParser.add_argument('-p', '--pools', dest='pools', action='store', help='Name of the pool to check (delimiter is ,)')
+    poolsParser.add_argument('--forecast-warning', dest='forecastWarning', action='store', type=float, help='Warning if the free space of a pool is projected to run out within this many hours (linear regression over the history in the state directory)')
+    poolsParser.add_argument('--forecast-critical', dest='forecastCritical', action='store', type=float, help='Critical if the free space of a pool is projected to run out within this many hours')
+    poolsParser.add_argument('--history-window', dest='historyWindow', action='store', type=int, help='Number of runs in the history of the forecast (default=' + str(HISTORY_WINDOW) + ')', default=HISTORY_WINDOW)
     poolsParser.add_argument('-L', '--Long', dest='longOutput', action='store_true', help='Display additional informations in the long output', default=False)
+    poolsParser.add_argument('--cache-ttl', dest='cacheTtl', action='store', type=float, help='Seconds the mmlspool output is served from the cache (default=' + str(CACHE_TTL['mmlspool']) + ')', default=CACHE_TTL['mmlspool'])
+    poolsParser.add_argument('-T', '--timeout', dest='timeout', action='store', type=float, help='Seconds after mmlspool is killed and UNKNOWN is returned (default=' + str(COMMAND_TIMEOUT['mmlspool']) + ')', default=COMMAND_TIMEOUT['mmlspool'])
       
     quotaParser = subParser.add_parser('quota', help='Check the quota on a filesystem');
     quotaParser.set_defaults(func=checkQuota)
     quotaParser.add_argument('-w', '--warning', dest='warning', action='store', help='Warning if quota is over this value (default=90 percent)', default=90)
     quotaParser.add_argument('-c', '--critical', dest='critical', action='store', help='Critical if quota is over this value (default=95 percent)', default=96)
-    quotaParser.add_argument('-d', '--device', dest='device', action='store', help='Device to Check to quota per fileset', required=True) 
+    quotaParser.add_argument('-d', '--device', dest='device', action='store', help='Device to Check to quota per fileset, several devices (delimiter is ,) or all', required=True) 
     quotaParser.add_argument('-fs', '--fileset', dest='fileset', action='store', help='Check quota  for a fileset')
-    quotaParser.add_argument('-n', '--name', dest='name', action='store', help='Check quota for an user/group')
+    quotaParser.add_argument('-n', '--name', dest='name', action='store', help='Check quota only for these users/groups (delimiter is ,), which are queried with mmlsquota')
+    quotaParser.add_argument('-I', '--incremental', dest='incremental', action='store_true', help='Evaluate only the entries which changed since the last run (index in the state directory) and report the new and cleared violations', default=False)
+    quotaParser.add_argument('--full-scan', dest='fullScan', action='store_true', help='Filter the names from the mmrepquota report of all users/groups instead of querying them with mmlsquota', default=False)
+    quotaParser.add_argument('--forecast-warning', dest='forecastWarning', action='store', type=float, help='Warning if the block or file quota of an user/group is projected to run out within this many hours (linear regression over the history in the state directory)')
+    quotaParser.add_argument('--forecast-critical', dest='forecastCritical', action='store', type=float, help='Critical if the block or file quota of an user/group is projected to run out within this many hours')
+    quotaParser.add_argument('--history-window', dest='historyWindow', action='store', type=int, help='Number of runs in the history of the forecast (default=' + str(HISTORY_WINDOW) + ')', default=HISTORY_WINDOW)
+    quotaParser.add_argument('--history-min-usage', dest='historyMinUsage', action='store', type=float, help='Keep the history of the quota entries which use at least this percent of their quota (default=' + str(HISTORY_QUOTA_MIN_USAGE) + ')', default=HISTORY_QUOTA_MIN_USAGE)
+    quotaParser.add_argument('--top', dest='top', action='store', type=int, help='Show the N users/groups with the highest block and file utilization and usage and the N filesets with the highest usage of their users in the long output')
     quotaParser.add_argument('-t', '--type', dest='type', choices=['u', 'g'], help='Check only user other group quota')
     quotaParser.add_argument('-L', '--Long', dest='longOutput', action='store_true', help='Shows additional informations in a long output', default=False)
+    quotaParser.add_argument('--cache-ttl', dest='cacheTtl', action='store', type=float, help='Seconds the mmrepquota/mmlsquota output is served from the cache (default=' + str(CACHE_TTL['mmrepquota']) + '/' + str(CACHE_TTL['mmlsquota']) + ')')
+    quotaParser.add_argument('-T', '--timeout', dest='timeout', action='store', type=float, help='Seconds after mmrepquota/mmlsquota is killed and UNKNOWN is returned (default=' + str(COMMAND_TIMEOUT['mmrepquota']) + '/' + str(COMMAND_TIMEOUT['mmlsquota']) + ')')
    # quotaParser.add_argument('-b', '--blockunit', dest='unit', choices=['MB', 'GB', 'TB', 'PB', 'EB', 'ZB'], default='TB', help='display unit [default=TB]')
     
+    collectSizesParser = subParser.add_parser('collect-sizes', help='Collect the blocksize of the filesets for filesets -S (started in the background)')
+    collectSizesParser.set_defaults(func=collectFileSetSizes)
+    collectSizesParser.add_argument('-d', '--device', dest='device', action='store', help='Device of the filesets', required=True)
+    collectSizesParser.add_argument('-T', '--timeout', dest='timeout', action='store', type=float, help='Seconds after mmlsfileset is killed (default=7200)', default=7200)
+    
+    allParser = subParser.add_parser('all', help='Run several checks concurrently in one process and merge their results')
+    allParser.set_defaults(func=checkAll)
+    allParser.add_argument('-f', '--spec-file', dest='specFile', action='store', help='File with one check command line per line')
+    allParser.add_argument('-e', '--check', dest='checks', action='append', help='Check command line, e.g. "filesets -d fs1 -i" (repeatable)')
+    allParser.add_argument('-j', '--workers', dest='workers', action='store', type=int, help='Number of checks which run concurrently (default=' + str(BATCH_WORKERS) + ')', default=BATCH_WORKERS)
+    allParser.add_argument('-L', '--Long', dest='longOutput', action='store_true', help='Display the long output of each check', default=False)
+    
+    passiveParser = subParser.add_parser('passive', help='Submit the status, quota, fileset and pool results of a device as passive results')
+    passiveParser.set_defaults(func=submitPassiveResults, filesets=None, size=False, cacheTtl=None, timeout=None)
+    passiveParser.add_argument('-d', '--device', dest='device', action='store', help='Device of the filesets, pools and quota', required=True)
+    passiveParser.add_argument('-w', '--warning', dest='warning', action='store', help='Warning if inode, pool or quota utilization is over this value (default=90 percent)', default=90)
+    passiveParser.add_argument('-c', '--critical', dest='critical', action='store', help='Critical if inode, pool or quota utilization is over this value (default=95 percent)', default=96)
+    passiveParser.add_argument('-x', '--exclude-filesets', dest='exclude_filesets', action='store', help='Name of the filesets to exclude (delimiter is ,)')
+    passiveParser.add_argument('--forecast-warning', dest='forecastWarning', action='store', type=float, help='Warning if the free inodes of a fileset or the free space of a pool is projected to run out within this many hours (linear regression over the history in the state directory)')
+    passiveParser.add_argument('--forecast-critical', dest='forecastCritical', action='store', type=float, help='Critical if the free inodes of a fileset or the free space of a pool is projected to run out within this many hours')
+    passiveParser.add_argument('--history-window', dest='historyWindow', action='store', type=int, help='Number of runs in the history of the forecast (default=' + str(HISTORY_WINDOW) + ')', default=HISTORY_WINDOW)
+    passiveParser.add_argument('--history-min-usage', dest='historyMinUsage', action='store', type=float, help='Keep the history of the quota entries which use at least this percent of their quota (default=' + str(HISTORY_QUOTA_MIN_USAGE) + ')', default=HISTORY_QUOTA_MIN_USAGE)
+    passiveParser.add_argument('-H', '--host', dest='host', action='store', help='Host of the passive services (default=' + socket.gethostname() + ')', default=socket.gethostname())
+    passiveParser.add_argument('-p', '--service-prefix', dest='servicePrefix', action='store', help='Prefix of the service names (default=' + PASSIVE_SERVICE_PREFIX + ')', default=PASSIVE_SERVICE_PREFIX)
+    passiveTarget = passiveParser.add_mutually_exclusive_group()
+    passiveTarget.add_argument('--command-file', dest='commandFile', action='store', help='Command file or FIFO of Icinga/Nagios (default=' + PASSIVE_COMMAND_FILE + ')', default=PASSIVE_COMMAND_FILE)
+    passiveTarget.add_argument('--spool-dir', dest='spoolDirectory', action='store', help='Write the results to this check result spool directory (check_result_path) instead')
+    
+    metricsParser = subParser.add_parser('metrics', help='Write the node states, pools, filesets and quota of devices as metrics for the node_exporter textfile collector')
+    metricsParser.set_defaults(func=writeMetricsFile, filesets=None, size=False, forecastWarning=None, forecastCritical=None, warning=90, critical=96)
+    metricsParser.add_argument('-d', '--device', dest='device', action='store', help='Device of the pools, filesets and quota, several devices (delimiter is ,) or all', required=True)
+    metricsParser.add_argument('-o', '--output', dest='output', action='store', help='Metrics file, e.g. /var/lib/node_exporter/textfile_collector/gpfs.prom (replaced atomically)', required=True)
+    metricsParser.add_argument('-x', '--exclude-filesets', dest='exclude_filesets', action='store', help='Name of the filesets to exclude (delimiter is ,)')
+    metricsParser.add_argument('--no-nodes', dest='noNodes', action='store_true', help='Do not collect the state of the nodes (mmgetstate -a)', default=False)
+    metricsParser.add_argument('--no-quota', dest='noQuota', action='store_true', help='Do not collect the quota (mmrepquota)', default=False)
+    metricsParser.add_argument('--cache-ttl', dest='cacheTtl', action='store', type=float, help='Seconds the output of the commands is served from the cache (default of each command)')
+    metricsParser.add_argument('-T', '--timeout', dest='timeout', action='store', type=float, help='Seconds after a command is killed and the metrics file is not written (default of each command)')
+    
+    callbackParser = subParser.add_parser('callback', help='Register the event handler of status -E for ' + ', '.join(NODE_STATE_EVENTS) + ' with mmaddcallback')
+    callbackParser.set_defaults(func=registerNodeStateCallback, requiredCommands=['mmaddcallback', 'mmdelcallback'])
+    callbackParser.add_argument('-r', '--remove', dest='remove', action='store_true', help='Remove the callback with mmdelcallback', default=False)
+    callbackParser.add_argument('-T', '--timeout', dest='timeout', action='store', type=float, help='Seconds after mmaddcallback/mmdelcallback is killed (default=' + str(COMMAND_TIMEOUT['mmaddcallback']) + ')')
+    
+    eventParser = subParser.add_parser('event', help='Event handler invoked by the callback, updates the node state file of status -E')
+    eventParser.set_defaults(func=handleNodeEvent)
+    eventParser.add_argument('-e', '--event', dest='event', action='store', choices=NODE_STATE_EVENTS, help='Name of the event (%%eventName)', required=True)
+    eventParser.add_argument('-N', '--event-node', dest='eventNode', action='store', help='Nodes of the event (%%eventNode, delimiter is ,)', default='')
+    eventParser.add_argument('-m', '--my-node', dest='myNode', action='store', help='Name of this node (%%myNode)')
+    eventParser.add_argument('-u', '--up-nodes', dest='upNodes', action='store', help='Nodes which are up (%%upNodes, delimiter is ,)')
+    eventParser.add_argument('-D', '--down-nodes', dest='downNodes', action='store', help='Nodes which are down (%%downNodes, delimiter is ,)')
+    
+    helperParser = subParser.add_parser('helper', help='Helper session of the helper backend (started internally with sudo)')
+    helperParser.set_defaults(func=runHelper)
+    
+    agentParser = subParser.add_parser('agent', help='Run the checks in the background and serve their results on a Unix socket')
+    agentParser.set_defaults(func=runAgent)
+    agentParser.add_argument('-s', '--socket', dest='socket', action='store', help='Unix socket to listen on (default=' + AGENT_SOCKET + ')', default=AGENT_SOCKET)
+    agentParser.add_argument('-f', '--spec-file', dest='specFile', action='store', help='File with one check command line per line, which are scheduled at startup')
+    agentParser.add_argument('-i', '--interval', dest='interval', action='store', type=float, help='Seconds between two runs of a check (default=60)', default=60)
+    agentParser.add_argument('-m', '--max-age', dest='maxAge', action='store', type=float, help='Results older than this are returned as UNKNOWN (default=300)', default=300)
+    agentParser.add_argument('--max-checks', dest='maxChecks', action='store', type=int, help='Maximum number of checks the clients may add besides the spec file (default=' + str(AGENT_MAX_CHECKS) + ')', default=AGENT_MAX_CHECKS)
+    agentParser.add_argument('--idle-expiry', dest='idleExpiry', action='store', type=float, help='Seconds after a check added by a client is stopped if it is not requested (default=' + str(AGENT_IDLE_EXPIRY) + ')', default=AGENT_IDLE_EXPIRY)
+    agentParser.add_argument('--agent-group', dest='group', action='store', help='Group of the clients (e.g. the monitoring user), which may connect to the socket (default=the group of the agent)')
+    
     return parser
 
         
@@ -679,9 +5285,33 @@ def argumentParser():
 # # Main 
 ################################################################################
 if __name__ == '__main__':
+    agentRequest = getAgentRequest(sys.argv[1:])
+    if agentRequest is not None:
+        requestAgentResult(agentRequest[0], sys.argv[1:], agentRequest[1]).printMonitoringOutput()
     parser = argumentParser()
     args = parser.parse_args()
     # print parser.parse_args()
-    checkRequirements()
-    args.func(args)
+    MMFS_BIN_DIRECTORY = args.mmfsBin
+    USE_SUDO = not args.noSudo
+    CACHE_DIRECTORY = None if args.noCache else args.cacheDirectory
+    STATE_DIRECTORY = args.stateDirectory
+    MAX_CONCURRENT_COMMANDS = args.maxConcurrent
+    MAX_COMMAND_WAIT = args.maxWait
+    RULES_FILE = args.rulesFile
+    DEVICE_WORKERS = args.deviceWorkers
+    try:
+        COMMAND_BACKEND = createCommandBackend(args.backend, args.recordDirectory)
+    except (ValueError, OSError) as error:
+        CheckResult(STATE_UNKNOWN, "UNKNOWN - " + str(error)).printMonitoringOutput()
+    if args.agentSocket and args.func is not runAgent:
+        requestAgentResult(args.agentSocket, sys.argv[1:], args.agentTimeout).printMonitoringOutput()
+    requirementsResult = checkRequirements(args)
+    if requirementsResult is not None and args.backend != "replay":
+        requirementsResult.printMonitoringOutput()
+    if args.profile or args.traceMemory:
+        checkResult = profileCheck(args)
+    else:
+        checkResult = runCheck(args)
+    COMMAND_BACKEND.close()
+    checkResult.printMonitoringOutput()
 
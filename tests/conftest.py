@@ -0,0 +1,50 @@
+################################################################################
+# Fixtures of the tests, which run the checks against the stand-ins in
+# benchmark/bin (see benchmark/mmfake.py) with the state and the cache in a
+# temporary directory
+################################################################################
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PLUGIN = os.path.join(ROOT_DIRECTORY, "check_spectrum_scale.py")
+STAND_IN_DIRECTORY = os.path.join(ROOT_DIRECTORY, "benchmark", "bin")
+sys.path.insert(0, ROOT_DIRECTORY)
+sys.path.insert(0, os.path.join(ROOT_DIRECTORY, "benchmark"))
+
+import check_spectrum_scale
+import mmfake
+
+
+@pytest.fixture
+def plugin(tmp_path, monkeypatch):
+    """
+    Returns: the plugin module with the settings of the arguments pointed at the stand-ins and tmp_path
+    """
+    monkeypatch.setattr(check_spectrum_scale, "MMFS_BIN_DIRECTORY", STAND_IN_DIRECTORY)
+    monkeypatch.setattr(check_spectrum_scale, "USE_SUDO", False)
+    monkeypatch.setattr(check_spectrum_scale, "CACHE_DIRECTORY", str(tmp_path / "cache"))
+    monkeypatch.setattr(check_spectrum_scale, "STATE_DIRECTORY", str(tmp_path / "state"))
+    monkeypatch.setattr(check_spectrum_scale, "COMMAND_BACKEND", None)
+    monkeypatch.setattr(check_spectrum_scale, "RULES_FILE", None)
+    for name in mmfake.SCALE_ENVIRONMENT.values():
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.delenv("MMFAKE_DATA", raising=False)
+    return check_spectrum_scale
+
+
+@pytest.fixture
+def runPlugin(monkeypatch):
+    """
+    Returns: function which runs the plugin script with an argument list and returns the completed process
+    """
+    for name in list(mmfake.SCALE_ENVIRONMENT.values()) + ["MMFAKE_DATA"]:
+        monkeypatch.delenv(name, raising=False)
+
+    def run(arguments, environment=None):
+        return subprocess.run([sys.executable, PLUGIN] + list(arguments), stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                              universal_newlines=True, env=dict(os.environ, **(environment or {})))
+    return run
@@ -0,0 +1,102 @@
+################################################################################
+# Tests of the agent which serves the results of the checks on a Unix socket
+################################################################################
+import os
+import stat
+import threading
+import time
+
+import pytest
+
+
+@pytest.fixture
+def agent(plugin, tmp_path):
+    """
+    Returns: tuple of the CheckAgent and the path of its socket, which is served in a background thread
+    """
+    agent = plugin.CheckAgent(plugin.argumentParser(), 60, 300)
+    socketPath = str(tmp_path / "agent" / "agent.sock")
+    threading.Thread(target=agent.serve, args=(socketPath,), daemon=True).start()
+    deadline = time.monotonic() + 5
+    while not os.path.exists(socketPath) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return agent, socketPath
+
+
+def test_checks_are_served(plugin, agent):
+    agent, socketPath = agent
+    checkResult = plugin.requestAgentResult(socketPath, ["status", "-a"], 10)
+    assert checkResult.returnMessage == "OK - 16/16 nodes active"
+    assert "resultAge=" in checkResult.performanceData
+    # the second request is answered from the result of the scheduled check
+    checkResult = plugin.requestAgentResult(socketPath, ["--agent-socket", socketPath, "status", "-a"], 10)
+    assert checkResult.returnMessage == "OK - 16/16 nodes active"
+    assert len(agent.specs) == 1
+
+
+@pytest.mark.parametrize("argv", [["metrics", "-d", "fs1", "-o", "{tmp}/metrics.prom"],
+                                  ["event", "-e", "shutdown", "-m", "node1"],
+                                  ["callback", "-r"],
+                                  ["passive", "-d", "fs1", "--command-file", "{tmp}/icinga.cmd"],
+                                  ["collect-sizes", "-d", "fs1"],
+                                  ["all", "-e", "status -a"],
+                                  ["agent", "-s", "{tmp}/other.sock"],
+                                  ["helper"]])
+def test_side_effecting_subcommands_are_refused(plugin, agent, tmp_path, argv):
+    agent, socketPath = agent
+    argv = [x.format(tmp=tmp_path) for x in argv]
+    checkResult = plugin.requestAgentResult(socketPath, argv, 5)
+    assert checkResult.returnCode == plugin.STATE_UNKNOWN
+    assert checkResult.returnMessage.startswith("UNKNOWN - Invalid check arguments: the agent only runs the checks")
+    assert agent.specs == {}
+    assert sorted(os.listdir(str(tmp_path))) == ["agent"]
+    assert not os.path.exists(os.path.join(plugin.STATE_DIRECTORY, "nodestate.json"))
+
+
+def test_agent_settings_and_check_limit(plugin, agent, tmp_path):
+    agent, socketPath = agent
+    agent.maxChecks = 1
+    checkResult = plugin.requestAgentResult(socketPath, ["--state-dir", str(tmp_path / "other"), "status", "-a"], 5)
+    assert checkResult.returnMessage.startswith("UNKNOWN - Invalid check arguments: --state-dir")
+    # the same value as the agent is accepted
+    checkResult = plugin.requestAgentResult(socketPath, ["--state-dir", plugin.STATE_DIRECTORY, "status", "-a"], 10)
+    assert checkResult.returnCode == plugin.STATE_OK
+    checkResult = plugin.requestAgentResult(socketPath, ["status", "-q"], 5)
+    assert "maximum of 1 requested checks" in checkResult.returnMessage
+
+
+def test_socket_is_only_accessible_by_the_user_and_the_group(plugin, agent, tmp_path):
+    agent, socketPath = agent
+    assert stat.S_IMODE(os.stat(os.path.dirname(socketPath)).st_mode) == 0o700
+    assert stat.S_IMODE(os.stat(socketPath).st_mode) == 0o660
+    # the private directory of the bind is removed
+    deadline = time.monotonic() + 5
+    while os.listdir(os.path.dirname(socketPath)) != ["agent.sock"] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert os.listdir(os.path.dirname(socketPath)) == ["agent.sock"]
+    socketPath = str(tmp_path / "group" / "agent.sock")
+    threading.Thread(target=agent.serve, args=(socketPath, str(os.getgid())), daemon=True).start()
+    deadline = time.monotonic() + 5
+    while not os.path.exists(socketPath) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert stat.S_IMODE(os.stat(os.path.dirname(socketPath)).st_mode) == 0o710
+    assert (stat.S_IMODE(os.stat(socketPath).st_mode), os.stat(socketPath).st_gid) == (0o660, os.getgid())
+    assert plugin.requestAgentResult(socketPath, ["status", "-a"], 10).returnMessage == "OK - 16/16 nodes active"
+
+
+def test_client_finds_the_agent_without_the_argument_parser(plugin, agent, runPlugin):
+    agent, socketPath = agent
+    assert plugin.getAgentRequest(["--agent-socket", socketPath, "status", "-a"]) == (socketPath, plugin.AGENT_TIMEOUT)
+    assert plugin.getAgentRequest(["--no-cache", "--state-dir", "/tmp", "--agent-socket=" + socketPath, "--agent-timeout", "3", "quota", "-d", "fs1"]) == (socketPath, 3.0)
+    for argv in (["status", "-a"], ["--agent-socket", socketPath, "agent"], ["--agent-socket", socketPath, "-h"], ["--agent-socket", socketPath],
+                 ["--agent-socket", socketPath, "--agent-timeout", "x", "status"], ["status", "--agent-socket", socketPath]):
+        assert plugin.getAgentRequest(argv) is None
+    # the options before the subcommand which take a value are skipped like the argument parser does
+    options = [x for x in plugin.argumentParser()._actions if x.option_strings and x.nargs is None and not x.const and x.dest != 'help']
+    assert sorted(plugin.GLOBAL_VALUE_OPTIONS) == sorted(x.option_strings[-1] for x in options)
+    process = runPlugin(["--agent-socket", socketPath, "status", "-a"])
+    assert process.stdout.startswith("OK - 16/16 nodes active|")
+    # the arguments are only parsed by the agent, the client does not exit with the usage of the argument parser
+    process = runPlugin(["--agent-socket", socketPath, "status", "--unknown-option"])
+    assert (process.returncode, process.stderr) == (plugin.STATE_UNKNOWN, "")
+    assert process.stdout.startswith("UNKNOWN - Invalid check arguments")
@@ -0,0 +1,56 @@
+################################################################################
+# Tests of the all subcommand, which runs several checks concurrently in one
+# process (runBatch) and merges their results
+################################################################################
+import re
+
+
+def runAll(plugin, *arguments):
+    """
+    Returns: the CheckResult of the all subcommand with the arguments
+    """
+    return plugin.checkAll(plugin.argumentParser().parse_args(["all"] + list(arguments)))
+
+
+def test_results_are_merged(plugin, tmp_path):
+    specPath = tmp_path / "checks.spec"
+    specPath.write_text("# cluster checks\nstatus -a\n\nfilesets -d fs1 -i\n")
+    checkResult = runAll(plugin, "-f", str(specPath), "-e", "pools -d fs1 -w 100 -c 100", "-e", "quota -d fs1 -L", "-L")
+    assert checkResult.returnCode == plugin.STATE_CRITICAL
+    assert checkResult.returnMessage == "CRITICAL - 4 checks: 2 critical, 0 warning, 0 unknown, 2 ok"
+    lines = checkResult.longOutput.splitlines()
+    assert lines[0] == "[OK] status -a: OK - 16/16 nodes active"
+    assert lines[1].startswith("[CRITICAL] filesets -d fs1 -i: Critical  - On ")
+    assert lines[2].startswith("[OK] pools -d fs1 -w 100 -c 100: OK - ")
+    assert lines[-9].startswith("[CRITICAL] quota -d fs1 -L: Critical - Block Critical: ")
+    # the long output of the checks is indented under their message
+    assert lines[-8:] == ["    " + x for x in plugin.checkQuota(plugin.argumentParser().parse_args(["quota", "-d", "fs1", "-L"])).longOutput.splitlines()]
+    labels = set(re.findall(r"(\S+)::", checkResult.performanceData))
+    assert labels == {"status_a", "filesets_d_fs1_i", "pools_d_fs1_w_100_c_100", "quota_d_fs1_L"}
+    assert "quota_d_fs1_L::blockCritical=" in checkResult.performanceData
+    assert re.search(r" checks=4 t_batch=[0-9.]+s$", checkResult.performanceData)
+
+
+def test_identical_commands_are_executed_once(plugin, monkeypatch):
+    executed = []
+    backend = plugin.SubprocessBackend()
+    execute = backend.execute
+    monkeypatch.setattr(backend, "execute", lambda argv: executed.append(argv[1:]) or execute(argv))
+    monkeypatch.setattr(plugin, "COMMAND_BACKEND", backend)
+    monkeypatch.setattr(plugin, "CACHE_DIRECTORY", None)
+    checkResult = runAll(plugin, "-e", "filesets -d fs1 -i", "-e", "filesets -d fs1 -l -w 100 -c 100", "-e", "filesets -d fs2 -l -w 100 -c 100", "-j", "3")
+    assert checkResult.returnMessage == "CRITICAL - 3 checks: 1 critical, 0 warning, 0 unknown, 2 ok"
+    assert sorted(executed) == [["fs1", "-Y"], ["fs2", "-Y"]]
+
+
+def test_invalid_and_side_effecting_checks_are_unknown(plugin, tmp_path):
+    checkResult = runAll(plugin, "-e", "status -a", "-e", "status --unknown", "-e", "metrics -d fs1 -o " + str(tmp_path / "metrics.prom"), "-e", "status -a -w 17 -c 17")
+    # an unknown check does not hide a critical one
+    assert checkResult.returnCode == plugin.STATE_CRITICAL
+    assert checkResult.returnMessage == "CRITICAL - 4 checks: 1 critical, 0 warning, 2 unknown, 1 ok"
+    lines = checkResult.longOutput.splitlines()
+    assert lines[1] == "[UNKNOWN] status --unknown: UNKNOWN - Invalid check arguments: status --unknown"
+    assert lines[2].startswith("[UNKNOWN] metrics -d fs1 -o ")
+    assert "No check given in: metrics" in lines[2]
+    assert not (tmp_path / "metrics.prom").exists()
+    assert runAll(plugin).returnMessage == "UNKNOWN - No checks given, use -f or -e"
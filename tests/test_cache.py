@@ -0,0 +1,105 @@
+################################################################################
+# Tests of the shared result cache of the mm* commands (CommandStream)
+################################################################################
+import os
+import threading
+import time
+
+# Stand-in which counts its executions in the file of the first argument, sleeps and exits with the second one
+COUNTING_STAND_IN = """#!/bin/sh
+echo run >> "$1"
+sleep "$3"
+echo "line 1"
+echo "line 2"
+exit "$2"
+"""
+
+
+def countingCommand(tmp_path, returnCode=0, delay=0):
+    """
+    Returns: tuple of the argument list of the counting stand-in and the path of its count file
+    """
+    standIn = tmp_path / "mmcount"
+    if not standIn.exists():
+        standIn.write_text(COUNTING_STAND_IN)
+        standIn.chmod(0o755)
+    countPath = tmp_path / "count"
+    return [str(standIn), str(countPath), str(returnCode), str(delay)], countPath
+
+
+def readCommand(plugin, command, cacheTtl):
+    """
+    Returns: tuple of the output and the finished CommandStream of the command
+    """
+    with plugin.streamBashCommand(command, cacheTtl) as output:
+        text = "".join(output)
+    return text, output
+
+
+def getExecutions(countPath):
+    """
+    Returns: number of executions of the counting stand-in
+    """
+    return len(countPath.read_text().splitlines()) if countPath.exists() else 0
+
+
+def test_output_is_served_from_the_cache_within_the_ttl(plugin, tmp_path):
+    command, countPath = countingCommand(tmp_path)
+    text, output = readCommand(plugin, command, 60)
+    assert (text, output.cached, output.returnCode) == ("line 1\nline 2\n", False, 0)
+    text, output = readCommand(plugin, command, 60)
+    assert (text, output.cached, output.returnCode) == ("line 1\nline 2\n", True, 0)
+    assert getExecutions(countPath) == 1
+
+
+def test_expired_output_is_executed_again(plugin, tmp_path):
+    command, countPath = countingCommand(tmp_path)
+    readCommand(plugin, command, 60)
+    for name in os.listdir(plugin.CACHE_DIRECTORY):
+        if name.endswith(".out"):
+            expired = time.time() - 61
+            os.utime(os.path.join(plugin.CACHE_DIRECTORY, name), (expired, expired))
+    text, output = readCommand(plugin, command, 60)
+    assert not output.cached
+    assert getExecutions(countPath) == 2
+    # a ttl of 0 bypasses the cache
+    readCommand(plugin, command, 0)
+    assert getExecutions(countPath) == 3
+
+
+def test_failed_output_is_not_cached(plugin, tmp_path):
+    command, countPath = countingCommand(tmp_path, returnCode=1)
+    for executions in (1, 2):
+        text, output = readCommand(plugin, command, 60)
+        assert (output.cached, output.returnCode) == (False, 1)
+        assert getExecutions(countPath) == executions
+    assert not [x for x in os.listdir(plugin.CACHE_DIRECTORY) if x.endswith(".out") or x.startswith(".tmp")]
+
+
+def test_concurrent_reads_execute_the_command_once(plugin, tmp_path):
+    command, countPath = countingCommand(tmp_path, delay=0.5)
+    results = []
+
+    def read():
+        results.append(readCommand(plugin, command, 60))
+    # the lock of the cache entry is taken per open file, so the threads wait for each other like processes
+    threads = [threading.Thread(target=read) for x in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert getExecutions(countPath) == 1
+    assert [x[0] for x in results] == ["line 1\nline 2\n"] * 4
+    assert sorted(x[1].cached for x in results) == [False, True, True, True]
+    assert max(x[1].queueTime for x in results) > 0.3
+
+
+def test_cache_key_separates_the_arguments(plugin, tmp_path):
+    command, countPath = countingCommand(tmp_path)
+    readCommand(plugin, command, 60)
+    # a command line and the equal argument list share the cache entry, other arguments do not
+    text, output = readCommand(plugin, " ".join(command), 60)
+    assert output.cached
+    text, output = readCommand(plugin, command[:3] + ["0.0"], 60)
+    assert not output.cached
+    assert getExecutions(countPath) == 2
@@ -0,0 +1,100 @@
+################################################################################
+# Tests of the mmaddcallback event handler of status -E (callback and event)
+# against the stand-ins in benchmark/bin
+################################################################################
+import json
+import os
+
+from conftest import PLUGIN, STAND_IN_DIRECTORY
+
+
+def substituteVariables(parameters, variables):
+    """
+    Returns: the argument list of the handler like GPFS builds it from --parms, the variables substituted and
+             the result split on white space
+    """
+    for name, value in variables.items():
+        parameters = parameters.replace("%" + name, value)
+    return parameters.split()
+
+
+def registerCallback(tmp_path, runPlugin):
+    """
+    Returns: the arguments the callback subcommand passes to mmaddcallback
+    """
+    callbackPath = tmp_path / "callbacks.json"
+    process = runPlugin(["--mmfs-bin", STAND_IN_DIRECTORY, "--no-sudo", "--no-cache", "--state-dir", str(tmp_path / "state"), "callback"],
+                        {'MMFAKE_CALLBACKS': str(callbackPath)})
+    assert process.returncode == 0, process.stdout + process.stderr
+    calls = [json.loads(x) for x in callbackPath.read_text().splitlines()]
+    assert len(calls) == 1 and calls[0][0] == "mmaddcallback"
+    return calls[0][1:]
+
+
+def test_callback_passes_one_parms_string(tmp_path, runPlugin):
+    argv = registerCallback(tmp_path, runPlugin)
+    assert argv[0] == "check_spectrum_scale_nodestate"
+    assert argv[argv.index("--command") + 1] == PLUGIN
+    assert argv.count("--parms") == 1
+    parameters = argv[argv.index("--parms") + 1]
+    assert parameters.split()[:2] == ["--state-dir=" + str(tmp_path / "state"), "event"]
+
+
+def test_registered_parameters_run_the_event_handler(tmp_path, runPlugin):
+    parameters = registerCallback(tmp_path, runPlugin)
+    parameters = parameters[parameters.index("--parms") + 1]
+    variables = {'eventName': "nodeJoin", 'eventNode': "node1,node2", 'myNode': "node1", 'upNodes': "node1,node2,node3", 'downNodes': "node4"}
+    process = runPlugin(substituteVariables(parameters, variables))
+    assert process.returncode == 0, process.stdout + process.stderr
+    assert process.stdout.startswith("OK - Node state updated by nodeJoin: active, 3 nodes are up")
+    # GPFS substitutes an empty string for the node lists which do not apply to the event
+    variables = {'eventName': "nodeLeave", 'eventNode': "node2", 'myNode': "node1", 'upNodes': "", 'downNodes': ""}
+    process = runPlugin(substituteVariables(parameters, variables))
+    assert process.returncode == 0, process.stdout + process.stderr
+    assert process.stdout.startswith("OK - Node state updated by nodeLeave: active, 2 nodes are up")
+    with open(os.path.join(str(tmp_path / "state"), "nodestate.json")) as stateFile:
+        assert json.load(stateFile)["down"] == ["node2", "node4"]
+
+
+def test_callback_remove(tmp_path, runPlugin):
+    callbackPath = tmp_path / "callbacks.json"
+    process = runPlugin(["--mmfs-bin", STAND_IN_DIRECTORY, "--no-sudo", "--no-cache", "callback", "--remove"], {'MMFAKE_CALLBACKS': str(callbackPath)})
+    assert process.returncode == 0, process.stdout + process.stderr
+    assert json.loads(callbackPath.read_text()) == ["mmdelcallback", "check_spectrum_scale_nodestate"]
+
+
+def handleEvent(plugin, *arguments):
+    """
+    Returns: the CheckResult of the event handler with the arguments
+    """
+    return plugin.handleNodeEvent(plugin.argumentParser().parse_args(["event"] + list(arguments)))
+
+
+def test_status_answers_from_the_events(plugin, monkeypatch):
+    args = plugin.argumentParser().parse_args(["status", "-s", "-E"])
+    checkResult = plugin.checkStatus(args)
+    assert checkResult.returnMessage == "OK - Node node1.example.com is in state:active"
+    # without mm* commands until the reconciliation is due
+    monkeypatch.setattr(plugin, "MMFS_BIN_DIRECTORY", "/nonexistent")
+    handleEvent(plugin, "-e", "nodeLeave", "-N", "node2.example.com,node3.example.com", "-m", "node1.example.com")
+    nodeState = plugin.readNodeState()
+    assert (nodeState["state"], nodeState["nodesUp"], nodeState["down"]) == ("active", 14, ["node2.example.com", "node3.example.com"])
+    handleEvent(plugin, "-e", "quorumLoss", "-m", "node1.example.com")
+    assert plugin.readNodeState()["state"] == "arbitrating"
+    handleEvent(plugin, "-e", "shutdown", "-N", "node1.example.com", "-m", "node1.example.com")
+    checkResult = plugin.checkStatus(args)
+    assert checkResult.returnCode == plugin.STATE_CRITICAL
+    assert "down" in checkResult.returnMessage
+    handleEvent(plugin, "-e", "nodeJoin", "-N", "node2.example.com", "-m", "node1.example.com", "-u", ",".join("node" + str(x) + ".example.com" for x in range(1, 17)), "-D", "")
+    nodeState = plugin.readNodeState()
+    # the empty list of the down nodes does not apply, they are counted from the events
+    assert (nodeState["nodesUp"], nodeState["down"]) == (16, ["node3.example.com"])
+    # an outdated state is reconciled with mmgetstate, unless its output is older than the last event (e.g. from the cache)
+    monkeypatch.setattr(plugin, "MMFS_BIN_DIRECTORY", STAND_IN_DIRECTORY)
+    args.reconcile = 0
+    plugin.checkStatus(args)
+    assert plugin.readNodeState()["event"] == "nodeJoin"
+    monkeypatch.setattr(plugin, "CACHE_DIRECTORY", None)
+    checkResult = plugin.checkStatus(args)
+    assert checkResult.returnMessage == "OK - Node node1.example.com is in state:active"
+    assert plugin.readNodeState()["event"] is None
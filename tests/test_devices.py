@@ -0,0 +1,43 @@
+################################################################################
+# Tests of the checks of several devices (-d fs1,fs2 or -d all) of filesets,
+# pools and quota, which run concurrently and are merged per device
+################################################################################
+import re
+import threading
+
+import pytest
+
+
+@pytest.mark.parametrize("check", [["filesets", "-i"], ["pools"], ["quota"]])
+def test_devices_are_merged(plugin, monkeypatch, check):
+    monkeypatch.setenv("MMFAKE_DEVICES", "3")
+    results = dict((x, plugin.runCheck(plugin.argumentParser().parse_args(check + ["-d", x]))) for x in ("fs1", "fs2", "fs3"))
+    checkResult = plugin.runCheck(plugin.argumentParser().parse_args(check + ["-d", "all", "-L"]))
+    assert checkResult.returnCode == max(x.returnCode for x in results.values())
+    lines = [x for x in checkResult.longOutput.splitlines() if x.startswith("[")]
+    assert [x.split("] ", 1)[1] for x in lines] == [x + ": " + results[x].returnMessage for x in ("fs1", "fs2", "fs3")]
+    # the performance data of each device is qualified with its name
+    for device, result in results.items():
+        assert [device + "::" + x for x in result.performanceData.split() if not x.startswith("cache")] == \
+            [x for x in checkResult.performanceData.split() if x.startswith(device + "::") and not x.startswith(device + "::cache")]
+
+
+def test_devices_are_checked_concurrently(plugin, monkeypatch):
+    monkeypatch.setattr(plugin, "DEVICE_WORKERS", 2)
+    threads = set()
+    checkPools = plugin.checkPools
+    monkeypatch.setattr(plugin, "checkPools", lambda args: threads.add(threading.current_thread().name) or checkPools(args))
+    args = plugin.argumentParser().parse_args(["pools", "-d", "fs2,fs1,fs2,fs3"])
+    args.func = plugin.checkPools
+    checkResult = plugin.runCheck(args)
+    assert re.fullmatch(r"\w+ - 3 devices: \d+ critical, \d+ warning, 0 unknown, \d+ ok", checkResult.returnMessage)
+    assert [x.split("]", 1)[1].split(":")[0] for x in checkResult.longOutput.splitlines()] == [" fs2", " fs1", " fs3"]
+    # the first call dispatches the devices to the workers
+    assert len(threads - {threading.current_thread().name}) == 2
+
+
+def test_unknown_device_list(plugin, monkeypatch, tmp_path):
+    monkeypatch.setattr(plugin, "MMFS_BIN_DIRECTORY", str(tmp_path))
+    checkResult = plugin.runCheck(plugin.argumentParser().parse_args(["filesets", "-d", "all", "-i"]))
+    assert checkResult.returnCode == plugin.STATE_UNKNOWN
+    assert checkResult.returnMessage.startswith("UNKNOWN - checkFileSets failed: ")
@@ -0,0 +1,83 @@
+################################################################################
+# Tests of the filesystems check from one mmlsmount all -L -Y and one mmdf -Y per
+# mounted file system of the stand-ins
+################################################################################
+import os
+import subprocess
+
+from conftest import STAND_IN_DIRECTORY
+
+
+def runFileSystems(plugin, *arguments):
+    """
+    Returns: the CheckResult of the filesystems check with the arguments
+    """
+    return plugin.runCheck(plugin.argumentParser().parse_args(["filesystems", "-L"] + list(arguments)))
+
+
+def getDiskFree(plugin, device):
+    """
+    Returns: tuple of the size and the free KB of mmdf -Y of the stand-ins for device
+    """
+    output = subprocess.run([plugin.mmCommand("mmdf"), device, "-Y"], stdout=subprocess.PIPE, universal_newlines=True, check=True).stdout
+    fields = [x.split(":") for x in output.splitlines() if x.startswith("mmdf:fsTotal:0:")][0]
+    return int(fields[6]), int(fields[7]) + int(fields[9])
+
+
+def writeCommands(tmp_path, failing):
+    """
+    Returns: a directory with the stand-ins, the commands in failing exit with 1
+    """
+    directory = tmp_path / "bin"
+    directory.mkdir()
+    for name in ("mmlsfs", "mmlsmount", "mmdf"):
+        commandPath = directory / name
+        if name in failing:
+            commandPath.write_text("#!/bin/sh\nexit 1\n")
+        else:
+            commandPath.write_text("#!/bin/sh\nexec " + os.path.join(STAND_IN_DIRECTORY, name) + " \"$@\"\n")
+        commandPath.chmod(0o755)
+    return str(directory)
+
+
+def test_file_systems_of_the_stand_ins(plugin, monkeypatch):
+    monkeypatch.setenv("MMFAKE_DEVICES", "3")
+    checkResult = runFileSystems(plugin, "-w", "100", "-c", "100")
+    # the last of three file systems is not mounted
+    assert (checkResult.returnCode, checkResult.returnMessage) == (plugin.STATE_CRITICAL, "Critical - Not mounted: 1 Capacity: 0 Inodes: 0")
+    assert checkResult.longOutput.startswith("Not mounted: fs3 (0 nodes)\n")
+    mounts = subprocess.run([plugin.mmCommand("mmlsmount"), "all", "-L", "-Y"], stdout=subprocess.PIPE, universal_newlines=True, check=True).stdout.splitlines()
+    for device in ("fs1", "fs2"):
+        size, free = getDiskFree(plugin, device)
+        nodes = len([x for x in mounts if x.startswith("mmlsmount::0:1:::" + device + ":")])
+        assert nodes > 0
+        assert device + "_nodes=" + str(nodes) + ";;1:;0;" in checkResult.performanceData
+        assert device + "_free=" + str(free) + "KB;0.0;0.0;0;" + str(size) + " " in checkResult.performanceData
+    assert "fs3_free" not in checkResult.performanceData
+    checkResult = runFileSystems(plugin, "-d", "fs1,fs2", "-w", "100", "-c", "100")
+    assert checkResult.returnMessage == "OK - All 2 file systems are mounted and in range"
+    checkResult = runFileSystems(plugin, "-d", "fs1,fs2", "-w", "100", "-c", "100", "-m", "17")
+    assert checkResult.returnMessage == "Critical - Not mounted: 2 Capacity: 0 Inodes: 0"
+
+
+def test_capacity_thresholds(plugin):
+    size, free = getDiskFree(plugin, "fs1")
+    usage = 100.0 - free * 100.0 / size
+    checkResult = runFileSystems(plugin, "-d", "fs1", "-w", str(usage - 1), "-c", str(min(usage + 1, 100)))
+    assert "Capacity: 1" in checkResult.returnMessage
+    checkResult = runFileSystems(plugin, "-d", "fs1", "-w", str(usage - 2), "-c", str(usage - 1))
+    assert checkResult.returnMessage.startswith("Critical - Not mounted: 0 Capacity: 1 ")
+    assert "Critical Capacity: fs1\n" in checkResult.longOutput
+
+
+def test_failed_mmlsmount_is_an_error(plugin, tmp_path, monkeypatch):
+    monkeypatch.setattr(plugin, "MMFS_BIN_DIRECTORY", writeCommands(tmp_path, ["mmlsmount"]))
+    checkResult = runFileSystems(plugin)
+    assert (checkResult.returnCode, checkResult.returnMessage) == (plugin.STATE_UNKNOWN, "UNKNOWN - checkFileSystems failed: mmlsmount failed with exit code 1")
+
+
+def test_failed_mmdf_is_unknown(plugin, tmp_path, monkeypatch):
+    monkeypatch.setattr(plugin, "MMFS_BIN_DIRECTORY", writeCommands(tmp_path, ["mmdf"]))
+    checkResult = runFileSystems(plugin, "-w", "100", "-c", "100")
+    assert (checkResult.returnCode, checkResult.returnMessage) == (plugin.STATE_UNKNOWN, "UNKNOWN - No capacity of fs1 (mmdf failed with exit code 1), fs2 (mmdf failed with exit code 1)")
+    assert checkResult.longOutput.endswith("No Capacity: fs1 (mmdf failed with exit code 1), fs2 (mmdf failed with exit code 1)")
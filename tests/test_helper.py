@@ -0,0 +1,107 @@
+################################################################################
+# Tests of the request and response framing of the helper sessions
+# (serveHelperRequests and HelperBackend)
+################################################################################
+import io
+import json
+import os
+import subprocess
+import sys
+
+from conftest import ROOT_DIRECTORY, STAND_IN_DIRECTORY
+
+# Helper session which serves the stand-ins, the real one takes the directory from HELPER_CONFIG
+HELPER_SESSION = "import sys; sys.path.insert(0, {root!r}); import check_spectrum_scale; check_spectrum_scale.serveHelperRequests(sys.stdin.buffer, sys.stdout.buffer, {bin!r}, [])"
+
+
+def frameRequest(argv):
+    """
+    Returns: the request frame of an argument list
+    """
+    request = json.dumps(argv).encode()
+    return str(len(request)).encode() + b"\n" + request
+
+
+def readResponses(data):
+    """
+    Returns: list of tuples of the output and the exit code per request from the response frames
+    """
+    responses = []
+    output = b""
+    stream = io.BytesIO(data)
+    while True:
+        header = stream.readline()
+        if not header:
+            break
+        status, length = (int(x) for x in header.split())
+        chunk = stream.read(length)
+        assert len(chunk) == length
+        if status < 0:
+            output += chunk
+        else:
+            responses.append((output, status))
+            output = b""
+    assert output == b""
+    return responses
+
+
+def serve(plugin, requests):
+    """
+    Returns: the responses of serveHelperRequests for the request frames
+    """
+    responses = io.BytesIO()
+    running = []
+    plugin.serveHelperRequests(io.BytesIO(b"".join(requests)), responses, STAND_IN_DIRECTORY, running)
+    assert running == []
+    return readResponses(responses.getvalue())
+
+
+def test_output_and_exit_codes_are_framed(plugin):
+    command = [os.path.join(STAND_IN_DIRECTORY, "mmgetstate"), "-LY"]
+    expected = subprocess.run(command, stdout=subprocess.PIPE).stdout
+    failing = [os.path.join(STAND_IN_DIRECTORY, "mmlsquota"), "-u", "nobody", "-Y", "fs1"]
+    responses = serve(plugin, [frameRequest(command), frameRequest(failing), frameRequest(command)])
+    assert responses == [(expected, 0), (b"", 1), (expected, 0)]
+
+
+def test_large_output_is_split_into_frames(plugin, monkeypatch):
+    monkeypatch.setenv("MMFAKE_QUOTA_ROWS", "5000")
+    command = [os.path.join(STAND_IN_DIRECTORY, "mmrepquota"), "-Y", "fs1"]
+    expected = subprocess.run(command, stdout=subprocess.PIPE).stdout
+    assert len(expected) > 65536
+    assert serve(plugin, [frameRequest(command)]) == [(expected, 0)]
+
+
+def test_invalid_requests_are_refused(plugin):
+    requests = [frameRequest(["/bin/sh", "-c", "id"]),
+                frameRequest([os.path.join(STAND_IN_DIRECTORY, "..", "mmfake.py"), "mmgetstate"]),
+                frameRequest([os.path.join(STAND_IN_DIRECTORY, "..", "bin", "..", "run_benchmarks.py")]),
+                frameRequest(os.path.join(STAND_IN_DIRECTORY, "mmgetstate") + " -LY"),
+                frameRequest([]),
+                b"9\nnot json!",
+                frameRequest([os.path.join(STAND_IN_DIRECTORY, "mmmissing")]),
+                frameRequest([os.path.join(STAND_IN_DIRECTORY, "mmfs")])]
+    assert serve(plugin, requests) == [(b"", 126)] * 6 + [(b"", 127), (b"", 0)]
+
+
+def test_helper_backend_streams_the_commands(plugin, monkeypatch):
+    backend = plugin.HelperBackend()
+    session = subprocess.Popen([sys.executable, "-c", HELPER_SESSION.format(root=ROOT_DIRECTORY, bin=STAND_IN_DIRECTORY)],
+                               stdin=subprocess.PIPE, stdout=subprocess.PIPE, start_new_session=True)
+    backend.release(session)
+    monkeypatch.setattr(plugin, "COMMAND_BACKEND", backend)
+    monkeypatch.setattr(plugin, "CACHE_DIRECTORY", None)
+    try:
+        command = plugin.mmCommand("mmlsfileset", "fs1 -Y")
+        expected = subprocess.run(command.split(), stdout=subprocess.PIPE, universal_newlines=True).stdout
+        for run in range(2):
+            with plugin.streamBashCommand(command) as output:
+                assert "".join(output) == expected
+            assert output.returnCode == 0
+            # the session is reused for the next command
+            assert backend.idle == [session]
+        with plugin.streamBashCommand(plugin.mmCommand("mmlsquota", "-u nobody -Y fs1")) as output:
+            assert "".join(output) == ""
+        assert output.returnCode == 1
+    finally:
+        backend.close()
@@ -0,0 +1,117 @@
+################################################################################
+# Tests of the history of the forecasts (HistoryStore): the ring buffer per
+# metric, the incremental sums of the linear regression and the expiry
+################################################################################
+import os
+import random
+import time
+
+import pytest
+
+HOUR = 3600
+
+
+def getRegressionHours(samples, limit):
+    """
+    Returns: hours until the least squares line over the samples reaches the limit from the latest value
+    """
+    count = len(samples)
+    meanT = sum(x[0] for x in samples) / float(count)
+    meanV = sum(x[1] for x in samples) / float(count)
+    slope = sum((x[0] - meanT) * (x[1] - meanV) for x in samples) / sum((x[0] - meanT) ** 2 for x in samples)
+    return (limit - samples[-1][1]) / slope / HOUR
+
+
+def openStore(plugin, tmp_path, window, **options):
+    """
+    Returns: the HistoryStore test in tmp_path
+    """
+    return plugin.HistoryStore(str(tmp_path / "history" / "test.dat"), window, **options)
+
+
+def test_ring_keeps_the_last_window_samples(plugin, tmp_path):
+    start = int(time.time()) - 20 * HOUR
+    with openStore(plugin, tmp_path, 4) as history:
+        for sample in range(10):
+            history.addSample("fs1", start + sample * HOUR, sample * 10.0)
+        assert history.getSamples("fs1") == [(start + x * HOUR, x * 10.0) for x in range(6, 10)]
+        assert history.getSamples("fs2") == []
+    # the samples are kept in the file
+    with openStore(plugin, tmp_path, 4) as history:
+        assert history.getSamples("fs1") == [(start + x * HOUR, x * 10.0) for x in range(6, 10)]
+    # a history of another window starts anew
+    with openStore(plugin, tmp_path, 5) as history:
+        assert history.getSamples("fs1") == []
+
+
+def test_same_timestamp_replaces_and_older_samples_are_ignored(plugin, tmp_path):
+    start = int(time.time()) - 20 * HOUR
+    with openStore(plugin, tmp_path, 4) as history:
+        for sample in range(3):
+            history.addSample("fs1", start + sample * HOUR, sample * 10.0)
+        history.addSample("fs1", start + 2 * HOUR, 25.0)
+        history.addSample("fs1", start + HOUR, 99.0)
+        assert history.getSamples("fs1") == [(start, 0.0), (start + HOUR, 10.0), (start + 2 * HOUR, 25.0)]
+        assert history.addSample("fs1", start + 2 * HOUR, 20.0, 50.0) == pytest.approx(3.0)
+
+
+def test_forecast_of_a_linear_metric(plugin, tmp_path):
+    start = int(time.time()) - 20 * HOUR
+    with openStore(plugin, tmp_path, 4) as history:
+        hours = [history.addSample("fs1", start + x * HOUR, x * 10.0, 200.0) for x in range(10)]
+    # too few samples for a forecast, then the hours from the latest value across the wraparounds of the ring
+    assert hours[:plugin.HISTORY_MIN_SAMPLES - 1] == [None] * (plugin.HISTORY_MIN_SAMPLES - 1)
+    assert hours[plugin.HISTORY_MIN_SAMPLES - 1:] == pytest.approx([(200 - x * 10.0) / 10.0 for x in range(plugin.HISTORY_MIN_SAMPLES - 1, 10)])
+
+
+def test_forecast_is_the_regression_over_the_window(plugin, tmp_path):
+    generator = random.Random(1)
+    start = int(time.time()) - 200 * HOUR
+    samples = []
+    value = 1000.0
+    with openStore(plugin, tmp_path, 7) as history:
+        for sample in range(100):
+            timestamp = start + sample * HOUR + generator.randrange(600)
+            value += generator.uniform(-5, 20)
+            samples.append((timestamp, value))
+            hours = history.addSample("fs1", timestamp, value, 10 ** 6)
+            if sample >= 6:
+                expected = getRegressionHours(samples[-7:], 10 ** 6)
+                assert hours == pytest.approx(expected, rel=1e-6) if expected > 0 else hours is None
+        assert history.getSamples("fs1") == samples[-7:]
+    # a metric which moves away from its limit has no forecast
+    with openStore(plugin, tmp_path, 7) as history:
+        for sample in range(5):
+            hours = history.addSample("free", start + sample * HOUR, 100.0 + sample, 0.0)
+        assert hours is None
+
+
+def test_expired_metrics_are_removed(plugin, tmp_path):
+    now = int(time.time())
+    with openStore(plugin, tmp_path, 4, expiry=10 * HOUR) as history:
+        for name in ("old1", "kept1", "old2", "kept2"):
+            history.addSample(name, now - (20 if name.startswith("old") else 1) * HOUR, 1.0)
+    path = str(tmp_path / "history" / "test.dat")
+    with open(path + ".names") as namesFile:
+        assert namesFile.read() == "#generation 1\nkept1\nkept2\n"
+    with openStore(plugin, tmp_path, 4, expiry=10 * HOUR) as history:
+        assert sorted(history.slots) == ["kept1", "kept2"]
+        assert history.getSamples("kept2") == [(now - HOUR, 1.0)]
+        assert history.getSamples("old1") == []
+        history.addSample("new", now, 2.0)
+    with openStore(plugin, tmp_path, 4, expiry=10 * HOUR) as history:
+        assert history.getSamples("new") == [(now, 2.0)]
+        assert history.generation == 1
+
+
+def test_names_of_another_generation_start_anew(plugin, tmp_path):
+    now = int(time.time())
+    with openStore(plugin, tmp_path, 4) as history:
+        history.addSample("fs1", now, 1.0)
+    # e.g. a crash between the compaction of the slots and the names
+    path = str(tmp_path / "history" / "test.dat")
+    with open(path + ".names", "w") as namesFile:
+        namesFile.write("#generation 3\nfs1\n")
+    with openStore(plugin, tmp_path, 4) as history:
+        assert history.getSamples("fs1") == []
+    assert os.path.getsize(path) == plugin.HistoryStore.HEADER.size
@@ -0,0 +1,49 @@
+################################################################################
+# Tests of the rates of the mmpmon counters (calculateIoRates) and of the io
+# check against the stand-ins, whose operation counters wrap at 32 bit
+################################################################################
+import re
+import time
+
+import pytest
+
+
+def test_operation_counters_wrap_at_32_bit(plugin):
+    previous = [1000.0, 5 * 10 ** 12, 10 ** 12] + [(1 << 32) - 50] * 6
+    ioObject = plugin.IoObject("fs1", 1010.0, [5 * 10 ** 12 + 10 ** 9, 10 ** 12 + 2 * 10 ** 9] + [50] * 6)
+    plugin.calculateIoRates(ioObject, previous)
+    assert not ioObject.reset
+    assert ioObject.rates == [10 ** 8, 2 * 10 ** 8] + [10.0] * 6
+
+
+def test_decreasing_byte_counters_are_a_reset(plugin):
+    ioObject = plugin.IoObject("fs1", 1010.0, [10, 10 ** 12] + [100] * 6)
+    plugin.calculateIoRates(ioObject, [1000.0, 10 ** 9, 10 ** 9] + [0] * 6)
+    assert ioObject.reset
+    assert ioObject.rates is None
+
+
+def test_sample_without_interval_has_no_rates(plugin):
+    ioObject = plugin.IoObject("fs1", 1000.0, [10] * 8)
+    plugin.calculateIoRates(ioObject, [1000.0] + [0] * 8)
+    assert (ioObject.rates, ioObject.reset) == (None, False)
+
+
+def test_io_check_reports_the_rates_of_the_stand_ins(plugin, monkeypatch):
+    monkeypatch.setenv("MMFAKE_DEVICES", "2")
+    args = plugin.argumentParser().parse_args(["io", "-L"])
+    checkResult = plugin.checkIo(args)
+    assert checkResult.returnMessage.startswith("OK - First sample of the I/O counters of 2 filesystems")
+    time.sleep(1.0)
+    checkResult = plugin.checkIo(args)
+    assert checkResult.returnMessage == "OK - I/O of 2 filesystems in range"
+    performanceData = dict(re.findall(r"(\w+)=([0-9.]+)", checkResult.performanceData))
+    # the stand-ins count at one of the fixed rates per filesystem, which the truncated counters miss by one count per interval
+    for device in ("fs1", "fs2"):
+        for name in plugin.IO_COUNTER_LABELS:
+            rate = float(performanceData[device + "_" + name])
+            rates = (10 ** 6, 10 ** 7, 10 ** 8) if name in ("read", "write") else (10, 100, 1000)
+            assert any(rate == pytest.approx(x, rel=0.15) for x in rates), device + "_" + name + "=" + str(rate)
+    node = sum(float(performanceData["fs1_" + x]) + float(performanceData["fs2_" + x]) for x in ("opens", "closes", "reads", "writes", "readdir"))
+    assert float(performanceData["node_ops"]) == pytest.approx(node, rel=0.05)
+    assert "resets" not in performanceData
@@ -0,0 +1,67 @@
+################################################################################
+# Tests of the percentiles of the latency histograms (LatencyHistogram) and of
+# the iolatency check against mmdiag --iohist of the stand-ins
+################################################################################
+import math
+import random
+import re
+import subprocess
+
+import pytest
+
+
+def getExactPercentile(latencies, percentile):
+    """
+    Returns: the latency of the rank of the percentile in the sorted latencies
+    """
+    latencies = sorted(latencies)
+    return latencies[max(0, int(math.ceil(len(latencies) * percentile / 100.0)) - 1)]
+
+
+def test_percentiles_are_within_one_bucket(plugin):
+    generator = random.Random(1)
+    latencies = [generator.lognormvariate(1.0, 1.5) for x in range(20000)]
+    histogram = plugin.LatencyHistogram()
+    for latency in latencies:
+        histogram.add(latency)
+    assert histogram.count == len(latencies)
+    assert histogram.max == max(latencies)
+    # the upper bound of the bucket of the exact percentile
+    bucketWidth = 2 ** (1.0 / plugin.LATENCY_BUCKETS_PER_OCTAVE)
+    for percentile in (1, 50, 90, 95, 99, 99.9, 100):
+        exact = getExactPercentile(latencies, percentile)
+        assert exact <= histogram.getPercentile(percentile) <= min(exact * bucketWidth, histogram.max)
+
+
+def test_percentiles_at_the_bounds(plugin):
+    histogram = plugin.LatencyHistogram()
+    assert histogram.getPercentile(99) == 0
+    histogram.add(7.5)
+    assert [histogram.getPercentile(x) for x in (1, 50, 100)] == [7.5] * 3
+    # latencies below the smallest bucket and above the largest one
+    histogram.add(0.0)
+    histogram.add(10 ** 6)
+    assert histogram.getPercentile(1) == pytest.approx(plugin.LATENCY_MIN * 2 ** (1.0 / plugin.LATENCY_BUCKETS_PER_OCTAVE))
+    assert histogram.getPercentile(100) == 10 ** 6
+    assert histogram.counts[-1] == 1
+
+
+def test_iolatency_check_reports_the_histogram_percentiles(plugin, monkeypatch):
+    monkeypatch.setenv("MMFAKE_IOHIST", "2000")
+    args = plugin.argumentParser().parse_args(["iolatency", "-L", "-w", "1000000", "-c", "2000000"])
+    checkResult = plugin.checkIoLatency(args)
+    assert checkResult.returnCode == plugin.STATE_OK
+    output = subprocess.run([plugin.mmCommand("mmdiag"), "--iohist"], stdout=subprocess.PIPE, universal_newlines=True).stdout
+    latencies = {}
+    for disk, ioType, latency in plugin.parseIoHistory(output.split("\n")):
+        latencies.setdefault(disk, []).append(latency)
+        latencies.setdefault(ioType, []).append(latency)
+    assert sum(len(x) for x in latencies.values()) == 2 * 2000
+    performanceData = dict(re.findall(r"(\S+)=([0-9.]+)", checkResult.performanceData))
+    bucketWidth = 2 ** (1.0 / plugin.LATENCY_BUCKETS_PER_OCTAVE)
+    for name, values in latencies.items():
+        assert int(performanceData[name + "_ios"]) == len(values)
+        for percentile in plugin.LATENCY_PERCENTILES:
+            exact = getExactPercentile(values, percentile)
+            # the performance data is rounded to 3 decimals
+            assert exact - 0.0005 <= float(performanceData[name + "_p" + str(percentile)]) <= exact * bucketWidth + 0.0005
@@ -0,0 +1,71 @@
+################################################################################
+# Tests of the deadlines of the mm* commands and of the host-wide limit of the
+# concurrently running commands (acquireCommandSlot)
+################################################################################
+import concurrent.futures
+import os
+import re
+import sys
+import time
+
+import pytest
+
+
+def writeCommand(directory, name, source):
+    """
+    Write an executable python script name to directory, which stands in for a mm* command
+    """
+    directory.mkdir(exist_ok=True)
+    commandPath = directory / name
+    commandPath.write_text("#!" + sys.executable + "\n" + source)
+    commandPath.chmod(0o755)
+
+
+def test_command_is_killed_with_its_children_at_the_deadline(plugin, tmp_path, monkeypatch):
+    markerPath = tmp_path / "finished"
+    source = "import subprocess, sys, time\n"
+    source += "subprocess.Popen([sys.executable, '-c', 'import sys, time; time.sleep(1.5); open(sys.argv[1], \"w\").close()', " + repr(str(markerPath)) + "])\n"
+    source += "time.sleep(3)\n"
+    writeCommand(tmp_path / "bin", "mmgetstate", source)
+    monkeypatch.setattr(plugin, "MMFS_BIN_DIRECTORY", str(tmp_path / "bin"))
+    started = time.monotonic()
+    checkResult = plugin.runCheck(plugin.argumentParser().parse_args(["status", "-s", "-T", "0.5"]))
+    assert time.monotonic() - started < 2.5
+    assert checkResult.returnCode == plugin.STATE_UNKNOWN
+    assert checkResult.returnMessage == "UNKNOWN - mmgetstate timed out after 0.5s (queued 0.0s, running 0.5s)"
+    assert re.fullmatch(r"t_queue=0\.0\d*s t_exec=0\.5s", checkResult.performanceData)
+    time.sleep(2)
+    assert not markerPath.exists()
+
+
+def test_command_waits_for_a_free_slot(plugin, monkeypatch):
+    monkeypatch.setattr(plugin, "MAX_CONCURRENT_COMMANDS", 1)
+    monkeypatch.setattr(plugin, "MAX_COMMAND_WAIT", 0.3)
+    slotFile = plugin.acquireCommandSlot()
+    assert slotFile
+    with pytest.raises(plugin.CommandTimeoutError, match="did not get a free slot within 0.3s") as error:
+        plugin.executeBashCommand(plugin.mmCommand("mmgetstate", "-LY"), 0)
+    assert error.value.queueTime >= 0.3
+    slotFile.close()
+    assert plugin.executeBashCommand(plugin.mmCommand("mmgetstate", "-LY"), 0).startswith("mmgetstate::HEADER")
+    # the limit is disabled with 0
+    monkeypatch.setattr(plugin, "MAX_CONCURRENT_COMMANDS", 0)
+    assert plugin.acquireCommandSlot() is None
+
+
+def test_concurrent_commands_are_limited(plugin, tmp_path, monkeypatch):
+    logPath = tmp_path / "log"
+    source = "import os, time\n"
+    source += "log = os.open(" + repr(str(logPath)) + ", os.O_WRONLY | os.O_APPEND | os.O_CREAT)\n"
+    source += "os.write(log, b'+\\n')\ntime.sleep(0.3)\nos.write(log, b'-\\n')\n"
+    writeCommand(tmp_path / "bin", "mmlspool", source)
+    monkeypatch.setattr(plugin, "MMFS_BIN_DIRECTORY", str(tmp_path / "bin"))
+    monkeypatch.setattr(plugin, "MAX_CONCURRENT_COMMANDS", 2)
+    with concurrent.futures.ThreadPoolExecutor(6) as executor:
+        outputs = list(executor.map(lambda x: plugin.executeBashCommand(plugin.mmCommand("mmlspool", "fs" + str(x)), 0), range(6)))
+    assert outputs == [""] * 6
+    running = []
+    for line in logPath.read_text().split():
+        running.append((running[-1] if running else 0) + (1 if line == "+" else -1))
+    assert max(running) == 2
+    assert sorted(os.listdir(os.path.join(plugin.STATE_DIRECTORY, "slots"))) == ["slot.0", "slot.1"]
@@ -0,0 +1,114 @@
+################################################################################
+# Tests of the metrics subcommand, which writes the node states, pools, filesets
+# and quota of the stand-ins as a textfile of the node_exporter
+################################################################################
+import os
+import subprocess
+
+from conftest import STAND_IN_DIRECTORY
+
+
+def writeMetrics(plugin, path, *arguments):
+    """
+    Returns: the CheckResult of the metrics subcommand writing to path with the arguments
+    """
+    return plugin.runCheck(plugin.argumentParser().parse_args(["metrics", "-o", str(path)] + list(arguments)))
+
+
+def readMetrics(path):
+    """
+    Returns: dict of the name of each metric family to its samples (in the order of the file), the samples of a
+             family have to follow its HELP and TYPE lines and the file has to end with # EOF
+    """
+    lines = path.read_text().splitlines()
+    assert lines[-1] == "# EOF"
+    families = {}
+    name = None
+    for line in lines[:-1]:
+        if line.startswith("# HELP "):
+            name = line.split(" ")[2]
+            assert name not in families
+            families[name] = []
+        elif line.startswith("# TYPE "):
+            assert line == "# TYPE " + name + " gauge"
+        else:
+            assert line.startswith(name + "{") or line.startswith(name + " ")
+            families[name].append(line[len(name):])
+    return families
+
+
+def test_metrics_of_the_stand_ins(plugin, tmp_path):
+    path = tmp_path / "gpfs.prom"
+    checkResult = writeMetrics(plugin, path, "-d", "fs1")
+    assert checkResult.returnMessage == "OK - Wrote the metrics of 1 devices to " + str(path)
+    assert checkResult.performanceData.startswith("filesets=100 nodes=16 pools=4 quota=10000 t_collect=")
+    families = readMetrics(path)
+    assert len(families["gpfs_node_state"]) == 16
+    assert families["gpfs_nodes"] == [" 16"]
+    assert families["gpfs_pool_data_size_bytes"][0].startswith('{device="fs1",pool="system"} ')
+    assert len(families["gpfs_fileset_linked"]) == 100
+    # each quota entry of the report of the stand-ins with the usage in bytes
+    output = subprocess.run([plugin.mmCommand("mmrepquota"), "-Y", "fs1"], stdout=subprocess.PIPE, universal_newlines=True, check=True).stdout
+    types = {"USR": "user", "GRP": "group", "FILESET": "fileset"}
+    expected = []
+    for line in output.splitlines()[1:]:
+        fields = line.split(":")
+        expected.append('{device="fs1",type="' + types[fields[7]] + '",principal="' + fields[9] + '",fileset="' + fields[24] + '"} ' + str(int(fields[10]) * 1024))
+    assert families["gpfs_quota_block_usage_bytes"] == expected
+    assert len(families["gpfs_quota_files_limit"]) == 10000
+    assert list(families)[-2:] == ["gpfs_textfile_duration_seconds", "gpfs_textfile_timestamp_seconds"]
+    assert oct(os.stat(str(path)).st_mode & 0o777) == oct(0o644)
+
+
+def test_families_of_several_devices_are_contiguous(plugin, tmp_path, monkeypatch):
+    monkeypatch.setenv("MMFAKE_DEVICES", "3")
+    path = tmp_path / "gpfs.prom"
+    checkResult = writeMetrics(plugin, path, "-d", "all", "--no-nodes", "--no-quota", "-x", "fileset1,fileset2")
+    assert checkResult.performanceData.startswith("filesets=294 nodes=0 pools=12 quota=0 t_collect=")
+    families = readMetrics(path)
+    assert not [x for x in families if x.startswith(("gpfs_node", "gpfs_quorum", "gpfs_quota"))]
+    devices = [x.split('"')[1] for x in families["gpfs_pool_data_free_bytes"]]
+    assert sorted(devices) == ["fs1"] * 4 + ["fs2"] * 4 + ["fs3"] * 4
+    assert not [x for x in families["gpfs_fileset_max_inodes"] if 'fileset="fileset1"' in x or 'fileset="fileset2"' in x]
+
+
+def test_spooled_families_are_written_unchanged(plugin, tmp_path, monkeypatch):
+    writeMetrics(plugin, tmp_path / "memory.prom", "-d", "fs1")
+    # the samples are spooled to temporary files in small pieces
+    monkeypatch.setattr(plugin, "METRICS_BUFFER_SAMPLES", 7)
+    monkeypatch.setattr(plugin, "METRICS_SPOOL_SIZE", 4096)
+    writeMetrics(plugin, tmp_path / "spooled.prom", "-d", "fs1")
+    memory, spooled = readMetrics(tmp_path / "memory.prom"), readMetrics(tmp_path / "spooled.prom")
+    for name in ("gpfs_textfile_duration_seconds", "gpfs_textfile_timestamp_seconds"):
+        del memory[name], spooled[name]
+    assert list(memory) == list(spooled)
+    assert memory == spooled
+
+
+def test_metrics_file_is_replaced_atomically(plugin, tmp_path, monkeypatch):
+    directory = tmp_path / "bin"
+    directory.mkdir()
+    for name in ("mmlsfs", "mmgetstate", "mmlspool", "mmdf", "mmlsfileset", "mmrepquota"):
+        commandPath = directory / name
+        if name == "mmrepquota":
+            # the report breaks off after some of the entries
+            commandPath.write_text("#!/bin/sh\n" + os.path.join(STAND_IN_DIRECTORY, name) + " \"$@\" | head -n 100\nexit 1\n")
+        else:
+            commandPath.write_text("#!/bin/sh\nexec " + os.path.join(STAND_IN_DIRECTORY, name) + " \"$@\"\n")
+        commandPath.chmod(0o755)
+    monkeypatch.setattr(plugin, "MMFS_BIN_DIRECTORY", str(directory))
+    textfileDirectory = tmp_path / "textfile_collector"
+    textfileDirectory.mkdir()
+    path = textfileDirectory / "gpfs.prom"
+    path.write_text("# EOF\n")
+    checkResult = writeMetrics(plugin, path, "-d", "fs1")
+    assert (checkResult.returnCode, checkResult.returnMessage) == (plugin.STATE_UNKNOWN, "UNKNOWN - writeMetricsFile failed: mmrepquota failed with exit code 1")
+    # the collector reads the old file and no temporary file is left
+    assert path.read_text() == "# EOF\n"
+    assert os.listdir(str(textfileDirectory)) == ["gpfs.prom"]
+    assert writeMetrics(plugin, path, "-d", "fs1", "--no-quota").returnCode == plugin.STATE_OK
+    assert "gpfs_pool_data_free_bytes" in readMetrics(path)
+
+
+def test_labels_are_escaped(plugin):
+    assert plugin.MetricsWriter.formatLabels(("device", "fs1"), ("principal", 'a"b\\c\nd')) == '{device="fs1",principal="a\\"b\\\\c\\nd"}'
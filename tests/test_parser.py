@@ -0,0 +1,83 @@
+################################################################################
+# Tests of the single pass parser of the machine-readable (-Y) output
+# (parseMachineReadable) and of the filesets check against mmlsfileset -Y of
+# the stand-ins
+################################################################################
+import subprocess
+
+import pytest
+
+MMDF_OUTPUT = """mmdf:nsd:HEADER:version:reserved:reserved:nsdName:storagePool:diskSize:freeBlocks:
+mmdf:poolTotal:HEADER:version:reserved:reserved:poolName:poolSize:freeBlocks:
+mmdf:nsd:0:1:::nsd1:system:1000:500:
+mmdf:poolTotal:0:1:::system:1000:500:
+mmdf:nsd:0:1:::nsd%3A2:system:2000::
+mmdf:fsTotal:0:1:::no header:
+"""
+
+
+def test_records_use_the_header_of_their_type(plugin):
+    records = list(plugin.parseMachineReadable(MMDF_OUTPUT.splitlines(True)))
+    assert [(x.command, x.recordType) for x in records] == [("mmdf", "nsd"), ("mmdf", "poolTotal"), ("mmdf", "nsd")]
+    assert (records[0]["nsdName"], records[0]["freeBlocks"], records[1]["poolName"], records[1]["freeBlocks"]) == ("nsd1", "500", "system", "500")
+    # the values are percent-decoded, the empty ones are the default of getInt
+    assert records[2]["nsdName"] == "nsd:2"
+    assert (records[2].getInt("diskSize"), records[2].getInt("freeBlocks", -1)) == (2000, -1)
+    assert records[2].get("poolName", "-") == "-"
+    with pytest.raises(KeyError):
+        records[0]["poolName"]
+
+
+def test_records_are_yielded_while_reading(plugin):
+    def lines():
+        yield "mmlsfileset::HEADER:version:reserved:reserved:filesetName:\n"
+        yield "mmlsfileset::0:1:::root:\n"
+        raise AssertionError("read beyond the first record")
+    assert next(plugin.parseMachineReadable(lines()))["filesetName"] == "root"
+
+
+def getFileSets(plugin, arguments):
+    """
+    Returns: dict of the filesets of mmlsfileset -Y of the stand-ins by name, each a dict of the columns
+    """
+    output = subprocess.run([plugin.mmCommand("mmlsfileset")] + arguments, stdout=subprocess.PIPE, universal_newlines=True, check=True).stdout
+    lines = [x.split(":") for x in output.splitlines()]
+    header = lines[0]
+    return dict((x[header.index("filesetName")], dict(zip(header, x))) for x in lines[1:])
+
+
+def test_filesets_check_counts_the_inodes_of_the_stand_ins(plugin, monkeypatch):
+    monkeypatch.setenv("MMFAKE_FILESETS", "500")
+    filesets = getFileSets(plugin, ["fs1", "-Y"])
+    assert len(filesets) == 500
+    args = plugin.argumentParser().parse_args(["filesets", "-d", "fs1", "-i", "-L", "-w", "90", "-c", "95"])
+    checkResult = plugin.checkFileSets(args)
+    free = dict((x, int(y["maxInodes"]) - int(y["allocInodes"])) for x, y in filesets.items())
+    critical = [x for x, y in filesets.items() if free[x] < int(y["maxInodes"]) * 0.05]
+    warning = [x for x, y in filesets.items() if free[x] < int(y["maxInodes"]) * 0.1 and x not in critical]
+    assert critical and warning
+    assert checkResult.returnCode == plugin.STATE_CRITICAL
+    assert checkResult.returnMessage == "Critical  - On " + str(len(critical)) + " filesets the inode utilization is to high!"
+    assert checkResult.longOutput.splitlines()[:2] == ["Critical FileSets: " + ", ".join(critical), "Warning FileSets: " + ", ".join(warning)]
+    for name in ("root", "fileset1", "fileset499"):
+        assert " " + name + "=" + str(free[name]) + ";" in " " + checkResult.performanceData
+
+
+def test_filesets_check_counts_the_links_of_the_stand_ins(plugin, monkeypatch):
+    monkeypatch.setenv("MMFAKE_FILESETS", "1000")
+    filesets = getFileSets(plugin, ["fs1", "-Y"])
+    unlinked = [x for x, y in filesets.items() if y["status"] == "Unlinked"]
+    assert unlinked
+    checkResult = plugin.checkFileSets(plugin.argumentParser().parse_args(["filesets", "-d", "fs1", "-l", "-w", "100", "-c", "200"]))
+    assert checkResult.returnMessage == "OK - " + str(1000 - len(unlinked)) + "/1000 filesets are linked"
+    assert "Unlinked=" + str(len(unlinked)) + ";" in checkResult.performanceData
+    checkResult = plugin.checkFileSets(plugin.argumentParser().parse_args(["filesets", "-d", "fs1", "-l", "-w", "0", "-c", str(len(unlinked) - 1)]))
+    assert checkResult.returnCode == plugin.STATE_CRITICAL
+
+
+def test_filesets_check_with_the_data_size(plugin, monkeypatch):
+    monkeypatch.setenv("MMFAKE_FILESETS", "20")
+    filesets = getFileSets(plugin, ["fs1", "-d", "-Y"])
+    checkResult = plugin.checkFileSets(plugin.argumentParser().parse_args(["filesets", "-d", "fs1", "-l", "-s"]))
+    for name, fileset in filesets.items():
+        assert name + "_blockSiz=" + fileset["dataInKB"] + "KB;;;; " in checkResult.performanceData
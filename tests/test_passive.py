@@ -0,0 +1,81 @@
+################################################################################
+# Tests of the passive subcommand, which submits the results of the status,
+# quota, fileset and pool services of a device to the command pipe or the check
+# result spool directory of Nagios/Icinga
+################################################################################
+import os
+import select
+import threading
+
+
+def runPassive(plugin, *arguments):
+    """
+    Returns: the CheckResult of the passive subcommand of fs1 for the host gpfs1 with the arguments
+    """
+    return plugin.submitPassiveResults(plugin.argumentParser().parse_args(["passive", "-d", "fs1", "-H", "gpfs1"] + list(arguments)))
+
+
+def test_results_are_written_to_the_command_file(plugin, tmp_path):
+    commandPath = tmp_path / "icinga.cmd"
+    commandPath.write_text("")
+    checkResult = runPassive(plugin, "--command-file", str(commandPath))
+    assert checkResult.returnMessage == "OK - Submitted 106 passive results of fs1 to " + str(commandPath)
+    assert checkResult.performanceData == "results=106 filesets=100 pools=4"
+    commands = commandPath.read_text().splitlines()
+    assert len(commands) == 106
+    services = {}
+    for command in commands:
+        timestamp, host, service, returnCode, output = command.split(";", 4)
+        assert timestamp.startswith("[") and timestamp.endswith("] PROCESS_SERVICE_CHECK_RESULT")
+        assert host == "gpfs1"
+        services[service] = (int(returnCode), output)
+    assert services["GPFS status"][1].startswith("OK - ")
+    assert services["GPFS quota fs1"][0] == plugin.STATE_CRITICAL
+    assert services["GPFS pool fs1 system"][1].startswith(("OK - Pool system data: ", "Warning - Pool system data: ", "Critical - Pool system data: "))
+    # the fileset services have the state of the filesets check of the same fileset
+    filesets = plugin.collectFileSets(plugin.argumentParser().parse_args(["filesets", "-d", "fs1", "-i"]), plugin.CheckTimer())[0]
+    for filesetObject in filesets:
+        returnCode, output = services["GPFS fileset fs1 " + filesetObject.filesetName]
+        expected = plugin.STATE_CRITICAL if filesetObject.criticalInodes else plugin.STATE_WARNING if filesetObject.warningInodes or filesetObject.status != "Linked" else plugin.STATE_OK
+        assert returnCode == expected
+        assert "|freeInodes=" + str(filesetObject.freeInodes) + ";" in output
+
+
+def test_fifo_gets_whole_lines_up_to_pipe_buf(plugin, tmp_path, monkeypatch):
+    commandPath = str(tmp_path / "icinga.cmd")
+    os.mkfifo(commandPath)
+    received = []
+    reader = threading.Thread(target=lambda: received.append(open(commandPath, "rb").read()))
+    reader.start()
+    writes = []
+    write = os.write
+    monkeypatch.setattr(os, "write", lambda fd, data: writes.append(bytes(data)) or write(fd, data))
+    checkResult = runPassive(plugin, "--command-file", commandPath, "-p", "GPFS " + "x" * 200)
+    reader.join(10)
+    assert checkResult.returnCode == plugin.STATE_OK
+    assert len(writes) > 1
+    assert all(len(x) <= select.PIPE_BUF and x.endswith(b"\n") for x in writes)
+    assert received == [b"".join(writes)]
+    assert len(received[0].splitlines()) == 106
+
+
+def test_results_are_written_to_the_spool_directory(plugin, tmp_path):
+    spoolDirectory = tmp_path / "spool"
+    spoolDirectory.mkdir()
+    checkResult = runPassive(plugin, "--spool-dir", str(spoolDirectory), "-p", "Scale")
+    assert checkResult.returnMessage == "OK - Submitted 106 passive results of fs1 to " + str(spoolDirectory)
+    names = sorted(os.listdir(str(spoolDirectory)))
+    assert len(names) == 2 and names[1] == names[0] + ".ok" and len(names[0]) == 7 and names[0][0] == "c"
+    text = (spoolDirectory / names[0]).read_text()
+    assert text.startswith("### Passive Check Result File ###\nfile_time=")
+    blocks = text.split("### Nagios Service Check Result ###\n")[1:]
+    assert len(blocks) == 106
+    assert blocks[0].startswith("host_name=gpfs1\nservice_description=Scale status\ncheck_type=1\n")
+    assert "\nreturn_code=2\noutput=Critical - Block Critical: " in blocks[1]
+
+
+def test_long_output_is_escaped(plugin):
+    checkResult = plugin.CheckResult(plugin.STATE_WARNING, "WARNING - a\\b", "x=1")
+    checkResult.longOutput = "line 1\nline 2"
+    command = plugin.formatPassiveResult(1700000000.5, "gpfs1", "GPFS quota fs1", checkResult)
+    assert command == "[1700000000] PROCESS_SERVICE_CHECK_RESULT;gpfs1;GPFS quota fs1;1;WARNING - a\\\\b|x=1\\nline 1\\nline 2\n"
@@ -0,0 +1,137 @@
+################################################################################
+# Tests of the quota table (QuotaTable), its evaluation with NumPy and with the
+# array module, and of the quota check against mmrepquota -Y of the stand-ins
+################################################################################
+import random
+
+import pytest
+
+import mmfake
+
+
+def getTable(plugin, rows):
+    """
+    Returns: the QuotaTable of the mmrepquota -Y rows
+    """
+    lines = [mmfake.machineReadableLine("mmrepquota", ["HEADER", "version", "reserved", "reserved"] + mmfake.MMREPQUOTA_HEADER)]
+    lines += [mmfake.machineReadableLine("mmrepquota", x) for x in rows]
+    quotaTable = plugin.QuotaTable()
+    for record in plugin.parseMachineReadable("".join(lines).splitlines()):
+        quotaTable.appendRecord(record)
+    return quotaTable
+
+
+def getRandomRows(count):
+    """
+    Returns: quota rows with usages around the quota, including quotas of 0 (no limit) and usages on the thresholds
+    """
+    generator = random.Random(4)
+    rows = []
+    for number in range(count):
+        row = mmfake.quotaRow(number, "USR", "fs1", mmfake.DEFAULT_SCALE)
+        for usage, quota in ((8, 9), (13, 14)):
+            row[quota] = generator.choice((0, 100, 1000, 10 ** 12))
+            row[usage] = generator.choice((0, 50, 90, 91, 95, 96, 100, 101, 10 ** 6)) * (row[quota] or 100) // 100
+        rows.append(row)
+    return rows
+
+
+@pytest.mark.parametrize("warning, critical", [(90, 95), (95, 95), (97, 90), (0, 100)])
+def test_array_evaluation_equals_numpy(plugin, warning, critical):
+    pytest.importorskip("numpy")
+    quotaTable = getTable(plugin, getRandomRows(5000))
+    assert plugin.importNumpy() is not None
+    expected = list(quotaTable._evaluateNumpy(warning / 100.0, critical / 100.0))
+    assert expected
+    assert quotaTable._evaluateArray(warning / 100.0, critical / 100.0) == expected
+    # the same as the evaluation of each row
+    assert expected == [x for x in (quotaTable._evaluateRow(idx, warning / 100.0, critical / 100.0) for idx in range(len(quotaTable))) if x is not None]
+
+
+def test_evaluation_without_numpy(plugin, monkeypatch):
+    quotaTable = getTable(plugin, getRandomRows(1000))
+    expected = quotaTable.getViolations(90, 95)
+    monkeypatch.setattr(plugin, "numpy", False)
+    assert plugin.importNumpy() is None
+    assert quotaTable.getViolations(90, 95) == expected
+    # own thresholds of single entries replace the ones of the evaluation
+    quotaTable.thresholds[expected[0][0]] = (1000, 1000)
+    assert quotaTable.getViolations(90, 95) == expected[1:]
+
+
+def test_values_are_parsed_as_integers(plugin):
+    rows = getRandomRows(2)
+    rows[0][8] = "__import__('os').getpid()"
+    with pytest.raises(ValueError):
+        getTable(plugin, rows)
+    rows[0][8] = "0x10"
+    with pytest.raises(ValueError):
+        getTable(plugin, rows)
+    quotaTable = getTable(plugin, rows[1:])
+    assert quotaTable.blockQuota.typecode == "q"
+    assert list(quotaTable.blockUsage) == [rows[1][8]]
+
+
+def test_quota_check_of_the_stand_ins(plugin, monkeypatch):
+    monkeypatch.setenv("MMFAKE_QUOTA_ROWS", "2000")
+    args = plugin.argumentParser().parse_args(["quota", "-d", "fs1", "-L"])
+    checkResult = plugin.checkQuota(args)
+    rows = [mmfake.quotaRow(x, mmfake.getQuotaType(x, mmfake.getScale()), "fs1", mmfake.getScale()) for x in range(2000)]
+    quotaTable = getTable(plugin, rows)
+    violations = quotaTable.evaluate(90, 95)
+    blockCritical = len([x for x in violations if x.blockCritical])
+    assert checkResult.returnCode == plugin.STATE_CRITICAL
+    assert checkResult.returnMessage.startswith("Critical - Block Critical: " + str(blockCritical) + " ")
+    assert "blockCritical=" + str(blockCritical) + " " in checkResult.performanceData
+
+
+def runQuotaRows(plugin, tmp_path, monkeypatch, rows):
+    """
+    Returns: the CheckResult of the quota check of fs1 on the mmrepquota -Y rows
+    """
+    monkeypatch.setenv("MMFAKE_DATA", str(tmp_path / "data"))
+    monkeypatch.setattr(plugin, "CACHE_DIRECTORY", None)
+    (tmp_path / "data").mkdir(exist_ok=True)
+    lines = [mmfake.machineReadableLine("mmrepquota", ["HEADER", "version", "reserved", "reserved"] + mmfake.MMREPQUOTA_HEADER)]
+    lines += [mmfake.machineReadableLine("mmrepquota", x) for x in rows]
+    (tmp_path / "data" / mmfake.outputName("mmrepquota", ["-Y", "fs1"])).write_text("".join(lines))
+    return plugin.checkQuota(plugin.argumentParser().parse_args(["quota", "-d", "fs1", "-L"]))
+
+
+def getRow(number, blockUsage, blockQuota, filesUsage, filesQuota):
+    """
+    Returns: the mmrepquota -Y row of user number with the usages and quotas
+    """
+    row = mmfake.quotaRow(number, "USR", "fs1", mmfake.DEFAULT_SCALE)
+    row[8], row[9], row[13], row[14] = blockUsage, blockQuota, filesUsage, filesQuota
+    return row
+
+
+def test_file_quota_without_block_quota_is_checked(plugin, tmp_path, monkeypatch):
+    checkResult = runQuotaRows(plugin, tmp_path, monkeypatch, [getRow(1, 10 ** 9, 0, 92, 100), getRow(2, 10, 100, 10, 0)])
+    assert (checkResult.returnCode, checkResult.returnMessage) == (plugin.STATE_WARNING, "WARNING - Block: 0 File: 1")
+    assert "User File: user1\n" in checkResult.longOutput
+
+
+def test_single_critical_entry_is_critical(plugin, tmp_path, monkeypatch):
+    checkResult = runQuotaRows(plugin, tmp_path, monkeypatch, [getRow(1, 99, 100, 0, 0), getRow(2, 10, 100, 10, 100)])
+    assert (checkResult.returnCode, checkResult.returnMessage) == (plugin.STATE_CRITICAL, "Critical - Block Critical: 1 File Critical: 0")
+    checkResult = runQuotaRows(plugin, tmp_path, monkeypatch, [getRow(1, 0, 100, 99, 100)])
+    assert (checkResult.returnCode, checkResult.returnMessage) == (plugin.STATE_CRITICAL, "Critical - Block Critical: 0 File Critical: 1")
+
+
+def test_file_warning_is_a_warning(plugin, tmp_path, monkeypatch):
+    checkResult = runQuotaRows(plugin, tmp_path, monkeypatch, [getRow(1, 0, 100, 92, 100), getRow(2, 95, 100, 0, 0)])
+    assert (checkResult.returnCode, checkResult.returnMessage) == (plugin.STATE_WARNING, "WARNING - Block: 1 File: 1")
+    checkResult = runQuotaRows(plugin, tmp_path, monkeypatch, [getRow(1, 90, 100, 90, 100), getRow(2, 0, 0, 10 ** 6, 0)])
+    assert (checkResult.returnCode, checkResult.returnMessage) == (plugin.STATE_OK, "OK - No Violations detected")
+
+
+def test_file_lists_of_the_long_output(plugin, tmp_path, monkeypatch):
+    group = mmfake.quotaRow(4, "GRP", "fs1", mmfake.DEFAULT_SCALE)
+    group[8], group[9], group[13], group[14] = 0, 0, 92, 100
+    rows = [getRow(1, 99, 100, 0, 0), getRow(2, 0, 100, 92, 100), getRow(3, 0, 0, 99, 100), group]
+    checkResult = runQuotaRows(plugin, tmp_path, monkeypatch, rows)
+    # the file lists are not the block critical lists
+    assert checkResult.longOutput.splitlines() == ["User Block: ", "User Block Critical: user1", "User File: user2", "User File Critical: user3",
+                                                   "Group Block: ", "Group Block Critical: ", "Group File: " + group[7], "Group File Critical: "]
@@ -0,0 +1,113 @@
+################################################################################
+# Tests of the incremental quota check (QuotaIndex), the report of mmrepquota
+# is served from MMFAKE_DATA so that single entries can be changed
+################################################################################
+import re
+
+import mmfake
+
+QUOTA_ROWS = 200
+# columns of the values in the rows of mmfake.quotaRow
+NAME, BLOCK_USAGE, BLOCK_QUOTA, BLOCK_LIMIT, FILES_USAGE, FILES_QUOTA, FILES_LIMIT, FILES_GRACE, FILESET_NAME = 7, 8, 9, 10, 13, 14, 15, 17, 22
+
+
+def writeReport(dataDirectory, rows):
+    """
+    Write the mmrepquota -Y output of the rows to the data directory of the stand-ins
+    """
+    dataDirectory.mkdir(exist_ok=True)
+    lines = [mmfake.machineReadableLine("mmrepquota", ["HEADER", "version", "reserved", "reserved"] + mmfake.MMREPQUOTA_HEADER)]
+    lines += [mmfake.machineReadableLine("mmrepquota", x) for x in rows]
+    (dataDirectory / mmfake.outputName("mmrepquota", ["-Y", "fs1"])).write_text("".join(lines))
+
+
+def runQuota(plugin, *arguments):
+    """
+    Returns: tuple of the CheckResult of the incremental quota check of fs1 and its performance data as dict
+    """
+    args = plugin.argumentParser().parse_args(["quota", "-d", "fs1", "-I", "-L"] + list(arguments))
+    checkResult = plugin.checkQuota(args)
+    return checkResult, dict((x, float(y)) for x, y in re.findall(r"(\w+)=([0-9.]+)", checkResult.performanceData))
+
+
+def isViolating(row):
+    """
+    Returns: true if the block or file usage of the row is over the default warning threshold of 90%
+    """
+    return any(row[quota] and row[usage] * 100.0 / row[quota] > 90 for usage, quota in ((BLOCK_USAGE, BLOCK_QUOTA), (FILES_USAGE, FILES_QUOTA)))
+
+
+def getRows():
+    """
+    Returns: the user quota rows of the report
+    """
+    return [mmfake.quotaRow(x, "USR", "fs1", mmfake.DEFAULT_SCALE) for x in range(QUOTA_ROWS)]
+
+
+def test_unchanged_entries_are_not_evaluated_again(plugin, tmp_path, monkeypatch):
+    monkeypatch.setenv("MMFAKE_DATA", str(tmp_path / "data"))
+    monkeypatch.setattr(plugin, "CACHE_DIRECTORY", None)
+    rows = getRows()
+    violating = [x for x in rows if isViolating(x)]
+    assert 0 < len(violating) < QUOTA_ROWS
+    writeReport(tmp_path / "data", rows)
+
+    first, performanceData = runQuota(plugin)
+    assert performanceData["changedRows"] == QUOTA_ROWS
+    assert performanceData["newViolations"] == len(violating)
+    second, performanceData = runQuota(plugin)
+    assert (performanceData["changedRows"], performanceData["newViolations"], performanceData["clearedViolations"]) == (0, 0, 0)
+    # the violations of the unchanged entries come from the index
+    assert (second.returnCode, second.returnMessage) == (first.returnCode, first.returnMessage)
+    assert second.longOutput.split("\nNew Violations")[0] == first.longOutput.split("\nNew Violations")[0]
+
+
+def test_changed_and_removed_entries_update_the_violations(plugin, tmp_path, monkeypatch):
+    monkeypatch.setenv("MMFAKE_DATA", str(tmp_path / "data"))
+    monkeypatch.setattr(plugin, "CACHE_DIRECTORY", None)
+    rows = getRows()
+    writeReport(tmp_path / "data", rows)
+    runQuota(plugin)
+
+    entered = next(x for x in rows if not isViolating(x) and x[BLOCK_QUOTA])
+    cleared = next(x for x in rows if isViolating(x))
+    entered[BLOCK_USAGE] = entered[BLOCK_QUOTA]
+    cleared[BLOCK_USAGE] = cleared[FILES_USAGE] = 0
+    writeReport(tmp_path / "data", rows)
+    checkResult, performanceData = runQuota(plugin)
+    assert (performanceData["changedRows"], performanceData["newViolations"], performanceData["clearedViolations"]) == (2, 1, 1)
+    assert "New Violations: " + entered[NAME] + " (USR, " + entered[FILESET_NAME] + ")" in checkResult.longOutput
+    assert "Cleared Violations: " + cleared[NAME] + " (USR, " + cleared[FILESET_NAME] + ")" in checkResult.longOutput
+
+    removed = next(x for x in rows if isViolating(x))
+    rows.remove(removed)
+    writeReport(tmp_path / "data", rows)
+    checkResult, performanceData = runQuota(plugin)
+    assert (performanceData["changedRows"], performanceData["newViolations"], performanceData["clearedViolations"]) == (0, 0, 1)
+    assert "Cleared Violations: " + removed[NAME] + " (USR, " + removed[FILESET_NAME] + ")" in checkResult.longOutput
+
+
+def test_other_thresholds_evaluate_all_entries(plugin, tmp_path, monkeypatch):
+    monkeypatch.setenv("MMFAKE_DATA", str(tmp_path / "data"))
+    monkeypatch.setattr(plugin, "CACHE_DIRECTORY", None)
+    writeReport(tmp_path / "data", getRows())
+    runQuota(plugin)
+    checkResult, performanceData = runQuota(plugin, "-w", "50")
+    assert performanceData["changedRows"] == QUOTA_ROWS
+    checkResult, performanceData = runQuota(plugin, "-w", "50")
+    assert performanceData["changedRows"] == 0
+
+
+def test_changed_limits_update_the_entry(plugin, tmp_path, monkeypatch):
+    monkeypatch.setenv("MMFAKE_DATA", str(tmp_path / "data"))
+    monkeypatch.setattr(plugin, "CACHE_DIRECTORY", None)
+    rows = getRows()
+    writeReport(tmp_path / "data", rows)
+    runQuota(plugin)
+    # the hard limits and the grace periods are part of the digest, not only the usage and the soft quota
+    rows[0][BLOCK_LIMIT] += 1
+    rows[1][FILES_LIMIT] += 1
+    rows[2][FILES_GRACE] = "7 days"
+    writeReport(tmp_path / "data", rows)
+    checkResult, performanceData = runQuota(plugin)
+    assert performanceData["changedRows"] == 3
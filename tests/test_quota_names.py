@@ -0,0 +1,57 @@
+################################################################################
+# Tests of the quota check of single users/groups (quota -n) with one mmlsquota
+# per name instead of the report of mmrepquota
+################################################################################
+import mmfake
+
+
+def getNames(violating, count):
+    """
+    Returns: the names of the first count users of the stand-ins whose block or file usage is (or is not) over 90% of the quota
+    """
+    names = []
+    for number in range(1000):
+        row = mmfake.quotaRow(number, "USR", "fs1", mmfake.DEFAULT_SCALE)
+        over = any(row[quota] and row[usage] * 100.0 / row[quota] > 90 for usage, quota in ((8, 9), (13, 14)))
+        if over == violating:
+            names.append(row[7])
+        if len(names) == count:
+            return names
+
+
+def runQuota(plugin, monkeypatch, *arguments):
+    """
+    Returns: tuple of the CheckResult of the quota check of fs1 with the arguments and the names of the executed commands
+    """
+    executed = []
+    backend = plugin.SubprocessBackend()
+    execute = backend.execute
+    monkeypatch.setattr(backend, "execute", lambda argv: executed.append(argv[0].rsplit("/", 1)[-1]) or execute(argv))
+    monkeypatch.setattr(plugin, "COMMAND_BACKEND", backend)
+    checkResult = plugin.runCheck(plugin.argumentParser().parse_args(["quota", "-d", "fs1", "-L"] + list(arguments)))
+    return checkResult, executed
+
+
+def test_names_are_queried_with_mmlsquota(plugin, monkeypatch):
+    names = getNames(True, 3) + getNames(False, 2)
+    checkResult, executed = runQuota(plugin, monkeypatch, "-t", "u", "-n", ",".join(names))
+    assert executed == ["mmlsquota"] * 5
+    # the same result as the names filtered from the report of all users
+    fullScan, executed = runQuota(plugin, monkeypatch, "-t", "u", "-n", ",".join(names), "--full-scan")
+    assert executed == ["mmrepquota"]
+    assert checkResult.returnMessage == fullScan.returnMessage
+    assert checkResult.longOutput == fullScan.longOutput
+    assert checkResult.returnCode in (plugin.STATE_WARNING, plugin.STATE_CRITICAL)
+    checkResult, executed = runQuota(plugin, monkeypatch, "-t", "u", "-n", ",".join(getNames(False, 2)))
+    assert checkResult.returnMessage == "OK - No Violations detected"
+
+
+def test_names_without_quota_are_unknown(plugin, monkeypatch):
+    names = getNames(False, 1)
+    checkResult, executed = runQuota(plugin, monkeypatch, "-n", names[0] + ",nobody")
+    # without a type each name is queried as user and group
+    assert executed == ["mmlsquota"] * 4
+    assert (checkResult.returnCode, checkResult.returnMessage) == (plugin.STATE_UNKNOWN, "UNKNOWN - No quota found for: nobody")
+    checkResult, executed = runQuota(plugin, monkeypatch, "-n", names[0] + ",--all")
+    assert executed == []
+    assert checkResult.returnMessage == "UNKNOWN - checkQuota failed: invalid user/group name '--all'"
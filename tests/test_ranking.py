@@ -0,0 +1,101 @@
+################################################################################
+# Tests of the ranking of the top quota consumers (quota --top N) and the usage
+# of the user quota entries per fileset against the report of the stand-ins
+################################################################################
+import re
+import subprocess
+
+import pytest
+
+
+def getEntries(plugin, device="fs1"):
+    """
+    Returns: list of dicts of the columns of the entries of mmrepquota -Y of the stand-ins
+    """
+    output = subprocess.run([plugin.mmCommand("mmrepquota"), "-Y", device], stdout=subprocess.PIPE, universal_newlines=True, check=True).stdout
+    lines = [x.split(":") for x in output.splitlines()]
+    header = lines[0]
+    entries = []
+    for fields in lines[1:]:
+        entry = dict(zip(header, fields))
+        for column in ("blockUsage", "blockQuota", "filesUsage", "filesQuota"):
+            entry[column] = int(entry[column])
+        entries.append(entry)
+    return entries
+
+
+def getRanking(checkResult):
+    """
+    Returns: dict of the title of each ranking line of the long output to its list of entries
+    """
+    ranking = {}
+    for line in checkResult.longOutput.split("\nBlock Utilization: ", 1)[1].splitlines():
+        title, entries = line.split(": ", 1) if ranking else ("Block Utilization", line)
+        # the entries are delimited by ", " which is also in the (type, fileset) of an entry
+        ranking[title] = re.split(r", (?=[^ ,()]+ [(0-9])", entries)
+    return ranking
+
+
+def runTop(plugin, size, *arguments):
+    """
+    Returns: the CheckResult of the quota check of fs1 with --top size and the arguments
+    """
+    return plugin.runCheck(plugin.argumentParser().parse_args(["quota", "-d", "fs1", "--top", str(size)] + list(arguments)))
+
+
+ENTRY_PATTERN = re.compile(r"(\S+) \((USR|GRP|FILESET)(?:, (\S+))?\) ([0-9.]+)")
+
+
+@pytest.mark.parametrize("size", [1, 5, 50])
+def test_top_entries_equal_the_sorted_report(plugin, size):
+    entries = getEntries(plugin)
+    checkResult = runTop(plugin, size)
+    assert checkResult.longOutput.startswith("Top " + str(size) + " of 10000 quota entries\n")
+    ranking = getRanking(checkResult)
+    values = {'Block Utilization': lambda x: round(x["blockUsage"] * 100.0 / x["blockQuota"], 1) if x["blockQuota"] else None,
+              'File Utilization': lambda x: round(x["filesUsage"] * 100.0 / x["filesQuota"], 1) if x["filesQuota"] else None,
+              'Block Usage': lambda x: x["blockUsage"],
+              'File Usage': lambda x: x["filesUsage"]}
+    byKey = dict(((x["name"], x["quotaType"], x["filesetname"]), x) for x in entries)
+    for title, value in values.items():
+        expected = sorted((value(x) for x in entries if value(x) is not None), reverse=True)[:size]
+        ranked = []
+        for text in ranking[title]:
+            name, quotaType, filesetName, rankedValue = ENTRY_PATTERN.match(text).groups()
+            # the entry has the value it is ranked with, equal values may be ranked in any order
+            assert float(rankedValue) == value(byKey[(name, quotaType, filesetName or "")])
+            ranked.append(float(rankedValue))
+        assert ranked == expected
+
+
+def test_user_usage_is_summed_per_fileset(plugin):
+    filesets = {}
+    for entry in getEntries(plugin):
+        if entry["quotaType"] == "USR":
+            usage = filesets.setdefault(entry["filesetname"], [0, 0, 0])
+            usage[0] += entry["blockUsage"]
+            usage[1] += entry["filesUsage"]
+            usage[2] += 1
+    expected = sorted(filesets.items(), key=lambda x: -x[1][0])[:3]
+    checkResult = runTop(plugin, 3)
+    assert getRanking(checkResult)["FileSet Usage (users)"] == [name + " " + str(x[0]) + "KB " + str(x[1]) + " files " + str(x[2]) + " users" for name, x in expected]
+
+
+def test_ranking_does_not_depend_on_the_chunks(plugin, monkeypatch):
+    longOutput = runTop(plugin, 10).longOutput
+    # the ranking is shown without -L, after the lists of the violations with -L
+    assert longOutput.startswith("Top 10 of 10000 quota entries\n")
+    assert runTop(plugin, 10, "-L").longOutput.endswith("\n" + longOutput)
+    monkeypatch.setattr(plugin, "QUOTA_CHUNK_SIZE", 7)
+    assert runTop(plugin, 10).longOutput == longOutput
+    # the entries which the incremental index does not evaluate again are still ranked
+    runTop(plugin, 10, "-I")
+    assert runTop(plugin, 10, "-I").longOutput == longOutput
+
+
+def test_ranking_of_queried_names(plugin):
+    entries = [x for x in getEntries(plugin) if x["quotaType"] == "USR"][:4]
+    checkResult = runTop(plugin, 2, "-t", "u", "-n", ",".join(x["name"] for x in entries))
+    ranking = getRanking(checkResult)
+    assert checkResult.longOutput.startswith("Top 2 of 4 quota entries\n")
+    assert [int(x.rsplit(" ", 1)[1].rstrip("KB")) for x in ranking["Block Usage"]] == sorted((x["blockUsage"] for x in entries), reverse=True)[:2]
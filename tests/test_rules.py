@@ -0,0 +1,88 @@
+################################################################################
+# Tests of the rules file (RuleSet), the first matching rule wins regardless of
+# whether it is a plain name, a prefix glob, another glob or a regular expression
+################################################################################
+import pytest
+
+
+def readRules(plugin, tmp_path, text):
+    """
+    Returns: the RuleSet of the rules file with text
+    """
+    rulesPath = tmp_path / "rules"
+    rulesPath.write_text(text)
+    return plugin.readRuleSet(str(rulesPath))
+
+
+def test_first_matching_rule_wins(plugin, tmp_path):
+    rules = readRules(plugin, tmp_path, "\n".join([
+        "fileset re:scratch[0-9]+ warning=70",
+        "fileset scratch1 warning=60 critical=65",
+        "fileset scratch* warning=80",
+        "fileset home exclude",
+        "fileset home* warning=85 critical=90",
+        "fileset h?me2 warning=50",
+        "fileset re:.*-tmp exclude  # any temporary fileset",
+        "fileset project-tmp warning=10",
+        "user re:svc_.* exclude",
+    ]))
+    # the regular expression comes before the plain name and the prefix
+    assert rules.getThresholds("fileset", "scratch1", 90, 95) == (70, 95)
+    assert rules.getThresholds("fileset", "scratchX", 90, 95) == (80, 95)
+    assert rules.isExcluded("fileset", "home")
+    # the prefix comes before the later glob
+    assert rules.getThresholds("fileset", "home2", 90, 95) == (85, 90)
+    assert rules.getThresholds("fileset", "hame2", 90, 95) == (50, 95)
+    assert rules.isExcluded("fileset", "project-tmp")
+    assert rules.match("fileset", "project") is None
+    assert rules.getThresholds("fileset", "project", 90, 95) == (90, 95)
+    # the rules only apply to their kind
+    assert rules.isExcluded("user", "svc_backup")
+    assert not rules.isExcluded("group", "svc_backup")
+    assert not rules.isExcluded("user", "xsvc_backup")
+
+
+def test_exact_rule_before_later_patterns(plugin, tmp_path):
+    rules = readRules(plugin, tmp_path, "pool data warning=70\npool re:data.* warning=80\npool d* warning=85\npool data* warning=90\n")
+    assert rules.getThresholds("pool", "data", 90, 95) == (70, 95)
+    assert rules.getThresholds("pool", "data2", 90, 95) == (80, 95)
+    assert rules.getThresholds("pool", "dx", 90, 95) == (85, 95)
+
+
+def test_patterns_with_the_same_prefix_keep_their_order(plugin, tmp_path):
+    rules = readRules(plugin, tmp_path, "user re:ab+c critical=99\nuser re:a.* critical=98\nuser a[bc]* critical=97\nuser re:x|abd critical=96\n")
+    assert rules.getThresholds("user", "abbc", 90, 95) == (90, 99)
+    assert rules.getThresholds("user", "abd", 90, 95) == (90, 98)
+    assert rules.getThresholds("user", "x", 90, 95) == (90, 96)
+    assert rules.getThresholds("user", "bcd", 90, 95) == (90, 95)
+
+
+@pytest.mark.parametrize("line", ["fileset", "volume x", "fileset x warning", "fileset x limit=5", "node n1 warning=5", "fileset re:( exclude"])
+def test_invalid_rules_name_the_line(plugin, tmp_path, line):
+    with pytest.raises(ValueError, match="line 2"):
+        readRules(plugin, tmp_path, "# comment\n" + line + "\n")
+
+
+def test_regular_expressions_with_groups_keep_their_meaning(plugin, tmp_path):
+    rules = readRules(plugin, tmp_path, "\n".join([
+        "user re:x+ warning=10",
+        "user re:(ab)\\1 warning=20",
+        "user re:(?P<site>[a-z]+)_(?P=site) warning=30",
+        "user re:(?P<site>[0-9]+)-(?P=site) warning=40",
+        "user re:(?i)admin warning=50",
+        "user re:(c)d|e\\1 warning=60",
+        "user re:a.* warning=70",
+    ]))
+    # the backreferences refer to the groups of their own rule
+    assert rules.getThresholds("user", "abab", 90, 95) == (20, 95)
+    assert rules.getThresholds("user", "abba", 90, 95) == (70, 95)
+    # the same group name in several rules
+    assert rules.getThresholds("user", "ber_ber", 90, 95) == (30, 95)
+    assert rules.getThresholds("user", "12-12", 90, 95) == (40, 95)
+    assert rules.match("user", "12-13") is None
+    assert rules.getThresholds("user", "ADMIN", 90, 95) == (50, 95)
+    assert rules.getThresholds("user", "cd", 90, 95) == (60, 95)
+    # the earlier combined rule still wins
+    assert rules.getThresholds("user", "xx", 90, 95) == (10, 95)
+    assert rules.getThresholds("user", "admin", 90, 95) == (50, 95)
+    assert rules.getThresholds("user", "ab_ab", 90, 95) == (30, 95)
@@ -0,0 +1,69 @@
+################################################################################
+# Tests of the fileset data sizes collected in the background (filesets -S and
+# collect-sizes) against mmlsfileset -d -Y of the stand-ins
+################################################################################
+import fcntl
+import json
+import os
+import re
+import time
+
+
+def getSizePerformanceData(checkResult):
+    """
+    Returns: dict of the data sizes in the performance data of the filesets check by fileset name
+    """
+    return dict((x, int(y)) for x, y in re.findall(r"(\w+)_blockSiz=(\d+)KB", checkResult.performanceData))
+
+
+def test_sizes_are_collected_in_the_background(plugin, monkeypatch):
+    monkeypatch.setenv("MMFAKE_FILESETS", "50")
+    args = plugin.argumentParser().parse_args(["filesets", "-d", "fs1", "-l", "-S"])
+    checkResult = plugin.checkFileSets(args)
+    # the first check does not wait for the collection
+    assert checkResult.returnCode == plugin.STATE_OK
+    assert "dataSizeAge=U" in checkResult.performanceData
+    assert set(getSizePerformanceData(checkResult).values()) == {0}
+    sizePath = plugin.getFileSetSizePath("fs1")
+    deadline = time.monotonic() + 20
+    while not os.path.exists(sizePath) and time.monotonic() < deadline:
+        time.sleep(0.1)
+    checkResult = plugin.checkFileSets(args)
+    assert re.search(r"dataSizeAge=\d+s", checkResult.performanceData)
+    sizes = getSizePerformanceData(checkResult)
+    expected = plugin.checkFileSets(plugin.argumentParser().parse_args(["filesets", "-d", "fs1", "-l", "-s"]))
+    assert len(sizes) == 50 and max(sizes.values()) > 0
+    assert sizes == getSizePerformanceData(expected)
+
+
+def test_old_sizes_are_used_while_they_are_refreshed(plugin, monkeypatch):
+    jobs = []
+    monkeypatch.setattr(plugin, "spawnBackgroundJob", jobs.append)
+    os.makedirs(plugin.STATE_DIRECTORY)
+    with open(plugin.getFileSetSizePath("fs1"), "w") as sizeFile:
+        json.dump({"timestamp": time.time() - 7200, "sizes": {"root": 42}}, sizeFile)
+    checkResult = plugin.checkFileSets(plugin.argumentParser().parse_args(["filesets", "-d", "fs1", "-l", "-S"]))
+    assert getSizePerformanceData(checkResult)["root"] == 42
+    assert jobs == [["collect-sizes", "-d", "fs1"]]
+    checkResult = plugin.checkFileSets(plugin.argumentParser().parse_args(["filesets", "-d", "fs1", "-l", "-S", "--size-max-age", "86400"]))
+    assert re.search(r"dataSizeAge=7\d\d\ds", checkResult.performanceData)
+    assert len(jobs) == 1
+
+
+def test_one_collection_per_device(plugin, monkeypatch):
+    jobs = []
+    monkeypatch.setattr(plugin, "spawnBackgroundJob", jobs.append)
+    os.makedirs(plugin.STATE_DIRECTORY)
+    with open(plugin.getFileSetSizePath("fs1") + ".lock", "a") as lockFile:
+        fcntl.flock(lockFile, fcntl.LOCK_EX)
+        plugin.refreshFileSetSizes("fs1")
+        assert jobs == []
+        checkResult = plugin.collectFileSetSizes(plugin.argumentParser().parse_args(["collect-sizes", "-d", "fs1"]))
+        assert checkResult.returnMessage == "OK - Collection of the fileset data sizes of fs1 is already running"
+        assert not os.path.exists(plugin.getFileSetSizePath("fs1"))
+    plugin.refreshFileSetSizes("fs1")
+    assert jobs == [["collect-sizes", "-d", "fs1"]]
+    checkResult = plugin.collectFileSetSizes(plugin.argumentParser().parse_args(["collect-sizes", "-d", "fs1"]))
+    assert checkResult.returnMessage == "OK - Collected the data size of 100 filesets of fs1"
+    sizes, age = plugin.readFileSetSizes("fs1")
+    assert len(sizes) == 100 and age < 60
@@ -0,0 +1,75 @@
+################################################################################
+# Tests of the state of all nodes of the cluster (status -a) from one
+# mmgetstate -a -LY of the stand-ins
+################################################################################
+import re
+import subprocess
+
+import mmfake
+
+MMGETSTATE_HEADER = ["HEADER", "version", "reserved", "reserved", "nodeName", "nodeNumber", "state", "quorum", "nodesUp", "totalNodes", "remarks", "cnfsState"]
+
+
+def runStatus(plugin, *arguments):
+    """
+    Returns: the CheckResult of status -a with the arguments
+    """
+    return plugin.checkStatus(plugin.argumentParser().parse_args(["status", "-a", "-L"] + list(arguments)))
+
+
+def writeNodes(plugin, tmp_path, monkeypatch, nodes):
+    """
+    Serve mmgetstate -a -LY with the nodes (tuples of name, state, quorum, nodesUp and totalNodes) from MMFAKE_DATA
+    """
+    monkeypatch.setenv("MMFAKE_DATA", str(tmp_path / "data"))
+    monkeypatch.setattr(plugin, "CACHE_DIRECTORY", None)
+    (tmp_path / "data").mkdir(exist_ok=True)
+    lines = [mmfake.machineReadableLine("mmgetstate", MMGETSTATE_HEADER)]
+    lines += [mmfake.machineReadableLine("mmgetstate", [0, 1, "", "", name, number, state, quorum, nodesUp, totalNodes, "", ""])
+              for number, (name, state, quorum, nodesUp, totalNodes) in enumerate(nodes, 1)]
+    (tmp_path / "data" / mmfake.outputName("mmgetstate", ["-a", "-LY"])).write_text("".join(lines))
+
+
+def test_states_of_the_nodes_of_the_stand_ins(plugin, monkeypatch):
+    monkeypatch.setenv("MMFAKE_NODES", "2000")
+    output = subprocess.run([plugin.mmCommand("mmgetstate"), "-a", "-LY"], stdout=subprocess.PIPE, universal_newlines=True, check=True).stdout
+    lines = [x.split(":") for x in output.splitlines()]
+    nameColumn, stateColumn = lines[0].index("nodeName"), lines[0].index("state")
+    states = {}
+    for fields in lines[1:]:
+        states.setdefault(fields[stateColumn], []).append(fields[nameColumn])
+    assert states["down"] and states["arbitrating"]
+    checkResult = runStatus(plugin)
+    summary = str(len(states["active"])) + "/2000 nodes active (arbitrating: " + str(len(states["arbitrating"])) + ", down: " + str(len(states["down"])) + ")"
+    assert (checkResult.returnCode, checkResult.returnMessage) == (plugin.STATE_WARNING, "WARNING - " + summary)
+    assert checkResult.longOutput.splitlines() == ["Down Nodes: " + ", ".join(states["down"]), "Arbitrating Nodes: " + ", ".join(states["arbitrating"])]
+    performanceData = dict(re.findall(r"(\w+)=(\d+)", checkResult.performanceData))
+    assert (performanceData["active"], performanceData["down"], performanceData["quorumNeeded"]) == (str(len(states["active"])), str(len(states["down"])), "3")
+    # the first check executes mmgetstate, the second one reads its output from the cache
+    assert performanceData["cached"] == "0"
+    assert plugin.checkStatus(plugin.argumentParser().parse_args(["status", "-a"])).returnMessage == "WARNING - " + summary
+
+
+def test_quorum_and_thresholds(plugin, tmp_path, monkeypatch):
+    nodes = [("node" + str(x), "active", "2*", 3, 5) for x in range(1, 4)] + [("node4", "down", 0, 0, 0), ("node5", "unknown", 0, 0, 0)]
+    writeNodes(plugin, tmp_path, monkeypatch, nodes)
+    checkResult = runStatus(plugin, "-w", "3", "-c", "2")
+    assert (checkResult.returnCode, checkResult.returnMessage) == (plugin.STATE_OK, "OK - 3/5 nodes active (down: 1, unknown: 1)")
+    assert checkResult.longOutput.endswith("Unknown Nodes: node5\n")
+    assert runStatus(plugin, "-w", "4", "-c", "2").returnMessage == "WARNING - 3/5 nodes active (down: 1, unknown: 1)"
+    assert runStatus(plugin, "-w", "5", "-c", "4").returnMessage == "Critical - Only 3/5 nodes active (down: 1, unknown: 1)"
+    nodes[0] = ("node1", "active", 4, 3, 5)
+    writeNodes(plugin, tmp_path, monkeypatch, nodes)
+    assert runStatus(plugin, "-w", "3", "-c", "2").returnMessage == "Critical - Quorum lost, only 3 nodes are up and 4 are required: 3/5 nodes active (down: 1, unknown: 1)"
+    writeNodes(plugin, tmp_path, monkeypatch, [("node1", "down", 0, 0, 0), ("node2", "arbitrating", 0, 0, 0)])
+    assert runStatus(plugin).returnMessage == "Critical - No node is active: 0/2 nodes active (arbitrating: 1, down: 1)"
+
+
+def test_excluded_nodes_are_not_counted(plugin, tmp_path, monkeypatch):
+    nodes = [("node" + str(x), "active", 2, 3, 4) for x in range(1, 4)] + [("maint1", "down", 0, 0, 0)]
+    writeNodes(plugin, tmp_path, monkeypatch, nodes)
+    (tmp_path / "rules").write_text("node maint* exclude\n")
+    monkeypatch.setattr(plugin, "RULES_FILE", str(tmp_path / "rules"))
+    checkResult = runStatus(plugin, "-w", "3", "-c", "2")
+    assert checkResult.returnMessage == "OK - 3/3 nodes active"
+    assert "excluded=1" in checkResult.performanceData
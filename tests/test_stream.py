@@ -0,0 +1,54 @@
+################################################################################
+# Tests of the incremental reading of the command output (CommandStream)
+################################################################################
+import os
+import sys
+import time
+
+
+def getScript(tmp_path, source, name="script"):
+    """
+    Returns: the argument list which runs the python source
+    """
+    scriptPath = tmp_path / name
+    scriptPath.write_text(source)
+    return [sys.executable, str(scriptPath)]
+
+
+def test_lines_are_read_before_the_command_finished(plugin, tmp_path):
+    markerPath = tmp_path / "finished"
+    argv = getScript(tmp_path, "import sys, time\nprint('first', flush=True)\ntime.sleep(1.0)\nprint('second')\nopen(sys.argv[1], 'w').close()\n")
+    with plugin.streamBashCommand(argv + [str(markerPath)], 0) as stream:
+        started = time.monotonic()
+        assert next(iter(stream)) == "first\n"
+        assert time.monotonic() - started < 0.9
+        assert not markerPath.exists()
+        assert list(stream) == ["second\n"]
+    assert markerPath.exists()
+    assert stream.returnCode == 0
+
+
+def test_closed_stream_terminates_the_command(plugin, tmp_path):
+    markerPath = tmp_path / "finished"
+    argv = getScript(tmp_path, "import sys, time\nprint('first', flush=True)\ntime.sleep(2.0)\nopen(sys.argv[1], 'w').close()\n")
+    stream = plugin.streamBashCommand(argv + [str(markerPath)], 60)
+    assert next(iter(stream)) == "first\n"
+    started = time.monotonic()
+    stream.close()
+    assert time.monotonic() - started < 1.5
+    time.sleep(2.5)
+    assert not markerPath.exists()
+    # the incomplete output is not cached
+    assert [x for x in os.listdir(plugin.CACHE_DIRECTORY) if not x.endswith(".lock")] == []
+
+
+def test_characters_split_over_chunks_and_a_missing_newline(plugin, tmp_path):
+    source = "import os, time\n"
+    source += "os.write(1, 'a\\u00e4'.encode()[:2])\ntime.sleep(0.2)\nos.write(1, 'a\\u00e4\\nb'.encode()[2:])\ntime.sleep(0.2)\nos.write(1, b'\\n\\xff\\nlast')\n"
+    argv = getScript(tmp_path, source)
+    with plugin.streamBashCommand(argv, 0) as stream:
+        assert list(stream) == ["aä\n", "b\n", "�\n", "last"]
+    output = plugin.executeBashCommand(argv, 0)
+    assert output == "aä\nb\n�\nlast"
+    assert not output.cached
+
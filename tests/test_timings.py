@@ -0,0 +1,56 @@
+################################################################################
+# Tests of the timings of the check phases (CheckTimer, --timings) and of the
+# profiler hooks (--profile, --trace-memory)
+################################################################################
+import pstats
+import re
+import time
+
+from conftest import STAND_IN_DIRECTORY
+
+
+def test_phases_are_exclusive(plugin):
+    timer = plugin.CheckTimer()
+    timer.switch('eval')
+    time.sleep(0.1)
+    with timer.phase('output'):
+        time.sleep(0.2)
+    # the time between the lines is accounted to the phase of the consumer
+    for line in timer.iterate(iter(["a\n", "b\n"])):
+        time.sleep(0.05)
+    timer.switch(None)
+    assert 0.2 <= timer.phases['eval'] < 0.3
+    assert 0.2 <= timer.phases['output'] < 0.25
+    assert timer.phases['exec'] < 0.01
+    output = plugin.CommandOutput("", queueTime=0.15)
+    timer.phases['exec'] = 0.1
+    timer.addCommand(output)
+    assert (timer.phases['exec'], timer.phases['queue']) == (0.0, 0.15)
+
+
+def test_timings_of_the_quota_check(plugin, monkeypatch):
+    monkeypatch.setenv("MMFAKE_QUOTA_ROWS", "5000")
+    checkResult = plugin.checkQuota(plugin.argumentParser().parse_args(["--timings", "quota", "-d", "fs1"]))
+    performanceData = dict(re.findall(r"(\w+)=([0-9.]+)", checkResult.performanceData))
+    assert performanceData["rows"] == "5000"
+    assert float(performanceData["t_exec"]) > 0 and float(performanceData["t_parse"]) > 0
+    assert int(performanceData["maxrss"]) > 0
+    checkResult = plugin.checkQuota(plugin.argumentParser().parse_args(["quota", "-d", "fs1"]))
+    assert "t_exec" not in checkResult.performanceData
+
+
+def test_profile_and_memory_reports(tmp_path, runPlugin):
+    profilePath, memoryPath = tmp_path / "quota.prof", tmp_path / "quota.mem"
+    process = runPlugin(["--mmfs-bin", STAND_IN_DIRECTORY, "--no-sudo", "--no-cache", "--state-dir", str(tmp_path / "state"), "--profile", str(profilePath),
+                         "--trace-memory", str(memoryPath), "quota", "-d", "fs1"], {'MMFAKE_QUOTA_ROWS': "1000"})
+    assert process.returncode == 2, process.stderr
+    assert process.stdout.startswith("Critical - Block Critical: ")
+    functions = [x[2] for x in pstats.Stats(str(profilePath)).stats]
+    assert "checkQuota" in functions and "parseMachineReadable" in functions
+    report = memoryPath.read_text().splitlines()
+    assert re.fullmatch(r"current=\d+B peak=\d+B", report[0]) and len(report) > 1
+    # the check is reported if the profile can not be written
+    process = runPlugin(["--mmfs-bin", STAND_IN_DIRECTORY, "--no-sudo", "--no-cache", "--state-dir", str(tmp_path / "state"), "--profile", str(tmp_path / "missing" / "quota.prof"),
+                         "quota", "-d", "fs1"], {'MMFAKE_QUOTA_ROWS': "1000"})
+    assert process.stdout.startswith("Critical - Block Critical: ")
+    assert process.stderr.startswith("Could not write the profile: ")
@@ -0,0 +1,89 @@
+################################################################################
+# Tests of the waiters check, which buckets the long waiters of mmdiag --waiters
+# (-Y) of the stand-ins by their reason
+################################################################################
+import subprocess
+
+import pytest
+
+
+def runWaiters(plugin, *arguments):
+    """
+    Returns: the CheckResult of the waiters check with the arguments
+    """
+    return plugin.runCheck(plugin.argumentParser().parse_args(["waiters", "-L"] + list(arguments)))
+
+
+def getBuckets(plugin, minAge, allWaiters):
+    """
+    Returns: dict of the reason to the number and the longest wait time of the waiters of mmdiag --waiters -Y of the
+             stand-ins which wait at least minAge seconds
+    """
+    output = subprocess.run([plugin.mmCommand("mmdiag"), "--waiters", "-Y"], stdout=subprocess.PIPE, universal_newlines=True, check=True).stdout
+    buckets = {}
+    for line in output.splitlines()[1:]:
+        fields = line.split(":")
+        waitTime = float(fields[10])
+        if waitTime < minAge or (fields[11] == "no" and not allWaiters):
+            continue
+        bucket = buckets.setdefault(fields[14], [0, 0.0])
+        bucket[0] += 1
+        bucket[1] = max(bucket[1], waitTime)
+    return buckets
+
+
+@pytest.mark.parametrize("arguments", [[], ["-Y"], ["-a"], ["-m", "20"], ["-a", "-Y", "-m", "0"]])
+def test_waiters_are_bucketed_by_reason(plugin, arguments):
+    args = plugin.argumentParser().parse_args(["waiters"] + arguments)
+    buckets = getBuckets(plugin, args.minAge, args.allWaiters)
+    checkResult = runWaiters(plugin, *arguments)
+    count = sum(x[0] for x in buckets.values())
+    assert checkResult.returnMessage.startswith(("OK - ", "Warning - ", "Critical - "))
+    assert " - " + str(count) + " waiters over " + str(args.minAge) + "s, longest " in checkResult.returnMessage
+    lines = checkResult.longOutput.splitlines()
+    assert sorted(lines) == sorted(reason + ": " + str(x[0]) + " waiters, longest " + str(round(x[1], 1)) + "s" for reason, x in buckets.items())
+    # the buckets with the longest waiters first
+    ages = [float(x.rsplit(" ", 1)[1].rstrip("s")) for x in lines]
+    assert ages == sorted(ages, reverse=True)
+    assert checkResult.performanceData.startswith("waiters=" + str(count) + ";;;0; maxAge=" + str(round(max(x[1] for x in buckets.values()), 3)) + "s;" + str(args.warning) + ";" + str(args.critical) + ";0; ")
+
+
+def test_text_and_machine_readable_output_agree(plugin):
+    text, machineReadable = [subprocess.run([plugin.mmCommand("mmdiag"), "--waiters"] + x, stdout=subprocess.PIPE, universal_newlines=True, check=True).stdout.splitlines() for x in ([], ["-Y"])]
+    waiters = [str(x) for x in plugin.parseWaiters(text)]
+    assert len(waiters) == 200
+    assert waiters == [str(x) for x in plugin.parseWaiters(machineReadable, True)]
+
+
+def test_thresholds(plugin, monkeypatch):
+    checkResult = runWaiters(plugin)
+    assert checkResult.returnCode == plugin.STATE_WARNING
+    assert checkResult.returnMessage.endswith(", longest 95.0s SyncHandlerThread: for RPC response (10.0.0.13)")
+    assert runWaiters(plugin, "-w", "100", "-c", "200").returnCode == plugin.STATE_OK
+    count = sum(x[0] for x in getBuckets(plugin, 1, False).values())
+    assert runWaiters(plugin, "-w", "100", "--count-warning", str(count - 1)).returnCode == plugin.STATE_WARNING
+    assert runWaiters(plugin, "-w", "100", "--count-warning", str(count - 1), "--count-critical", str(count - 1)).returnCode == plugin.STATE_CRITICAL
+    assert runWaiters(plugin, "-w", "100", "--count-warning", str(count)).returnCode == plugin.STATE_OK
+    # a few of the waiters wait for many minutes
+    monkeypatch.setenv("MMFAKE_WAITERS", "2000")
+    assert runWaiters(plugin, "--cache-ttl", "0").returnCode == plugin.STATE_CRITICAL
+    assert max(x[1] for x in getBuckets(plugin, 1, False).values()) > 300
+
+
+def test_waiter_reasons(plugin):
+    assert plugin.getWaiterReason("on ThCond 0x7F1C0C00B0D8 (RecvWorkerCondvar), reason 'waiting for message'") == "waiting for message"
+    assert plugin.getWaiterReason("on ThCond 0x1800AC0E628 (0x1800AC0E628) (LkObjCondvar)") == "LkObjCondvar"
+    assert plugin.getWaiterReason("for NSD I/O completion on node 10.0.0.3 <c0n3>") == "for NSD I/O completion"
+    assert plugin.getWaiterReason("waiting for 2 tokens 0x1F") == "waiting for tokens"
+    waiter = list(plugin.parseWaiters(["0x7F Waiting 12.5000 sec since 10:00:00, ignored, thread 17 SyncHandlerThread: for RPC response from node 10.0.0.7 <c0n7>", "no waiter"]))
+    assert [str(x) for x in waiter] == ["[thread: 17, threadName: SyncHandlerThread, waitTime: 12.5, reason: for RPC response, target: 10.0.0.7]"]
+    assert not waiter[0].monitored
+
+
+def test_failed_mmdiag_is_unknown(plugin, tmp_path, monkeypatch):
+    commandPath = tmp_path / "mmdiag"
+    commandPath.write_text("#!/bin/sh\nexit 1\n")
+    commandPath.chmod(0o755)
+    monkeypatch.setattr(plugin, "MMFS_BIN_DIRECTORY", str(tmp_path))
+    checkResult = runWaiters(plugin)
+    assert (checkResult.returnCode, checkResult.returnMessage) == (plugin.STATE_UNKNOWN, "UNKNOWN - mmdiag failed with exit code 1")